@@ -5,9 +5,19 @@ import sys
 import timeit
 from redis._compat import izip
 
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
 
 class Benchmark(object):
     ARGUMENTS = ()
+    # also report the peak memory allocated by each call to run(). requires
+    # the tracemalloc module (Python 3.4+)
+    TRACK_ALLOCATIONS = False
+    # the number of times run() is called for each set of arguments
+    NUMBER = 1000
 
     def __init__(self):
         self._client = None
@@ -41,6 +51,25 @@ class Benchmark(object):
             kwargs = dict(pairs)
             setup = functools.partial(self.setup, **kwargs)
             run = functools.partial(self.run, **kwargs)
-            t = timeit.timeit(stmt=run, setup=setup, number=1000)
-            sys.stdout.write('%f\n' % t)
+            t = timeit.timeit(stmt=run, setup=setup, number=self.NUMBER)
+            sys.stdout.write('%f' % t)
+            if self.TRACK_ALLOCATIONS and tracemalloc is not None:
+                sys.stdout.write(' (%d bytes allocated per call)' %
+                                 self.measure_allocations(run))
+            sys.stdout.write('\n')
             sys.stdout.flush()
+
+    def measure_allocations(self, run, number=100):
+        "Return the average peak memory allocated by a call to ``run``"
+        total = 0
+        tracemalloc.start()
+        try:
+            for i in range(number):
+                tracemalloc.stop()
+                tracemalloc.start()
+                run()
+                current, peak = tracemalloc.get_traced_memory()
+                total += peak
+        finally:
+            tracemalloc.stop()
+        return total // number
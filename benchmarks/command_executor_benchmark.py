@@ -0,0 +1,127 @@
+import redis
+from redis.connection import Connection, b
+from redis._compat import xrange
+from base import Benchmark
+
+
+# each command's reply, both as sent by the server and once parsed
+REPLIES = {
+    'GET': (b('$3\r\nbar\r\n'), b('bar')),
+    'SET': (b('+OK\r\n'), b('OK')),
+    'INCR': (b(':1\r\n'), 1),
+    'HGET': (b('$3\r\nbar\r\n'), b('bar')),
+}
+
+
+class LoopbackSocket(object):
+    "A socket-like object that answers every command with the same reply"
+    def __init__(self, reply):
+        self.reply = reply
+        self.pending = 0
+
+    def sendall(self, data):
+        self.pending += 1
+
+    def sendmsg(self, buffers):
+        self.pending += 1
+        return sum([len(buffer) for buffer in buffers])
+
+    def recv_into(self, buffer, size=0):
+        reply = self.reply * self.pending
+        self.pending = 0
+        buffer[:len(reply)] = reply
+        return len(reply)
+
+    def recv(self, size):
+        reply = self.reply * self.pending
+        self.pending = 0
+        return reply
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        pass
+
+
+class LoopbackConnection(Connection):
+    "A connection to a LoopbackSocket instead of a server"
+    description_format = "LoopbackConnection<reply=%(reply)r>"
+
+    def __init__(self, reply, **kwargs):
+        super(LoopbackConnection, self).__init__(**kwargs)
+        self.reply, self.response = reply
+        self._description_args = {'reply': self.reply}
+
+    def _connect(self):
+        return LoopbackSocket(self.reply)
+
+
+class NoopConnection(LoopbackConnection):
+    "A connection that neither packs commands nor parses replies"
+    def send_command(self, *args):
+        pass
+
+    def read_response(self):
+        return self.response
+
+
+CONNECTION_CLASSES = {
+    'loopback': LoopbackConnection,
+    'noop': NoopConnection,
+}
+
+
+COMMANDS = {
+    'GET': ('GET', 'foo'),
+    'SET': ('SET', 'foo', 'bar'),
+    'INCR': ('INCRBY', 'foo', 1),
+    'HGET': ('HGET', 'foo', 'bar'),
+}
+
+
+class CommandExecutorBenchmark(Benchmark):
+    """
+    Measures the per-call overhead of executing a command on the client.
+    ``generic`` calls execute_command(), as command methods do, while
+    ``executor`` calls the command's executor from ``client.executors``.
+    Commands are answered in memory, and the
+    NoopConnection doesn't pack or parse them either, leaving only the
+    client's dispatch to be timed.
+    """
+
+    ARGUMENTS = (
+        {
+            'name': 'connection',
+            'values': ['loopback', 'noop']
+        },
+        {
+            'name': 'command',
+            'values': ['GET', 'SET', 'INCR', 'HGET']
+        },
+        {
+            'name': 'path',
+            'values': ['generic', 'executor']
+        },
+    )
+
+    def setup(self, connection, command, path):
+        pool = redis.ConnectionPool(connection_class=CONNECTION_CLASSES[
+                                        connection],
+                                    reply=REPLIES[command])
+        self.client = redis.StrictRedis(connection_pool=pool)
+
+    def run(self, connection, command, path):
+        client = self.client
+        args = COMMANDS[command]
+        if path == 'generic':
+            for i in xrange(100):
+                client.execute_command(*args)
+        else:
+            command_name, args = args[0], args[1:]
+            for i in xrange(100):
+                client.executors[command_name](*args)
+
+
+if __name__ == '__main__':
+    CommandExecutorBenchmark().run_benchmark()
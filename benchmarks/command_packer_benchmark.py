@@ -82,7 +82,8 @@ class CommandPackerBenchmark(Benchmark):
     ARGUMENTS = (
         {
             'name': 'connection_class',
-            'values': [StringJoiningConnection, ListJoiningConnection]
+            'values': [StringJoiningConnection, ListJoiningConnection,
+                       Connection]
         },
         {
             'name': 'value_size',
@@ -100,5 +101,32 @@ class CommandPackerBenchmark(Benchmark):
         r.set('benchmark', x)
 
 
+class PackCommandBenchmark(Benchmark):
+    """
+    Packs a SET command without sending it to a server, measuring only the
+    cost of packing and the memory allocated for each packed command.
+    """
+    TRACK_ALLOCATIONS = True
+
+    ARGUMENTS = (
+        {
+            'name': 'connection_class',
+            'values': [ListJoiningConnection, Connection]
+        },
+        {
+            'name': 'value_size',
+            'values': [10, 100, 1000, 10000, 100000]
+        },
+    )
+
+    def setup(self, connection_class, value_size):
+        self.connection = connection_class()
+        self.value = 'a' * value_size
+
+    def run(self, connection_class, value_size):
+        self.connection.pack_command('SET', 'benchmark', self.value)
+
+
 if __name__ == '__main__':
+    PackCommandBenchmark().run_benchmark()
     CommandPackerBenchmark().run_benchmark()
@@ -0,0 +1,72 @@
+import os
+import redis
+import threading
+from redis._compat import xrange
+from base import Benchmark
+
+
+class DummyConnection(object):
+    "A connection that's never connected, so only the pool is timed"
+    description_format = "DummyConnection<>"
+
+    def __init__(self, **kwargs):
+        self.pid = os.getpid()
+
+    def disconnect(self):
+        pass
+
+
+POOL_CLASSES = {
+    'default': redis.ConnectionPool,
+    'blocking': redis.BlockingConnectionPool,
+    'striped': redis.StripedConnectionPool,
+}
+
+
+class ConnectionPoolBenchmark(Benchmark):
+    """
+    Measures the throughput of checking connections out of a pool and
+    releasing them, with ``threads`` threads doing so concurrently. Each
+    call makes 10000 checkouts in total, split evenly between the threads,
+    and the pool has as many connections as there are threads.
+    """
+
+    NUMBER = 20
+
+    ARGUMENTS = (
+        {
+            'name': 'pool',
+            'values': ['default', 'blocking', 'striped']
+        },
+        {
+            'name': 'threads',
+            'values': [1, 4, 16, 64, 128]
+        },
+    )
+
+    def setup(self, pool, threads):
+        self.pool = POOL_CLASSES[pool](connection_class=DummyConnection,
+                                       max_connections=threads)
+
+    def run(self, pool, threads):
+        pool = self.pool
+        get_connection = pool.get_connection
+        release = pool.release
+        start = threading.Event()
+
+        def checkout():
+            start.wait()
+            for i in xrange(10000 // threads):
+                release(get_connection('GET'))
+
+        workers = [threading.Thread(target=checkout)
+                   for i in xrange(threads)]
+        for worker in workers:
+            worker.start()
+        start.set()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == '__main__':
+    ConnectionPoolBenchmark().run_benchmark()
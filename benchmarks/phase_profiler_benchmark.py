@@ -0,0 +1,46 @@
+import redis
+from redis._compat import xrange
+from base import Benchmark
+from command_executor_benchmark import LoopbackConnection, REPLIES
+
+
+class PhaseProfilerBenchmark(Benchmark):
+    """
+    Measures the cost of profiling GET commands answered in memory: without
+    any listener, with a PhaseProfiler timing none, one in a hundred or
+    every one of the commands, and with a ClientSlowLog, with and without
+    timing the phases of every command.
+    """
+
+    ARGUMENTS = (
+        {
+            'name': 'listener',
+            'values': ['none', 'never', 'profile-1/100', 'profile-1/1',
+                       'slowlog', 'slowlog-phases']
+        },
+    )
+
+    def setup(self, listener):
+        pool = redis.ConnectionPool(connection_class=LoopbackConnection,
+                                    reply=REPLIES['GET'])
+        if listener == 'never':
+            pool.add_listener(redis.PhaseProfiler(sample_every=2 ** 62))
+        elif listener == 'profile-1/100':
+            pool.add_listener(redis.PhaseProfiler(sample_every=100))
+        elif listener == 'profile-1/1':
+            pool.add_listener(redis.PhaseProfiler(sample_every=1))
+        elif listener == 'slowlog':
+            pool.add_listener(redis.ClientSlowLog(threshold=1))
+        elif listener == 'slowlog-phases':
+            pool.add_listener(redis.ClientSlowLog(threshold=1,
+                                                  time_phases=True))
+        self.client = redis.StrictRedis(connection_pool=pool)
+
+    def run(self, listener):
+        client = self.client
+        for i in xrange(100):
+            client.get('foo')
+
+
+if __name__ == '__main__':
+    PhaseProfilerBenchmark().run_benchmark()
@@ -0,0 +1,96 @@
+from redis.connection import (PythonParser, ConnectionError, InvalidResponse,
+                              SERVER_CLOSED_CONNECTION_ERROR, SYM_CRLF, b)
+from redis._compat import byte_to_chr, long, nativestr, xrange
+from base import Benchmark
+from socket_buffer_benchmark import ReplaySocket
+
+
+class RecursivePythonParser(PythonParser):
+    "The recursive PythonParser used prior to the PythonReader state machine"
+    def read_response(self):
+        response = self._buffer.readline()
+        if not response:
+            raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+
+        byte, response = byte_to_chr(response[0]), response[1:]
+
+        if byte not in ('-', '+', ':', '$', '*'):
+            raise InvalidResponse("Protocol Error: %s, %s" %
+                                  (str(byte), str(response)))
+
+        if byte == '-':
+            error = self.parse_error(nativestr(response))
+            if isinstance(error, ConnectionError):
+                raise error
+            return error
+        elif byte == '+':
+            pass
+        elif byte == ':':
+            response = long(response)
+        elif byte == '$':
+            length = int(response)
+            if length == -1:
+                return None
+            response = self._buffer.read(length)
+        elif byte == '*':
+            length = int(response)
+            if length == -1:
+                return None
+            response = [self.read_response() for i in xrange(length)]
+        if isinstance(response, bytes) and self.encoding:
+            response = response.decode(self.encoding)
+        return response
+
+
+def pipeline_reply(count):
+    "The replies to ``count`` pipelined SET, INCR and GET commands"
+    return (b('+OK\r\n:1\r\n$5\r\nhello\r\n') * count, count * 3)
+
+
+def multi_bulk_reply(count):
+    "An LRANGE style reply of ``count`` elements"
+    return (b('*%d\r\n' % count) + b('$5\r\nhello\r\n') * count, 1)
+
+
+def nested_reply(count):
+    "A reply of ``count`` nested multi-bulk replies, as returned by EXEC"
+    return (b('*%d\r\n' % count) +
+            b('*2\r\n:1\r\n*2\r\n$3\r\nfoo\r\n$3\r\nbar\r\n') * count, 1)
+
+
+class PythonParserBenchmark(Benchmark):
+    """
+    Parses canned replies with the PythonParser without talking to a
+    server, so only the cost of parsing is measured.
+    """
+
+    ARGUMENTS = (
+        {
+            'name': 'parser_class',
+            'values': [RecursivePythonParser, PythonParser]
+        },
+        {
+            'name': 'reply',
+            'values': [pipeline_reply, multi_bulk_reply, nested_reply]
+        },
+        {
+            'name': 'count',
+            'values': [10, 100, 1000]
+        },
+    )
+
+    def setup(self, parser_class, reply, count):
+        data, self.replies = reply(count)
+        self.sock = ReplaySocket(data)
+        self.parser = parser_class(socket_read_size=65536)
+        self.parser._attach(self.sock, None)
+
+    def run(self, parser_class, reply, count):
+        self.sock.rewind()
+        read_response = self.parser.read_response
+        for i in xrange(self.replies):
+            read_response()
+
+
+if __name__ == '__main__':
+    PythonParserBenchmark().run_benchmark()
@@ -0,0 +1,138 @@
+import socket
+import sys
+from redis.connection import (SocketBuffer, TimeoutError,
+                              ConnectionError, SERVER_CLOSED_CONNECTION_ERROR,
+                              SYM_CRLF, b)
+from redis._compat import BytesIO, bytes
+from base import Benchmark
+from socket_read_size import SocketReadBenchmark
+
+
+class ReplaySocket(object):
+    "A socket-like object that serves the same canned reply over and over"
+    def __init__(self, data):
+        self.data = data
+        self.view = memoryview(data)
+        self.position = 0
+
+    def rewind(self):
+        self.position = 0
+
+    def recv(self, size):
+        data = self.data[self.position:self.position + size]
+        self.position += len(data)
+        return data
+
+    def recv_into(self, buffer, size=0):
+        size = min(size or len(buffer), len(self.data) - self.position)
+        buffer[:size] = self.view[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+class BytesIOSocketBuffer(object):
+    "The BytesIO backed SocketBuffer used prior to the bytearray version"
+    def __init__(self, socket, socket_read_size):
+        self._sock = socket
+        self.socket_read_size = socket_read_size
+        self._buffer = BytesIO()
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    @property
+    def length(self):
+        return self.bytes_written - self.bytes_read
+
+    def _read_from_socket(self, length=None):
+        socket_read_size = self.socket_read_size
+        buf = self._buffer
+        buf.seek(self.bytes_written)
+        marker = 0
+
+        try:
+            while True:
+                data = self._sock.recv(socket_read_size)
+                if isinstance(data, bytes) and len(data) == 0:
+                    raise socket.error(SERVER_CLOSED_CONNECTION_ERROR)
+                buf.write(data)
+                data_length = len(data)
+                self.bytes_written += data_length
+                marker += data_length
+
+                if length is not None and length > marker:
+                    continue
+                break
+        except socket.timeout:
+            raise TimeoutError("Timeout reading from socket")
+        except socket.error:
+            e = sys.exc_info()[1]
+            raise ConnectionError("Error while reading from socket: %s" %
+                                  (e.args,))
+
+    def read(self, length):
+        length = length + 2
+        if length > self.length:
+            self._read_from_socket(length - self.length)
+
+        self._buffer.seek(self.bytes_read)
+        data = self._buffer.read(length)
+        self.bytes_read += len(data)
+
+        if self.bytes_read == self.bytes_written:
+            self.purge()
+
+        return data[:-2]
+
+    def readline(self):
+        buf = self._buffer
+        buf.seek(self.bytes_read)
+        data = buf.readline()
+        while not data.endswith(SYM_CRLF):
+            self._read_from_socket()
+            buf.seek(self.bytes_read)
+            data = buf.readline()
+
+        self.bytes_read += len(data)
+
+        if self.bytes_read == self.bytes_written:
+            self.purge()
+
+        return data[:-2]
+
+    def purge(self):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+
+class SocketBufferBenchmark(Benchmark):
+    """
+    Reads a bulk reply from a SocketBuffer without talking to a server, so
+    only the cost of buffering is measured.
+    """
+
+    ARGUMENTS = (
+        {
+            'name': 'buffer_class',
+            'values': [BytesIOSocketBuffer, SocketBuffer]
+        },
+        {
+            'name': 'value_size',
+            'values': SocketReadBenchmark.ARGUMENTS[1]['values']
+        },
+    )
+
+    def setup(self, buffer_class, value_size):
+        reply = b('$%d\r\n' % value_size) + b('a') * value_size + SYM_CRLF
+        self.sock = ReplaySocket(reply)
+        self.buffer = buffer_class(self.sock, 65536)
+
+    def run(self, buffer_class, value_size):
+        self.sock.rewind()
+        length = int(self.buffer.readline()[1:])
+        self.buffer.read(length)
+
+
+if __name__ == '__main__':
+    SocketBufferBenchmark().run_benchmark()
@@ -16,7 +16,7 @@ class SocketReadBenchmark(Benchmark):
         },
         {
             'name': 'read_size',
-            'values': [4096, 8192, 16384, 32768, 65536, 131072]
+            'values': [4096, 8192, 16384, 32768, 65536, 131072, 'adaptive']
         }
     )
 
@@ -0,0 +1,108 @@
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import redis
+from base import Benchmark
+
+
+class TLSEchoServer(object):
+    """
+    A local stand-in for a TLS terminated endpoint, echoing back whatever
+    it receives, with a self signed certificate made by the openssl command
+    """
+    def __init__(self):
+        self.directory = tempfile.mkdtemp()
+        self.certfile = os.path.join(self.directory, 'cert.pem')
+        self.keyfile = os.path.join(self.directory, 'key.pem')
+        subprocess.check_call(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+             '-days', '1', '-subj', '/CN=localhost',
+             '-keyout', self.keyfile, '-out', self.certfile],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(self.certfile, self.keyfile)
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(128)
+        self.port = self.listener.getsockname()[1]
+        thread = threading.Thread(target=self.accept)
+        thread.daemon = True
+        thread.start()
+
+    def accept(self):
+        while True:
+            try:
+                sock = self.listener.accept()[0]
+            except socket.error:
+                return
+            thread = threading.Thread(target=self.serve, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def serve(self, sock):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            sock = self.context.wrap_socket(sock, server_side=True)
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                sock.sendall(data)
+        except (socket.error, ssl.SSLError):
+            pass
+        finally:
+            sock.close()
+
+    def close(self):
+        self.listener.close()
+        shutil.rmtree(self.directory)
+
+
+class SSLHandshakeBenchmark(Benchmark):
+    """
+    Measures reconnecting an SSLConnection to a local TLS echo server, with
+    and without resuming the TLS session of its previous connection. Each
+    connection sends and reads a command before it's closed, as TLS 1.3
+    servers send their session tickets after the handshake.
+    """
+
+    NUMBER = 200
+
+    ARGUMENTS = (
+        {
+            'name': 'resumption',
+            'values': [False, True]
+        },
+    )
+
+    def __init__(self, server):
+        super(SSLHandshakeBenchmark, self).__init__()
+        self.server = server
+
+    def setup(self, resumption):
+        kwargs = {}
+        if not resumption:
+            kwargs['ssl_session_cache'] = False
+        pool = redis.ConnectionPool(connection_class=redis.SSLConnection,
+                                    port=self.server.port, **kwargs)
+        self.connection = pool.get_connection('_')
+
+    def run(self, resumption):
+        connection = self.connection
+        connection.connect()
+        # the server echoes the command back, which reads as an array
+        connection.send_command('PING')
+        connection.read_response()
+        connection.disconnect()
+
+
+if __name__ == '__main__':
+    server = TLSEchoServer()
+    try:
+        SSLHandshakeBenchmark(server).run_benchmark()
+    finally:
+        server.close()
@@ -1,11 +1,26 @@
 from redis.client import Redis, StrictRedis
+from redis.cache import ClientCache
+from redis.compression import CompressionCodec
 from redis.connection import (
+    AutoPipelineConnection,
+    AutoPipelineConnectionPool,
     BlockingConnectionPool,
     ConnectionPool,
     Connection,
     SSLConnection,
+    StripedConnectionPool,
     UnixDomainSocketConnection
 )
+from redis.events import CommandEvent, EventListener
+from redis.metrics import MetricsCollector
+from redis.profiler import PhaseProfiler
+from redis.serializers import (
+    JSONSerializer,
+    PickleSerializer,
+    SerializerRegistry,
+    StructSerializer
+)
+from redis.slowlog import ClientSlowLog
 from redis.utils import from_url
 from redis.exceptions import (
     AuthenticationError,
@@ -27,6 +42,11 @@ VERSION = tuple(map(int, __version__.split('.')))
 
 __all__ = [
     'Redis', 'StrictRedis', 'ConnectionPool', 'BlockingConnectionPool',
+    'AutoPipelineConnectionPool', 'AutoPipelineConnection',
+    'StripedConnectionPool', 'ClientCache', 'CompressionCodec',
+    'SerializerRegistry', 'JSONSerializer', 'PickleSerializer',
+    'StructSerializer', 'EventListener', 'CommandEvent', 'MetricsCollector',
+    'ClientSlowLog', 'PhaseProfiler',
     'Connection', 'SSLConnection', 'UnixDomainSocketConnection', 'from_url',
     'AuthenticationError', 'BusyLoadingError', 'ConnectionError', 'DataError',
     'InvalidResponse', 'PubSubError', 'ReadOnlyError', 'RedisError',
@@ -0,0 +1,713 @@
+"""
+An asyncio native client.
+
+``AsyncStrictRedis`` provides the same commands as ``StrictRedis``, but every
+command returns an awaitable::
+
+    >>> r = AsyncStrictRedis(host='localhost', port=6379, db=0)
+    >>> await r.set('foo', 'bar')
+    True
+    >>> await r.get('foo')
+    b'bar'
+
+Connections are built on asyncio streams and replies are parsed
+incrementally by feeding received data to the parser, so reading a large
+reply never blocks the event loop. This module requires Python 3.6+.
+"""
+import asyncio
+import os
+import sys
+from itertools import chain
+
+from redis._compat import izip, nativestr
+from redis.client import StrictRedis, BasePipeline
+from redis.connection import (AdaptiveReadSize, Connection, DefaultParser,
+                              SSLConnection, parse_url)
+from redis.exceptions import (
+    ConnectionError,
+    ExecAbortError,
+    RedisError,
+    ResponseError,
+    TimeoutError,
+    WatchError,
+    AuthenticationError,
+)
+
+
+class AsyncConnection(object):
+    "Manages asyncio stream communication to and from a Redis server"
+    description_format = \
+        "AsyncConnection<host=%(host)s,port=%(port)s,db=%(db)s>"
+    # values aren't compressed or serialized by the asyncio client
+    codec = None
+    serializers = None
+    transform_replies = False
+    timings = None
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None,
+                 socket_timeout=None, socket_connect_timeout=None,
+                 retry_on_timeout=False, encoding='utf-8',
+                 encoding_errors='strict', decode_responses=False,
+                 parser_class=DefaultParser, socket_read_size=65536,
+                 path=None, ssl=None):
+        self.pid = os.getpid()
+        self.host = host
+        self.port = int(port)
+        self.path = path
+        self.db = db
+        self.password = password
+        self.socket_timeout = socket_timeout
+        self.socket_connect_timeout = socket_connect_timeout or socket_timeout
+        self.retry_on_timeout = retry_on_timeout
+        self.encoding = encoding
+        self.encoding_errors = encoding_errors
+        self.decode_responses = decode_responses
+        self._encoders = self._make_encoders()
+        self.socket_read_size = socket_read_size
+        self._read_size = None
+        if socket_read_size == 'adaptive':
+            self._read_size = AdaptiveReadSize()
+        self.ssl = ssl
+        self._sock = None
+        self._reader = None
+        self._writer = None
+        self._parser = parser_class(socket_read_size=socket_read_size)
+        self._buffer_cutoff = 6000
+        if path:
+            self.description_format = \
+                "AsyncConnection<path=%(path)s,db=%(db)s>"
+        self._description_args = {
+            'host': self.host,
+            'port': self.port,
+            'path': self.path,
+            'db': self.db,
+        }
+
+    def __repr__(self):
+        return self.description_format % self._description_args
+
+    # packing commands doesn't do any I/O, so it's shared with Connection
+    _make_encoders = Connection._make_encoders
+    encode = Connection.encode
+    encode_all = Connection.encode_all
+    pack_command = Connection.pack_command
+    pack_commands = Connection.pack_commands
+
+    @property
+    def is_connected(self):
+        return self._writer is not None
+
+    async def connect(self):
+        "Connects to the Redis server if not already connected"
+        if self._writer is not None:
+            return
+        try:
+            if self.path:
+                connection = asyncio.open_unix_connection(self.path)
+            else:
+                connection = asyncio.open_connection(self.host, self.port,
+                                                     ssl=self.ssl)
+            self._reader, self._writer = await asyncio.wait_for(
+                connection, self.socket_connect_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timeout connecting to server")
+        except OSError:
+            e = sys.exc_info()[1]
+            raise ConnectionError(self._error_message(e))
+
+        try:
+            await self.on_connect()
+        except RedisError:
+            # clean up after any error in on_connect
+            self.disconnect()
+            raise
+
+    def _error_message(self, exception):
+        if self.path:
+            location = 'unix socket: %s' % self.path
+        else:
+            location = '%s:%s' % (self.host, self.port)
+        if len(exception.args) == 1:
+            return "Error connecting to %s. %s." % (location,
+                                                    exception.args[0])
+        return "Error %s connecting to %s. %s." % \
+            (exception.args[0], location, exception.args[1])
+
+    async def on_connect(self):
+        "Initialize the connection, authenticate and select a database"
+        self._parser.on_connect(self)
+
+        if self.password:
+            await self.send_command('AUTH', self.password)
+            if nativestr(await self.read_response()) != 'OK':
+                raise AuthenticationError('Invalid Password')
+
+        if self.db:
+            await self.send_command('SELECT', self.db)
+            if nativestr(await self.read_response()) != 'OK':
+                raise ConnectionError('Invalid Database')
+
+    def disconnect(self):
+        "Disconnects from the Redis server"
+        self._parser.on_disconnect()
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+        except Exception:
+            pass
+        self._reader = None
+        self._writer = None
+
+    async def send_packed_command(self, command):
+        "Send an already packed command to the Redis server"
+        if self._writer is None:
+            await self.connect()
+        if isinstance(command, bytes):
+            command = [command]
+        try:
+            self._writer.writelines(command)
+            await asyncio.wait_for(self._writer.drain(), self.socket_timeout)
+        except asyncio.TimeoutError:
+            self.disconnect()
+            raise TimeoutError("Timeout writing to socket")
+        except OSError:
+            e = sys.exc_info()[1]
+            self.disconnect()
+            raise ConnectionError("Error while writing to socket. %s." %
+                                  (e.args,))
+        except BaseException:
+            self.disconnect()
+            raise
+
+    async def send_command(self, *args):
+        "Pack and send a command to the Redis server"
+        await self.send_packed_command(self.pack_command(*args))
+
+    async def _read_from_stream(self):
+        read_size = self._read_size
+        if read_size is not None:
+            socket_read_size = read_size.size
+        else:
+            socket_read_size = self.socket_read_size
+        try:
+            data = await asyncio.wait_for(
+                self._reader.read(socket_read_size), self.socket_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timeout reading from socket")
+        except OSError:
+            e = sys.exc_info()[1]
+            raise ConnectionError("Error while reading from socket: %s" %
+                                  (e.args,))
+        if not data:
+            raise ConnectionError("Connection closed by server.")
+        if read_size is not None:
+            read_size.record(len(data), socket_read_size)
+        self._parser.feed(data)
+
+    async def read_response(self):
+        "Read the response from a previously sent command"
+        if self._reader is None:
+            raise ConnectionError("Connection closed by server.")
+        try:
+            response = self._parser.gets()
+            while response is False:
+                await self._read_from_stream()
+                response = self._parser.gets()
+        except BaseException:
+            self.disconnect()
+            raise
+        if isinstance(response, ResponseError):
+            raise response
+        return response
+
+
+class AsyncConnectionPool(object):
+    """
+    A pool of AsyncConnections. At most ``max_connections`` connections are
+    open at once. When they're all in use, ``get_connection`` waits up to
+    ``timeout`` seconds for one to be released before raising a
+    ``ConnectionError``. A ``timeout`` of None waits forever.
+    """
+    @classmethod
+    def from_url(cls, url, db=None, **kwargs):
+        """
+        Return a connection pool configured from the given URL, as
+        ``ConnectionPool.from_url`` does. rediss:// URLs connect with SSL.
+        """
+        url_options = parse_url(url, db)
+        # the path and ssl options of AsyncConnection stand in for the
+        # connection classes
+        if url_options.pop('connection_class', None) is SSLConnection:
+            url_options['ssl'] = True
+        kwargs.update(url_options)
+        return cls(**kwargs)
+
+    def __init__(self, connection_class=AsyncConnection, max_connections=50,
+                 timeout=20, **connection_kwargs):
+        if not isinstance(max_connections, int) or max_connections < 1:
+            raise ValueError('"max_connections" must be a positive integer')
+        self.connection_class = connection_class
+        self.connection_kwargs = connection_kwargs
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.reset()
+
+    def __repr__(self):
+        return "%s<%s>" % (
+            type(self).__name__,
+            self.connection_class(**self.connection_kwargs),
+        )
+
+    def reset(self):
+        self.pid = os.getpid()
+        self._created_connections = 0
+        self._available_connections = []
+        self._in_use_connections = set()
+        self._semaphore = None
+
+    def _checkpid(self):
+        if self.pid != os.getpid():
+            self.disconnect()
+            self.reset()
+
+    async def get_connection(self, command_name, *keys, **options):
+        "Get a connection from the pool"
+        self._checkpid()
+        if self._semaphore is None:
+            # created lazily so the pool can be built outside of a running
+            # event loop
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError("No connection available.")
+        try:
+            connection = self._available_connections.pop()
+        except IndexError:
+            connection = self.make_connection()
+        self._in_use_connections.add(connection)
+        return connection
+
+    def make_connection(self):
+        "Create a new connection"
+        self._created_connections += 1
+        return self.connection_class(**self.connection_kwargs)
+
+    def release(self, connection):
+        "Releases the connection back to the pool"
+        self._checkpid()
+        if connection.pid != self.pid:
+            return
+        self._in_use_connections.remove(connection)
+        self._available_connections.append(connection)
+        self._semaphore.release()
+
+    def disconnect(self):
+        "Disconnects all connections in the pool"
+        all_conns = chain(self._available_connections,
+                          self._in_use_connections)
+        for connection in all_conns:
+            connection.disconnect()
+
+
+class _unsupported(object):
+    """
+    Hides the StrictRedis method ``name`` on AsyncStrictRedis, so looking it
+    up raises AttributeError rather than returning a method that blocks or
+    can't be awaited
+    """
+    def __init__(self, name, hint=None):
+        self.name = name
+        self.hint = hint
+
+    def __get__(self, client, cls):
+        message = "'%s' object has no attribute '%s'" % (cls.__name__,
+                                                         self.name)
+        if self.hint:
+            message = '%s. %s' % (message, self.hint)
+        raise AttributeError(message)
+
+
+class AsyncStrictRedis(StrictRedis):
+    """
+    An asyncio version of StrictRedis. All command methods and response
+    callbacks are shared with StrictRedis; each command returns an awaitable
+    that resolves to the parsed response.
+
+    The StrictRedis helpers that block or use replies synchronously don't
+    exist on this class: ``lock``, ``pubsub``, ``register_script``, item
+    access (``r[name]``) and the methods streaming replies or values:
+    ``get_into``, ``get_to_file``, ``set_from_file``, ``keys_iter``,
+    ``lrange_iter``, ``smembers_iter`` and ``hgetall_iter``.
+    """
+    def __init__(self, host='localhost', port=6379, db=0, password=None,
+                 socket_timeout=None, socket_connect_timeout=None,
+                 connection_pool=None, unix_socket_path=None,
+                 encoding='utf-8', encoding_errors='strict',
+                 decode_responses=False, retry_on_timeout=False,
+                 max_connections=50, ssl=None):
+        if not connection_pool:
+            connection_pool = AsyncConnectionPool(
+                host=host,
+                port=port,
+                path=unix_socket_path,
+                db=db,
+                password=password,
+                socket_timeout=socket_timeout,
+                socket_connect_timeout=socket_connect_timeout,
+                encoding=encoding,
+                encoding_errors=encoding_errors,
+                decode_responses=decode_responses,
+                retry_on_timeout=retry_on_timeout,
+                max_connections=max_connections,
+                ssl=ssl,
+            )
+        self.connection_pool = connection_pool
+        self._use_lua_lock = None
+        self.response_callbacks = self.__class__.RESPONSE_CALLBACKS.copy()
+
+    @classmethod
+    def from_url(cls, url, db=None, **kwargs):
+        """
+        Return a client configured from the given URL, as
+        ``StrictRedis.from_url`` does
+        """
+        connection_pool = AsyncConnectionPool.from_url(url, db=db, **kwargs)
+        return cls(connection_pool=connection_pool)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        """
+        Return a new AsyncPipeline object that can queue multiple commands
+        for later execution with ``await pipe.execute()``.
+        """
+        return AsyncPipeline(
+            self.connection_pool,
+            self.response_callbacks,
+            transaction,
+            shard_hint)
+
+    async def transaction(self, func, *watches, **kwargs):
+        """
+        Execute the coroutine function ``func`` as a transaction while
+        watching all keys specified in ``watches``, as
+        ``StrictRedis.transaction`` does. ``func`` is awaited with the
+        AsyncPipeline as its only argument.
+        """
+        shard_hint = kwargs.pop('shard_hint', None)
+        value_from_callable = kwargs.pop('value_from_callable', False)
+        watch_delay = kwargs.pop('watch_delay', None)
+        async with self.pipeline(True, shard_hint) as pipe:
+            while 1:
+                try:
+                    if watches:
+                        await pipe.watch(*watches)
+                    func_value = await func(pipe)
+                    exec_value = await pipe.execute()
+                    return func_value if value_from_callable else exec_value
+                except WatchError:
+                    if watch_delay is not None and watch_delay > 0:
+                        await asyncio.sleep(watch_delay)
+                    continue
+
+    async def shutdown(self):
+        "Shutdown the server"
+        try:
+            await self.execute_command('SHUTDOWN')
+        except ConnectionError:
+            # a ConnectionError here is expected
+            return
+        raise RedisError("SHUTDOWN seems to have failed.")
+
+    lock = _unsupported('lock')
+    pubsub = _unsupported('pubsub')
+    # scripts check whether they're loaded synchronously
+    register_script = _unsupported('register_script',
+                                   'Use evalsha and script_load instead.')
+    # an item can't be awaited without a method call
+    __getitem__ = _unsupported('__getitem__', 'Use get instead.')
+    __setitem__ = _unsupported('__setitem__', 'Use set instead.')
+    __delitem__ = _unsupported('__delitem__', 'Use delete instead.')
+    # replies and values are streamed with blocking socket calls
+    get_into = _unsupported('get_into', 'Use get instead.')
+    get_to_file = _unsupported('get_to_file', 'Use get instead.')
+    set_from_file = _unsupported('set_from_file', 'Use set instead.')
+    keys_iter = _unsupported('keys_iter', 'Use scan_iter instead.')
+    lrange_iter = _unsupported('lrange_iter', 'Use lrange instead.')
+    smembers_iter = _unsupported('smembers_iter', 'Use sscan_iter instead.')
+    hgetall_iter = _unsupported('hgetall_iter', 'Use hscan_iter instead.')
+
+    # COMMAND EXECUTION AND PROTOCOL PARSING
+    async def execute_command(self, *args, **options):
+        "Execute a command and return a parsed response"
+        pool = self.connection_pool
+        command_name = args[0]
+        connection = await pool.get_connection(command_name, **options)
+        try:
+            await connection.send_command(*args)
+            return await self.parse_response(connection, command_name,
+                                             **options)
+        except (ConnectionError, TimeoutError) as e:
+            connection.disconnect()
+            if not connection.retry_on_timeout and isinstance(e, TimeoutError):
+                raise
+            await connection.send_command(*args)
+            return await self.parse_response(connection, command_name,
+                                             **options)
+        finally:
+            pool.release(connection)
+
+    async def parse_response(self, connection, command_name, **options):
+        "Parses a response from the Redis server"
+        response = await connection.read_response()
+        if command_name in self.response_callbacks:
+            return self.response_callbacks[command_name](response, **options)
+        return response
+
+    # the scan iterators are async generators
+    async def scan_iter(self, match=None, count=None):
+        "An async iterator over the keys matched by the SCAN command"
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = await self.scan(cursor=cursor, match=match,
+                                           count=count)
+            for item in data:
+                yield item
+
+    async def sscan_iter(self, name, match=None, count=None):
+        "An async iterator over the members matched by the SSCAN command"
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = await self.sscan(name, cursor=cursor,
+                                            match=match, count=count)
+            for item in data:
+                yield item
+
+    async def hscan_iter(self, name, match=None, count=None):
+        "An async iterator over the fields matched by the HSCAN command"
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = await self.hscan(name, cursor=cursor,
+                                            match=match, count=count)
+            for item in data.items():
+                yield item
+
+    async def zscan_iter(self, name, match=None, count=None,
+                         score_cast_func=float):
+        "An async iterator over the members matched by the ZSCAN command"
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = await self.zscan(name, cursor=cursor, match=match,
+                                            count=count,
+                                            score_cast_func=score_cast_func)
+            for item in data:
+                yield item
+
+
+class AsyncPipeline(AsyncStrictRedis):
+    """
+    An asyncio version of StrictPipeline. Commands are buffered until
+    ``await pipe.execute()`` is called, so they can be chained::
+
+        >>> await r.pipeline().set('foo', 'bar').get('foo').execute()
+        [True, b'bar']
+
+    After ``await pipe.watch(...)``, commands are executed immediately and
+    must be awaited until ``pipe.multi()`` is called.
+    """
+    UNWATCH_COMMANDS = BasePipeline.UNWATCH_COMMANDS
+
+    def __init__(self, connection_pool, response_callbacks, transaction,
+                 shard_hint):
+        self.connection_pool = connection_pool
+        self.connection = None
+        self.response_callbacks = response_callbacks
+        self.transaction = transaction
+        self.shard_hint = shard_hint
+        self.watching = False
+        self.command_stack = []
+        self.explicit_transaction = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.reset()
+
+    def __len__(self):
+        return len(self.command_stack)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        raise RedisError("Cannot create a pipeline from a pipeline")
+
+    async def reset(self):
+        self.command_stack = []
+        # make sure to reset the connection state in the event that we were
+        # watching something
+        if self.watching and self.connection:
+            try:
+                await self.connection.send_command('UNWATCH')
+                await self.connection.read_response()
+            except ConnectionError:
+                self.connection.disconnect()
+        self.watching = False
+        self.explicit_transaction = False
+        if self.connection:
+            self.connection_pool.release(self.connection)
+            self.connection = None
+
+    multi = BasePipeline.multi
+    annotate_exception = BasePipeline.annotate_exception
+    raise_first_error = BasePipeline.raise_first_error
+    pipeline_execute_command = BasePipeline.pipeline_execute_command
+
+    def execute_command(self, *args, **kwargs):
+        if (self.watching or args[0] == 'WATCH') and \
+                not self.explicit_transaction:
+            return self.immediate_execute_command(*args, **kwargs)
+        return self.pipeline_execute_command(*args, **kwargs)
+
+    async def immediate_execute_command(self, *args, **options):
+        """
+        Execute a command immediately, but don't auto-retry on a
+        ConnectionError if we're already WATCHing a variable.
+        """
+        command_name = args[0]
+        conn = self.connection
+        if not conn:
+            conn = await self.connection_pool.get_connection(
+                command_name, self.shard_hint)
+            self.connection = conn
+        try:
+            await conn.send_command(*args)
+            return await self.parse_response(conn, command_name, **options)
+        except (ConnectionError, TimeoutError) as e:
+            conn.disconnect()
+            if not conn.retry_on_timeout and isinstance(e, TimeoutError):
+                raise
+            if self.watching:
+                await self.reset()
+                raise WatchError("A ConnectionError occured on while "
+                                 "watching one or more keys")
+            await conn.send_command(*args)
+            return await self.parse_response(conn, command_name, **options)
+
+    async def parse_response(self, connection, command_name, **options):
+        result = await AsyncStrictRedis.parse_response(
+            self, connection, command_name, **options)
+        if command_name in self.UNWATCH_COMMANDS:
+            self.watching = False
+        elif command_name == 'WATCH':
+            self.watching = True
+        return result
+
+    async def _execute_transaction(self, connection, commands,
+                                   raise_on_error):
+        cmds = chain([(('MULTI', ), {})], commands, [(('EXEC', ), {})])
+        all_cmds = connection.pack_commands([args for args, _ in cmds])
+        await connection.send_packed_command(all_cmds)
+        errors = []
+
+        # parse off the response for MULTI and all the queued commands
+        try:
+            await self.parse_response(connection, '_')
+        except ResponseError:
+            errors.append((0, sys.exc_info()[1]))
+        for i, command in enumerate(commands):
+            try:
+                await self.parse_response(connection, '_')
+            except ResponseError:
+                ex = sys.exc_info()[1]
+                self.annotate_exception(ex, i + 1, command[0])
+                errors.append((i, ex))
+
+        # parse the EXEC.
+        try:
+            response = await self.parse_response(connection, '_')
+        except ExecAbortError:
+            if self.explicit_transaction:
+                await self.immediate_execute_command('DISCARD')
+            if errors:
+                raise errors[0][1]
+            raise sys.exc_info()[1]
+
+        if response is None:
+            raise WatchError("Watched variable changed.")
+
+        for i, e in errors:
+            response.insert(i, e)
+
+        if len(response) != len(commands):
+            connection.disconnect()
+            raise ResponseError("Wrong number of response items from "
+                                "pipeline execution")
+
+        if raise_on_error:
+            self.raise_first_error(commands, response)
+
+        data = []
+        for r, cmd in izip(response, commands):
+            if not isinstance(r, Exception):
+                args, options = cmd
+                command_name = args[0]
+                if command_name in self.response_callbacks:
+                    r = self.response_callbacks[command_name](r, **options)
+            data.append(r)
+        return data
+
+    async def _execute_pipeline(self, connection, commands, raise_on_error):
+        all_cmds = connection.pack_commands([args for args, _ in commands])
+        await connection.send_packed_command(all_cmds)
+
+        response = []
+        for args, options in commands:
+            try:
+                response.append(await self.parse_response(
+                    connection, args[0], **options))
+            except ResponseError:
+                response.append(sys.exc_info()[1])
+
+        if raise_on_error:
+            self.raise_first_error(commands, response)
+        return response
+
+    async def execute(self, raise_on_error=True):
+        "Execute all the commands in the current pipeline"
+        stack = self.command_stack
+        if not stack:
+            return []
+        if self.transaction or self.explicit_transaction:
+            execute = self._execute_transaction
+        else:
+            execute = self._execute_pipeline
+
+        conn = self.connection
+        if not conn:
+            conn = await self.connection_pool.get_connection(
+                'MULTI', self.shard_hint)
+            self.connection = conn
+
+        try:
+            return await execute(conn, stack, raise_on_error)
+        except (ConnectionError, TimeoutError) as e:
+            conn.disconnect()
+            if not conn.retry_on_timeout and isinstance(e, TimeoutError):
+                raise
+            if self.watching:
+                raise WatchError("A ConnectionError occured on while watching "
+                                 "one or more keys")
+            return await execute(conn, stack, raise_on_error)
+        finally:
+            await self.reset()
+
+    async def watch(self, *names):
+        "Watches the values at keys ``names``"
+        if self.explicit_transaction:
+            raise RedisError('Cannot issue a WATCH after a MULTI')
+        return await self.immediate_execute_command('WATCH', *names)
+
+    async def unwatch(self):
+        "Unwatches all previously specified keys"
+        if self.watching:
+            return await self.immediate_execute_command('UNWATCH')
+        return True
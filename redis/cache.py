@@ -0,0 +1,411 @@
+from __future__ import with_statement
+import os
+import threading
+import time
+
+from redis._compat import b, unicode, bytes, long, nativestr
+from redis.client import PubSub
+from redis.connection import (BlockingConnectionPool, ConnectionPool,
+                              pop_pool_options)
+from redis import events
+from redis.exceptions import ConnectionError, TimeoutError, ResponseError
+
+
+INVALIDATE_CHANNEL = '__redis__:invalidate'
+
+# the links of an entry in the LRU list
+PREV, NEXT, KEY, VALUE, NAME = 0, 1, 2, 3, 4
+
+
+class ClientCache(object):
+    """
+    A bounded, least recently used cache of the replies to GET, HGET, HGETALL
+    and MGET, kept coherent with the server using client side caching::
+
+        >>> r = StrictRedis(client_cache=ClientCache(max_size=10000))
+        >>> r.get('foo')  # read from the server
+        >>> r.get('foo')  # served from the cache
+
+    Replies are read over connections that have ``CLIENT TRACKING`` enabled,
+    in OPTIN mode with invalidation messages redirected to a dedicated
+    PubSub connection. Pending invalidation messages are processed before
+    each lookup, so an entry is never served after its invalidation message
+    has been received. The cache is flushed whenever a connection used by
+    it is lost, as the server forgets the keys tracked for that connection.
+
+    Requires Redis 6.0 or later.
+    """
+    COMMANDS = set(('GET', 'HGET', 'HGETALL', 'MGET'))
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.connection_pool = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.RLock()
+        self._reset()
+
+    def __repr__(self):
+        return "%s<size=%d, max_size=%d>" % (
+            type(self).__name__, len(self), self.max_size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self._pool = None
+        self._pubsub = None
+        self._pubsub_socket = None
+        self._redirect_id = None
+        # bumped every time the cache is cleared. replies are only added to
+        # the cache if it wasn't cleared while they were being read
+        self._generation = 0
+        # the number of replies being read for each key name, and the names
+        # that were invalidated while they were being read
+        self._reading = {}
+        self._stale = set()
+        self._clear()
+
+    def _clear(self):
+        # a circular doubly linked list ordered from least to most recently
+        # used, and a mapping of cache keys to its links
+        self._root = root = []
+        root[:] = [root, root, None, None, None]
+        self._entries = {}
+        # a mapping of key names to the cache keys of replies they affect
+        self._names = {}
+
+    def bind(self, connection_pool):
+        """
+        Cache the replies of clients using ``connection_pool``. The cache
+        makes its own connections, using the same connection settings.
+        """
+        if self.connection_pool is not None and \
+                self.connection_pool is not connection_pool:
+            raise ValueError("%r is already bound to %r" %
+                             (self, self.connection_pool))
+        self.connection_pool = connection_pool
+
+    def clear(self):
+        "Remove all entries from the cache"
+        with self._lock:
+            self._generation += 1
+            self._clear()
+
+    def stats(self):
+        "Return a dict of the cache's counters"
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def encode(self, value):
+        "Return the bytes representation of a key or field name"
+        if isinstance(value, bytes):
+            return value
+        kwargs = self.connection_pool.connection_kwargs
+        if isinstance(value, unicode):
+            return value.encode(kwargs.get('encoding', 'utf-8'),
+                                kwargs.get('encoding_errors', 'strict'))
+        if isinstance(value, (int, long)):
+            return b(str(value))
+        if isinstance(value, float):
+            return b(repr(value))
+        return b(str(value))
+
+    # LRU
+    def _lookup(self, key):
+        "Return the entry for ``key`` and mark it as recently used"
+        link = self._entries.get(key)
+        if link is not None:
+            prev, next = link[PREV], link[NEXT]
+            prev[NEXT] = next
+            next[PREV] = prev
+            root = self._root
+            last = root[PREV]
+            last[NEXT] = root[PREV] = link
+            link[PREV] = last
+            link[NEXT] = root
+        return link
+
+    def _store(self, key, name, value):
+        if key in self._entries:
+            self._remove(self._entries[key])
+        root = self._root
+        last = root[PREV]
+        link = [last, root, key, value, name]
+        last[NEXT] = root[PREV] = link
+        self._entries[key] = link
+        self._names.setdefault(name, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(root[NEXT])
+            self.evictions += 1
+
+    def _remove(self, link):
+        link[PREV][NEXT] = link[NEXT]
+        link[NEXT][PREV] = link[PREV]
+        key, name = link[KEY], link[NAME]
+        del self._entries[key]
+        keys = self._names.get(name)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._names[name]
+
+    def invalidate(self, name):
+        "Remove all of the entries for the key ``name``"
+        name = self.encode(name)
+        with self._lock:
+            if name in self._reading:
+                self._stale.add(name)
+            for key in self._names.pop(name, ()):
+                link = self._entries.get(key)
+                if link is not None:
+                    # _remove would look the key up in _names again
+                    link[PREV][NEXT] = link[NEXT]
+                    link[NEXT][PREV] = link[PREV]
+                    del self._entries[key]
+                    self.invalidations += 1
+
+    # invalidation messages
+    def _listen(self):
+        "Connect the PubSub connection invalidation messages are sent to"
+        pubsub = PubSub(self._pool)
+        try:
+            pubsub.execute_command('CLIENT ID')
+            self._redirect_id = pubsub.parse_response()
+            pubsub.subscribe(INVALIDATE_CHANNEL)
+        except:
+            pubsub.reset()
+            raise
+        self._pubsub = pubsub
+        self._pubsub_socket = pubsub.connection._sock
+
+    def _lost_listener(self):
+        "Flush the cache after the PubSub connection was lost"
+        if self._pubsub is not None:
+            self._pubsub.reset()
+        self._pubsub = self._pubsub_socket = self._redirect_id = None
+        self.clear()
+
+    def process_invalidations(self):
+        "Apply any invalidation messages received from the server"
+        with self._lock:
+            if self.pid != os.getpid():
+                # the connections belong to the parent process
+                self._reset()
+            if self._pool is None:
+                pool = self.connection_pool
+                if isinstance(pool, BlockingConnectionPool):
+                    # so readers wait, with their priority and deadline
+                    self._pool = BlockingConnectionPool(
+                        connection_class=pool.connection_class,
+                        max_connections=pool.max_connections,
+                        timeout=pool.timeout, **pool.connection_kwargs)
+                else:
+                    self._pool = ConnectionPool(
+                        connection_class=pool.connection_class,
+                        max_connections=pool.max_connections,
+                        **pool.connection_kwargs)
+            if self._pubsub is None:
+                self._listen()
+
+            pubsub = self._pubsub
+            try:
+                while True:
+                    message = pubsub.get_message()
+                    if message is None:
+                        break
+                    if message['type'] != 'message':
+                        continue
+                    names = message['data']
+                    if names is None:
+                        # the server's keys were flushed
+                        self.clear()
+                        continue
+                    for name in names:
+                        self.invalidate(name)
+            except (ConnectionError, TimeoutError):
+                self._lost_listener()
+                raise
+            # PubSub reconnects by itself, but the new connection has a
+            # different id than the one invalidations are redirected to
+            connection = pubsub.connection
+            if connection is None or \
+                    connection._sock is not self._pubsub_socket:
+                self._lost_listener()
+                self._listen()
+
+    # reading replies
+    def _get_connection(self, pool_options):
+        """
+        Get a connection that has tracking enabled, passing ``pool_options``
+        to the pool
+        """
+        connection = self._pool.get_connection('GET', **pool_options)
+        try:
+            tracking = getattr(connection, 'client_tracking', None)
+            if tracking is not None and tracking[1] is connection._sock and \
+                    tracking[0] == self._redirect_id:
+                return connection
+            with self._lock:
+                if tracking is not None and \
+                        tracking[1] is not connection._sock:
+                    # the connection was lost since tracking was enabled
+                    self.clear()
+                if self._redirect_id is None:
+                    self._listen()
+            connection.send_command('CLIENT', 'TRACKING', 'ON', 'REDIRECT',
+                                    self._redirect_id, 'OPTIN')
+            if nativestr(connection.read_response()) != 'OK':
+                raise ResponseError("Unable to enable client tracking")
+            connection.client_tracking = (self._redirect_id,
+                                          connection._sock)
+            return connection
+        except:
+            self._pool.release(connection)
+            raise
+
+    def _begin_read(self, names):
+        "Note that the values of ``names`` are about to be read"
+        reading = self._reading
+        for name in names:
+            reading[name] = reading.get(name, 0) + 1
+        return self._generation
+
+    def _end_read(self, names, generation):
+        """
+        Note that the values of ``names`` have been read, returning whether
+        each of them can be cached
+        """
+        reading = self._reading
+        stale = self._stale
+        cleared = generation != self._generation
+        result = []
+        for name in names:
+            result.append(not cleared and name not in stale)
+            count = reading[name] - 1
+            if count:
+                reading[name] = count
+            else:
+                del reading[name]
+                stale.discard(name)
+        return result
+
+    def _read(self, args, names, pool_options):
+        """
+        Execute ``args`` with tracking enabled, telling the listeners of the
+        client's pool about it. Returns the reply and whether the value of
+        each of ``names`` can be cached.
+        """
+        listeners = getattr(self.connection_pool, 'listeners', None)
+        if not listeners:
+            return self._read_tracked(args, names, pool_options)
+        event = events.CommandEvent(args[0], tuple(args),
+                                    pool=self.connection_pool)
+        try:
+            result = self._read_tracked(args, names, pool_options,
+                                        listeners, event)
+        except Exception as e:
+            events.command_finished(listeners, event, e)
+            raise
+        events.command_finished(listeners, event)
+        return result
+
+    def _read_tracked(self, args, names, pool_options, listeners=None,
+                      event=None):
+        "_read(), reporting to ``listeners`` about ``event`` if it's given"
+        if event is None:
+            connection = self._get_connection(pool_options)
+        else:
+            # reported as checked out from the client's pool, whose
+            # connections the cache's stand in for
+            start = time.time()
+            try:
+                connection = self._get_connection(pool_options)
+            finally:
+                event.pool_wait = time.time() - start
+            events.notify(listeners, 'connection_checked_out',
+                          self.connection_pool, connection, event.pool_wait)
+            events.command_started(listeners, event, connection)
+        with self._lock:
+            generation = self._begin_read(names)
+        try:
+            connection.send_packed_command(connection.pack_commands(
+                [('CLIENT', 'CACHING', 'YES'), args]))
+            caching, response = connection.read_responses(2)
+        except (ConnectionError, TimeoutError):
+            connection.disconnect()
+            self.clear()
+            raise
+        finally:
+            self._pool.release(connection)
+            with self._lock:
+                cacheable = self._end_read(names, generation)
+        for reply in (caching, response):
+            if isinstance(reply, ResponseError):
+                raise reply
+        return response, cacheable
+
+    def execute_command(self, client, *args, **options):
+        """
+        Execute a cacheable command for ``client``. The options meant for
+        the pool are used when the reply has to be read from the server
+        """
+        pool_options = pop_pool_options(options)
+        self.process_invalidations()
+        command_name = args[0]
+        if command_name == 'MGET':
+            response = self._mget(args[1:], pool_options)
+        else:
+            key = (command_name,) + tuple([self.encode(arg)
+                                           for arg in args[1:]])
+            with self._lock:
+                link = self._lookup(key)
+                if link is not None:
+                    self.hits += 1
+                    response = link[VALUE]
+                else:
+                    self.misses += 1
+            if link is None:
+                response, cacheable = self._read(args, key[1:2],
+                                                 pool_options)
+                if cacheable[0]:
+                    with self._lock:
+                        self._store(key, key[1], response)
+        if command_name in client.response_callbacks:
+            response = client.response_callbacks[command_name](
+                response, **options)
+        return response
+
+    def _mget(self, names, pool_options):
+        "MGET ``names``, only reading the values that aren't cached"
+        keys = [('GET', self.encode(name)) for name in names]
+        response = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                link = self._lookup(key)
+                if link is not None:
+                    self.hits += 1
+                    response[i] = link[VALUE]
+                else:
+                    self.misses += 1
+                    missing.append(i)
+        if missing:
+            values, cacheable = self._read(
+                ['MGET'] + [names[i] for i in missing],
+                [keys[i][1] for i in missing], pool_options)
+            with self._lock:
+                for i, value, store in zip(missing, values, cacheable):
+                    response[i] = value
+                    if store:
+                        self._store(keys[i], keys[i][1], value)
+        return response
@@ -1,4 +1,6 @@
 from __future__ import with_statement
+from contextlib import contextmanager
+from functools import partial
 from itertools import chain
 import datetime
 import sys
@@ -10,7 +12,9 @@ from redis._compat import (b, basestring, bytes, imap, iteritems, iterkeys,
                            itervalues, izip, long, nativestr, unicode,
                            safe_unicode)
 from redis.connection import (ConnectionPool, UnixDomainSocketConnection,
-                              SSLConnection, Token)
+                              SSLConnection, Token, check_streamable,
+                              file_length, is_file, pop_pool_options)
+from redis import events
 from redis.lock import Lock, LuaLock
 from redis.exceptions import (
     ConnectionError,
@@ -278,6 +282,88 @@ def parse_slowlog_get(response, **options):
     } for item in response]
 
 
+class CommandExecutor(object):
+    """
+    Executes one command for a client without going through
+    execute_command(), for code calling a command in a tight loop::
+
+        >>> get = r.executors['GET']
+        >>> values = [get(key) for key in keys]
+
+    Calls with options, clients with event listeners or a ClientCache, and
+    clients that change how commands are executed take the generic path.
+    """
+    __slots__ = ('client', 'command_name', 'connection_pool', 'listeners')
+
+    def __init__(self, client, command_name):
+        self.client = client
+        self.command_name = command_name
+        self.connection_pool = client.connection_pool
+        # the pool's list, so listeners added later are seen
+        self.listeners = getattr(client.connection_pool, 'listeners', ())
+
+    def __repr__(self):
+        return "%s<%s>" % (type(self).__name__, self.command_name)
+
+    def __call__(self, *args, **options):
+        pool_options = pop_pool_options(options) if options else {}
+        if options or self.listeners or \
+                self.client.client_cache is not None:
+            # other options are for the callback, and events are emitted and
+            # the cache is consulted by execute_command
+            options.update(pool_options)
+            return self.client.execute_command(self.command_name, *args,
+                                               **options)
+        command_name = self.command_name
+        pool = self.connection_pool
+        connection = pool.get_connection(command_name, **pool_options)
+        try:
+            connection.send_command(command_name, *args)
+            response = connection.read_response()
+        except (ConnectionError, TimeoutError) as e:
+            connection.disconnect()
+            if not connection.retry_on_timeout and isinstance(e, TimeoutError):
+                raise
+            connection.send_command(command_name, *args)
+            response = connection.read_response()
+        finally:
+            pool.release(connection)
+        # callbacks may be changed at any time, so they aren't cached
+        callback = self.client.response_callbacks.get(command_name)
+        if callback is not None:
+            return callback(response)
+        return response
+
+
+class CommandExecutors(dict):
+    "A client's executors, keyed by command name and created on first use"
+    def __init__(self, client):
+        super(CommandExecutors, self).__init__()
+        self.client = client
+
+    def __missing__(self, command_name):
+        executor = self[command_name] = \
+            self.client._make_executor(command_name)
+        return executor
+
+
+class executors_property(object):
+    """
+    Creates a client's CommandExecutors the first time they're used, which
+    also covers subclasses that don't call StrictRedis.__init__
+    """
+    def __get__(self, client, cls):
+        if client is None:
+            return self
+        executors = client.__dict__['executors'] = CommandExecutors(client)
+        return executors
+
+
+def _function(method):
+    "The function behind a method, on both Python 2 and 3"
+    return getattr(method, '__func__', method)
+
+
 class StrictRedis(object):
     """
     Implementation of the Redis protocol.
@@ -363,6 +449,9 @@ class StrictRedis(object):
             'ZSCAN': parse_zscan
         }
     )
+    # a redis.cache.ClientCache that GET, HGET, HGETALL and MGET replies are
+    # cached in
+    client_cache = None
 
     @classmethod
     def from_url(cls, url, db=None, **kwargs):
@@ -399,7 +488,10 @@ class StrictRedis(object):
                  charset=None, errors=None,
                  decode_responses=False, retry_on_timeout=False,
                  ssl=False, ssl_keyfile=None, ssl_certfile=None,
-                 ssl_cert_reqs=None, ssl_ca_certs=None):
+                 ssl_cert_reqs=None, ssl_ca_certs=None, client_cache=None,
+                 health_check_interval=0, dns_cache_ttl=None,
+                 happy_eyeballs_delay=None, codec=None, serializers=None,
+                 event_listeners=None):
         if not connection_pool:
             if charset is not None:
                 warnings.warn(DeprecationWarning(
@@ -417,7 +509,10 @@ class StrictRedis(object):
                 'encoding': encoding,
                 'encoding_errors': encoding_errors,
                 'decode_responses': decode_responses,
-                'retry_on_timeout': retry_on_timeout
+                'retry_on_timeout': retry_on_timeout,
+                'health_check_interval': health_check_interval,
+                'codec': codec,
+                'serializers': serializers
             }
             # based on input, setup appropriate connection args
             if unix_socket_path is not None:
@@ -433,6 +528,8 @@ class StrictRedis(object):
                     'socket_connect_timeout': socket_connect_timeout,
                     'socket_keepalive': socket_keepalive,
                     'socket_keepalive_options': socket_keepalive_options,
+                    'dns_cache_ttl': dns_cache_ttl,
+                    'happy_eyeballs_delay': happy_eyeballs_delay,
                 })
 
                 if ssl:
@@ -445,16 +542,38 @@ class StrictRedis(object):
                     })
             connection_pool = ConnectionPool(**kwargs)
         self.connection_pool = connection_pool
+        for listener in event_listeners or ():
+            connection_pool.add_listener(listener)
         self._use_lua_lock = None
+        if client_cache is not None:
+            client_cache.bind(connection_pool)
+        self.client_cache = client_cache
 
         self.response_callbacks = self.__class__.RESPONSE_CALLBACKS.copy()
 
+    # callables that execute a single command, keyed by command name.
+    # ``client.executors['GET']('foo')`` does what ``client.get('foo')`` does
+    executors = executors_property()
+
     def __repr__(self):
         return "%s<%s>" % (type(self).__name__, repr(self.connection_pool))
 
     def set_response_callback(self, command, callback):
         "Set a custom Response Callback"
         self.response_callbacks[command] = callback
+        self.executors.pop(command, None)
+
+    def _make_executor(self, command_name):
+        "Return a callable that executes ``command_name``"
+        cls = type(self)
+        if _function(cls.execute_command) is not \
+                _function(StrictRedis.execute_command) or \
+                _function(cls.parse_response) is not \
+                _function(StrictRedis.parse_response):
+            # pipelines and other clients that change how commands are
+            # executed or parsed take the generic path
+            return partial(self.execute_command, command_name)
+        return CommandExecutor(self, command_name)
 
     def pipeline(self, transaction=True, shard_hint=None):
         """
@@ -564,7 +683,18 @@ class StrictRedis(object):
         "Execute a command and return a parsed response"
         pool = self.connection_pool
         command_name = args[0]
-        connection = pool.get_connection(command_name, **options)
+        client_cache = self.client_cache
+        if client_cache is not None and \
+                command_name in client_cache.COMMANDS:
+            # the cache checks connections out itself, with pool_options
+            return client_cache.execute_command(self, *args, **options)
+        # the pool's options must never reach the response callback
+        pool_options = pop_pool_options(options)
+        listeners = getattr(pool, 'listeners', None)
+        if listeners:
+            return self._execute_command_with_events(listeners, args,
+                                                     options, pool_options)
+        connection = pool.get_connection(command_name, **pool_options)
         try:
             connection.send_command(*args)
             return self.parse_response(connection, command_name, **options)
@@ -577,6 +707,43 @@ class StrictRedis(object):
         finally:
             pool.release(connection)
 
+    def _execute_command_with_events(self, listeners, args, options,
+                                     pool_options):
+        """
+        execute_command(), telling ``listeners`` about the command.
+        ``pool_options`` are passed to the pool rather than the callback
+        """
+        pool = self.connection_pool
+        command_name = args[0]
+        event = events.CommandEvent(command_name, args, pool=pool)
+        connection = None
+        try:
+            # failing to get a connection fails the command too
+            connection = events.check_out(listeners, event, pool,
+                                          command_name, **pool_options)
+            events.command_started(listeners, event, connection)
+            try:
+                connection.send_command(*args)
+                response = events.parse_response(event, self, connection,
+                                                 command_name, options)
+            except (ConnectionError, TimeoutError) as e:
+                connection.disconnect()
+                if not connection.retry_on_timeout and \
+                        isinstance(e, TimeoutError):
+                    raise
+                events.command_retried(listeners, event, e)
+                connection.send_command(*args)
+                response = events.parse_response(event, self, connection,
+                                                 command_name, options)
+        except Exception as e:
+            events.command_finished(listeners, event, e)
+            raise
+        finally:
+            if connection is not None:
+                pool.release(connection)
+        events.command_finished(listeners, event)
+        return response
+
     def parse_response(self, connection, command_name, **options):
         "Parses a response from the Redis server"
         response = connection.read_response()
@@ -584,6 +751,88 @@ class StrictRedis(object):
             return self.response_callbacks[command_name](response, **options)
         return response
 
+    @contextmanager
+    def _streaming_command(self, args):
+        """
+        Check out a dedicated connection for streaming the command ``args``
+        to or from, telling the pool's listeners about the command as
+        execute_command() does. Yields the connection and the command's
+        CommandEvent, which is None when the pool has no listeners
+        """
+        pool = self.connection_pool
+        listeners = getattr(pool, 'listeners', None)
+        if not listeners:
+            connection = pool.get_connection(args[0], dedicated=True)
+            try:
+                yield connection, None
+            finally:
+                pool.release(connection)
+            return
+        event = events.CommandEvent(args[0], args, pool=pool)
+        connection = None
+        try:
+            connection = events.check_out(listeners, event, pool, args[0],
+                                          dedicated=True)
+            events.command_started(listeners, event, connection)
+            yield connection, event
+        except GeneratorExit:
+            # an iterator over the reply was closed before its end
+            events.command_finished(listeners, event)
+            raise
+        except Exception as e:
+            events.command_finished(listeners, event, e)
+            raise
+        finally:
+            if connection is not None:
+                pool.release(connection)
+        events.command_finished(listeners, event)
+
+    def _send_command(self, connection, args, event=None):
+        """
+        Send a command, retrying once if the connection has gone away. The
+        retry is reported to the pool's listeners if ``event`` is given
+        """
+        try:
+            connection.send_command(*args)
+        except (ConnectionError, TimeoutError) as e:
+            connection.disconnect()
+            if not connection.retry_on_timeout and \
+                    isinstance(e, TimeoutError):
+                raise
+            if event is not None:
+                events.command_retried(self.connection_pool.listeners,
+                                       event, e)
+            connection.send_command(*args)
+
+    def _execute_command_into(self, target, to_file, *args):
+        """
+        Execute a command whose bulk reply is stored in ``target`` rather
+        than returned. Only sending the command is retried, as part of the
+        reply may already have been stored when reading fails.
+        """
+        with self._streaming_command(args) as (connection, event):
+            check_streamable(connection)
+            self._send_command(connection, args, event)
+            return connection.read_response_into(target, to_file)
+
+    def _execute_command_iter(self, *args):
+        """
+        Execute a command with a multi-bulk reply, yielding its elements as
+        they're read. The connection is held until the reply has been read
+        in full or the iterator is closed.
+        """
+        with self._streaming_command(args) as (connection, event):
+            drained = False
+            try:
+                self._send_command(connection, args, event)
+                for item in connection.read_response_iter():
+                    yield item
+                drained = True
+            finally:
+                # the rest of an abandoned reply can't be skipped over
+                if not drained:
+                    connection.disconnect()
+
     # SERVER INFORMATION
     def bgrewriteaof(self):
         "Tell the Redis server to rewrite the AOF file from data in memory."
@@ -877,6 +1126,29 @@ class StrictRedis(object):
             return value
         raise KeyError(name)
 
+    def get_into(self, name, buffer):
+        """
+        Read the value at key ``name`` directly into ``buffer``, any object
+        supporting the writable buffer interface such as a ``bytearray`` or
+        ``mmap``, without creating an intermediate copy.
+
+        Returns the length of the value, or None if the key doesn't exist.
+        Raises DataError if ``buffer`` is too small to hold the value, or if
+        the client has a codec or serializers.
+        """
+        return self._execute_command_into(buffer, False, 'GET', name)
+
+    def get_to_file(self, name, fileobj):
+        """
+        Write the value at key ``name`` to the file-like object ``fileobj``
+        in chunks as it's read from the socket, so the whole value is never
+        held in memory.
+
+        Returns the length of the value, or None if the key doesn't exist.
+        Raises DataError if the client has a codec or serializers.
+        """
+        return self._execute_command_into(fileobj, True, 'GET', name)
+
     def getbit(self, name, offset):
         "Returns a boolean indicating the value of ``offset`` in ``name``"
         return self.execute_command('GETBIT', name, offset)
@@ -923,6 +1195,13 @@ class StrictRedis(object):
         "Returns a list of keys matching ``pattern``"
         return self.execute_command('KEYS', pattern)
 
+    def keys_iter(self, pattern='*'):
+        """
+        Returns an iterator over the keys matching ``pattern``, which yields
+        each key as it's read rather than building a list of all of them
+        """
+        return self._execute_command_iter('KEYS', pattern)
+
     def mget(self, keys, *args):
         """
         Returns a list of values ordered identically to ``keys``
@@ -1041,6 +1320,12 @@ class StrictRedis(object):
             already exists.
         """
         pieces = [name, value]
+        pieces.extend(self._set_options(ex, px, nx, xx))
+        return self.execute_command('SET', *pieces)
+
+    def _set_options(self, ex, px, nx, xx):
+        "Return the arguments for SET's ``ex``, ``px``, ``nx`` and ``xx``"
+        pieces = []
         if ex:
             pieces.append('EX')
             if isinstance(ex, datetime.timedelta):
@@ -1057,7 +1342,56 @@ class StrictRedis(object):
             pieces.append('NX')
         if xx:
             pieces.append('XX')
-        return self.execute_command('SET', *pieces)
+        return pieces
+
+    def set_from_file(self, name, fileobj, length=None, ex=None, px=None,
+                      nx=False, xx=False):
+        """
+        Set the value at key ``name`` to the contents of ``fileobj``, which
+        are streamed to the server rather than read into memory first.
+
+        ``fileobj`` is a file-like object, read from its current position,
+        or an object supporting the buffer interface such as an ``mmap``.
+
+        ``length`` is the number of bytes to send. It defaults to the rest of
+        the file or the size of the buffer.
+
+        ``ex``, ``px``, ``nx`` and ``xx`` behave as they do for ``set``.
+
+        Raises DataError if the client has a codec or serializers, as the
+        value couldn't be compressed or serialized.
+        """
+        if length is None:
+            length = file_length(fileobj)
+        # the value can only be sent again after a connection error if the
+        # file can be rewound to where it was
+        position = 0
+        if is_file(fileobj):
+            try:
+                position = fileobj.tell()
+            except Exception:
+                position = None
+        trailing_args = self._set_options(ex, px, nx, xx)
+        # listeners see the value as its length, as it's never read whole
+        args = ('SET', name, '<%d bytes>' % length) + tuple(trailing_args)
+        with self._streaming_command(args) as (connection, event):
+            check_streamable(connection)
+            try:
+                connection.send_command_from_file(('SET', name), fileobj,
+                                                  length, trailing_args)
+            except (ConnectionError, TimeoutError) as e:
+                connection.disconnect()
+                if position is None or (not connection.retry_on_timeout and
+                                        isinstance(e, TimeoutError)):
+                    raise
+                if event is not None:
+                    events.command_retried(self.connection_pool.listeners,
+                                           event, e)
+                if is_file(fileobj):
+                    fileobj.seek(position)
+                connection.send_command_from_file(('SET', name), fileobj,
+                                                  length, trailing_args)
+            return self.parse_response(connection, 'SET')
 
     def __setitem__(self, name, value):
         self.set(name, value)
@@ -1228,6 +1562,13 @@ class StrictRedis(object):
         """
         return self.execute_command('LRANGE', name, start, end)
 
+    def lrange_iter(self, name, start=0, end=-1):
+        """
+        Like ``lrange``, but returns an iterator that yields each element as
+        it's read rather than building a list of the whole slice
+        """
+        return self._execute_command_iter('LRANGE', name, start, end)
+
     def lrem(self, name, count, value):
         """
         Remove the first ``count`` occurrences of elements equal to ``value``
@@ -1519,6 +1860,13 @@ class StrictRedis(object):
         "Return all members of the set ``name``"
         return self.execute_command('SMEMBERS', name)
 
+    def smembers_iter(self, name):
+        """
+        Returns an iterator over the members of the set ``name``, which
+        yields each member as it's read rather than building a set
+        """
+        return self._execute_command_iter('SMEMBERS', name)
+
     def smove(self, src, dst, value):
         "Move ``value`` from set ``src`` to set ``dst`` atomically"
         return self.execute_command('SMOVE', src, dst, value)
@@ -1832,6 +2180,14 @@ class StrictRedis(object):
         "Return a Python dict of the hash's name/value pairs"
         return self.execute_command('HGETALL', name)
 
+    def hgetall_iter(self, name):
+        """
+        Returns an iterator over the hash's (name, value) pairs, which
+        yields each pair as it's read rather than building a dict
+        """
+        iterator = self._execute_command_iter('HGETALL', name)
+        return izip(iterator, iterator)
+
     def hincrby(self, name, key, amount=1):
         "Increment the value of ``key`` in hash ``name`` by ``amount``"
         return self.execute_command('HINCRBY', name, key, amount)
@@ -2413,11 +2769,12 @@ class BasePipeline(object):
         MULTI is called.
         """
         command_name = args[0]
+        pool_options = pop_pool_options(options)
         conn = self.connection
         # if this is the first call, we need a connection
         if not conn:
-            conn = self.connection_pool.get_connection(command_name,
-                                                       self.shard_hint)
+            conn = self.connection_pool.get_connection(
+                command_name, self.shard_hint, **pool_options)
             self.connection = conn
         try:
             conn.send_command(*args)
@@ -2437,6 +2794,15 @@ class BasePipeline(object):
                 self.reset()
                 raise
 
+    def _execute_command_into(self, target, to_file, *args):
+        raise RedisError("Replies can't be streamed within a pipeline")
+
+    def set_from_file(self, *args, **kwargs):
+        raise RedisError("Values can't be streamed within a pipeline")
+
+    def _execute_command_iter(self, *args):
+        raise RedisError("Replies can't be streamed within a pipeline")
+
     def pipeline_execute_command(self, *args, **options):
         """
         Stage a command to be executed when execute() is next called
@@ -2449,6 +2815,8 @@ class BasePipeline(object):
         At some other point, you can then run: pipe.execute(),
         which will execute all commands queued in the pipe.
         """
+        # the pipeline's connection is checked out by execute()
+        pop_pool_options(options)
         self.command_stack.append((args, options))
         return self
 
@@ -2518,13 +2886,16 @@ class BasePipeline(object):
         all_cmds = connection.pack_commands([args for args, _ in commands])
         connection.send_packed_command(all_cmds)
 
+        # read all of the replies before handing them to the callbacks
+        replies = connection.read_responses(len(commands))
         response = []
-        for args, options in commands:
-            try:
-                response.append(
-                    self.parse_response(connection, args[0], **options))
-            except ResponseError:
-                response.append(sys.exc_info()[1])
+        for (args, options), reply in izip(commands, replies):
+            if not isinstance(reply, ResponseError):
+                try:
+                    reply = self._handle_response(reply, args[0], **options)
+                except ResponseError:
+                    reply = sys.exc_info()[1]
+            response.append(reply)
 
         if raise_on_error:
             self.raise_first_error(commands, response)
@@ -2543,13 +2914,19 @@ class BasePipeline(object):
         exception.args = (msg,) + exception.args[1:]
 
     def parse_response(self, connection, command_name, **options):
-        result = StrictRedis.parse_response(
-            self, connection, command_name, **options)
+        return self._handle_response(connection.read_response(),
+                                     command_name, **options)
+
+    def _handle_response(self, response, command_name, **options):
+        "Run the callback for an already read reply to ``command_name``"
+        if command_name in self.response_callbacks:
+            response = self.response_callbacks[command_name](response,
+                                                             **options)
         if command_name in self.UNWATCH_COMMANDS:
             self.watching = False
         elif command_name == 'WATCH':
             self.watching = True
-        return result
+        return response
 
     def load_scripts(self):
         # make sure all scripts that are about to be run on this pipeline exist
@@ -2577,6 +2954,11 @@ class BasePipeline(object):
         else:
             execute = self._execute_pipeline
 
+        listeners = getattr(self.connection_pool, 'listeners', None)
+        if listeners:
+            return self._execute_with_events(listeners, execute, stack,
+                                             raise_on_error)
+
         conn = self.connection
         if not conn:
             conn = self.connection_pool.get_connection('MULTI',
@@ -2585,6 +2967,43 @@ class BasePipeline(object):
             # back to the pool after we're done
             self.connection = conn
 
+        try:
+            return self._execute(conn, execute, stack, raise_on_error)
+        finally:
+            self.reset()
+
+    def _execute_with_events(self, listeners, execute, stack,
+                             raise_on_error):
+        "execute(), telling ``listeners`` about the pipeline"
+        if self.transaction or self.explicit_transaction:
+            command_name = 'MULTI'
+        else:
+            command_name = 'PIPELINE'
+        event = events.CommandEvent(command_name,
+                                    commands=[args for args, options
+                                              in stack],
+                                    pool=self.connection_pool)
+        try:
+            conn = self.connection
+            if not conn:
+                conn = events.check_out(listeners, event,
+                                        self.connection_pool, 'MULTI',
+                                        self.shard_hint)
+                self.connection = conn
+            events.command_started(listeners, event, conn)
+            response = self._execute(conn, execute, stack, raise_on_error,
+                                     listeners, event)
+        except Exception as e:
+            events.command_finished(listeners, event, e)
+            raise
+        finally:
+            self.reset()
+        events.command_finished(listeners, event)
+        return response
+
+    def _execute(self, conn, execute, stack, raise_on_error, listeners=None,
+                 event=None):
+        "Execute ``stack`` on ``conn``, retrying once if it's safe to"
         try:
             return execute(conn, stack, raise_on_error)
         except (ConnectionError, TimeoutError) as e:
@@ -2601,9 +3020,9 @@ class BasePipeline(object):
                                  "one or more keys")
             # otherwise, it's safe to retry since the transaction isn't
             # predicated on any state
+            if listeners:
+                events.command_retried(listeners, event, e)
             return execute(conn, stack, raise_on_error)
-        finally:
-            self.reset()
 
     def watch(self, *names):
         "Watches the values at keys ``names``"
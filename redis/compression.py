@@ -0,0 +1,216 @@
+import zlib
+
+from redis._compat import b, bytes, iteritems, unicode
+from redis.exceptions import RedisError
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+
+# compressed values start with MAGIC followed by a byte naming the method
+MAGIC = b('\x00\x1fRZ')
+METHOD_IDS = {
+    'zlib': b('z'),
+    'lzma': b('x'),
+}
+HEADER_LENGTH = len(MAGIC) + 1
+
+# command name -> (index of its first value, step between values, whether
+# each value's key comes right before it rather than being the first
+# argument)
+COMPRESSED_ARGUMENTS = {
+    'SET': (2, 0, False),
+    'SETNX': (2, 0, False),
+    'SETEX': (3, 0, False),
+    'PSETEX': (3, 0, False),
+    'GETSET': (2, 0, False),
+    'MSET': (2, 2, True),
+    'MSETNX': (2, 2, True),
+    'HSET': (3, 0, False),
+    'HSETNX': (3, 0, False),
+    'HMSET': (3, 2, False),
+    'LPUSH': (2, 1, False),
+    'RPUSH': (2, 1, False),
+    'LPUSHX': (2, 1, False),
+    'RPUSHX': (2, 1, False),
+    'LSET': (3, 0, False),
+    'PUBLISH': (2, 0, False),
+}
+
+
+class CompressionCodec(object):
+    """
+    Transparently compresses the values written by SET, HSET, LPUSH,
+    PUBLISH and similar commands, and decompresses them when they're read
+    back by any command, including pipelines and PubSub messages::
+
+        >>> codec = CompressionCodec(threshold=1024, prefixes=['page:'])
+        >>> r = StrictRedis(codec=codec)
+        >>> r.set('page:index', html)  # stored compressed
+        >>> r.get('page:index') == html
+        True
+
+    Values of at least ``threshold`` bytes are compressed with ``method``,
+    either 'zlib' or 'lzma', and marked with a short header; values that
+    don't get smaller are stored as is. ``prefixes`` limits compression to
+    keys (and PubSub channels) starting with one of the prefixes. It can
+    also be a dict mapping each prefix to its own threshold, or None to
+    never compress the keys it matches, and the longest matching prefix
+    wins.
+
+    Values are read back with the codec's header intact by clients that
+    don't use a codec, and commands that modify values on the server
+    (APPEND, SETRANGE, ...) must not be used on compressed values.
+    """
+    def __init__(self, method='zlib', level=None, threshold=1024,
+                 prefixes=None):
+        if method not in METHOD_IDS:
+            raise RedisError("Unknown compression method: %s" % method)
+        if method == 'lzma' and lzma is None:
+            raise RedisError("Python wasn't built with lzma support")
+        self.method = method
+        self.level = level
+        self.threshold = threshold
+        self.header = MAGIC + METHOD_IDS[method]
+        if prefixes is not None:
+            if not isinstance(prefixes, dict):
+                prefixes = dict([(prefix, threshold) for prefix in prefixes])
+            # longest prefixes first
+            prefixes = sorted([(self._bytes(prefix), prefix_threshold)
+                               for prefix, prefix_threshold
+                               in iteritems(prefixes)],
+                              key=lambda item: len(item[0]), reverse=True)
+        self.prefixes = prefixes
+        self.reset_stats()
+
+    def __repr__(self):
+        return "%s<method=%s, threshold=%s>" % (type(self).__name__,
+                                                self.method, self.threshold)
+
+    def _bytes(self, value):
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return value
+
+    def reset_stats(self):
+        # the sizes of the values before and after they were compressed
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.compressed = 0
+        # values that were large enough, but didn't get smaller
+        self.incompressible = 0
+        self.decompressed = 0
+
+    def stats(self):
+        "Return a dict of the codec's counters"
+        return {
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': self.ratio,
+            'compressed': self.compressed,
+            'incompressible': self.incompressible,
+            'decompressed': self.decompressed,
+        }
+
+    @property
+    def ratio(self):
+        "The compressed size of the values compressed so far, over their size"
+        if not self.bytes_in:
+            return 1.0
+        return float(self.bytes_out) / self.bytes_in
+
+    def threshold_for(self, key):
+        "Return the size from which values of ``key`` are compressed"
+        if self.prefixes is None:
+            return self.threshold
+        for prefix, threshold in self.prefixes:
+            if key.startswith(prefix):
+                return threshold
+        return None
+
+    def compress(self, value):
+        "Compress ``value``, returning it as is if it doesn't get smaller"
+        if self.method == 'zlib':
+            if self.level is None:
+                compressed = zlib.compress(value)
+            else:
+                compressed = zlib.compress(value, self.level)
+        elif self.level is None:
+            compressed = lzma.compress(value)
+        else:
+            compressed = lzma.compress(value, preset=self.level)
+        if len(compressed) + HEADER_LENGTH >= len(value):
+            self.incompressible += 1
+            return value
+        self.compressed += 1
+        self.bytes_in += len(value)
+        self.bytes_out += len(compressed) + HEADER_LENGTH
+        return self.header + compressed
+
+    def decompress(self, value):
+        """
+        Decompress ``value`` if it was compressed by a codec, returning it
+        as is otherwise
+        """
+        if value[:len(MAGIC)] != MAGIC:
+            return value
+        method = value[len(MAGIC):HEADER_LENGTH]
+        try:
+            if method == METHOD_IDS['zlib']:
+                value = zlib.decompress(value[HEADER_LENGTH:])
+            elif method == METHOD_IDS['lzma'] and lzma is not None:
+                value = lzma.decompress(value[HEADER_LENGTH:])
+            else:
+                return value
+        except (zlib.error, getattr(lzma, 'LZMAError', zlib.error)):
+            # not something the codec compressed after all
+            return value
+        self.decompressed += 1
+        return value
+
+    def encode_command(self, connection, args):
+        "Return ``args`` with the values that should be compressed compressed"
+        try:
+            first, step, paired = COMPRESSED_ARGUMENTS[args[0]]
+        except KeyError:
+            return args
+        if len(args) <= first:
+            return args
+        encode = connection.encode
+        if step:
+            indexes = range(first, len(args), step)
+        else:
+            indexes = (first,)
+        threshold = None
+        if not paired:
+            threshold = self.threshold_for(encode(args[1]))
+            if threshold is None:
+                return args
+        args = list(args)
+        for i in indexes:
+            if paired:
+                threshold = self.threshold_for(encode(args[i - 1]))
+                if threshold is None:
+                    continue
+            value = encode(args[i])
+            if len(value) >= threshold:
+                args[i] = self.compress(value)
+        return args
+
+    def decode_response(self, response, encoding=None, errors='strict'):
+        """
+        Decompress the compressed values in ``response``, then decode all of
+        its strings with ``encoding`` if it's set
+        """
+        if isinstance(response, bytes):
+            if response[:len(MAGIC)] == MAGIC:
+                response = self.decompress(response)
+            if encoding is not None:
+                response = response.decode(encoding, errors)
+            return response
+        if isinstance(response, list):
+            return [self.decode_response(item, encoding, errors)
+                    for item in response]
+        return response
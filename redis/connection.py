@@ -1,12 +1,20 @@
 from __future__ import with_statement
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
 from distutils.version import StrictVersion
-from itertools import chain
+from heapq import heappop, heappush
+from itertools import chain, count
 from select import select
+import errno
+import mmap
 import os
 import socket
 import sys
 import threading
+import time
 import warnings
+import weakref
 
 try:
     import ssl
@@ -15,11 +23,12 @@ except ImportError:
     ssl_available = False
 
 from redis._compat import (b, xrange, imap, byte_to_chr, unicode, bytes, long,
-                           BytesIO, nativestr, basestring, iteritems,
-                           LifoQueue, Empty, Full, urlparse, parse_qs)
+                           nativestr, basestring, iteritems,
+                           izip, LifoQueue, Full, urlparse, parse_qs)
 from redis.exceptions import (
     RedisError,
     ConnectionError,
+    DataError,
     TimeoutError,
     BusyLoadingError,
     ResponseError,
@@ -29,6 +38,7 @@ from redis.exceptions import (
     ExecAbortError,
     ReadOnlyError
 )
+from redis import events
 from redis.utils import HIREDIS_AVAILABLE
 if HIREDIS_AVAILABLE:
     import hiredis
@@ -51,11 +61,49 @@ if HIREDIS_AVAILABLE:
             sys.version_info[0] == 2 and sys.version_info[1] < 7):
         HIREDIS_USE_BYTE_BUFFER = False
 
+# SSLContext was added in Python 2.7.9, and resuming TLS sessions in 3.6
+SSL_CONTEXT_AVAILABLE = ssl_available and hasattr(ssl, 'SSLContext')
+SSL_SESSIONS_AVAILABLE = ssl_available and hasattr(ssl, 'SSLSession')
+
 SYM_STAR = b('*')
 SYM_DOLLAR = b('$')
 SYM_CRLF = b('\r\n')
 SYM_EMPTY = b('')
 
+ORD_STAR = ord('*')
+ORD_DOLLAR = ord('$')
+ORD_COLON = ord(':')
+ORD_PLUS = ord('+')
+ORD_MINUS = ord('-')
+
+# packed commands are written with a single vectored sendmsg() call where the
+# platform supports it. IOV_MAX caps the number of chunks per call.
+SENDMSG_AVAILABLE = hasattr(socket.socket, 'sendmsg')
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+# bounds for the size at which packed command chunks stop being joined
+# together. the actual value follows the socket's send buffer size.
+MIN_BUFFER_CUTOFF = 6000
+MAX_BUFFER_CUTOFF = 131072
+
+# the array headers ("*<count>\r\n") and bulk string length prefixes
+# ("$<length>\r\n") used for common sizes are built once up front
+ARRAY_HEADERS = [b('*%d\r\n' % i) for i in xrange(64)]
+LENGTH_PREFIXES = [b('$%d\r\n' % i) for i in xrange(1024)]
+
+# packed command names, keyed by the name passed to pack_command
+COMMAND_NAME_CACHE = {}
+COMMAND_NAME_CACHE_SIZE = 1024
+
+# the amount of a file read into memory at once when it's streamed to the
+# server as a command argument
+FILE_CHUNK_SIZE = 65536
+
 SERVER_CLOSED_CONNECTION_ERROR = "Connection closed by server."
 
 
@@ -77,7 +125,81 @@ class Token(object):
         return self.value
 
 
+def pack_command_name(command):
+    """
+    Return the number of arguments in ``command`` and its packed form.
+
+    The client might have included 1 or more literal arguments in the command
+    name, e.g., 'CONFIG GET'. The Redis server expects these arguments to be
+    sent separately, so the name is split on spaces. None of these arguments
+    are subject to the connection's encoding rules, so the result only depends
+    on the name and is cached.
+    """
+    try:
+        return COMMAND_NAME_CACHE[command]
+    except KeyError:
+        pass
+    parts = [b(part) for part in command.split(' ')]
+    packed = SYM_EMPTY.join([
+        SYM_EMPTY.join((SYM_DOLLAR, b(str(len(part))), SYM_CRLF,
+                        part, SYM_CRLF))
+        for part in parts])
+    result = (len(parts), packed)
+    if len(COMMAND_NAME_CACHE) < COMMAND_NAME_CACHE_SIZE:
+        COMMAND_NAME_CACHE[command] = result
+    return result
+
+
+def is_file(fileobj):
+    "Whether ``fileobj`` should be read as a file rather than as a buffer"
+    return hasattr(fileobj, 'read') and not isinstance(fileobj, mmap.mmap)
+
+
+def check_streamable(connection):
+    """
+    Raise DataError if ``connection`` compresses or serializes values, as
+    values streamed to or from a file or buffer are sent and read as is
+    """
+    if getattr(connection, 'transform_replies', False):
+        raise DataError("Values can't be streamed by a connection with a "
+                        "codec or serializers")
+
+
+# the options of execute_command() that are meant for the pool's
+# get_connection() rather than the response callback
+POOL_OPTIONS = ('priority', 'deadline')
+
+
+def pop_pool_options(options):
+    "Remove the options meant for the pool from ``options`` and return them"
+    return dict([(name, options.pop(name)) for name in POOL_OPTIONS
+                 if name in options])
+
+
+def file_length(fileobj):
+    """
+    Return the number of bytes remaining in the file-like object ``fileobj``,
+    or the size of ``fileobj`` if it's a buffer such as an ``mmap``
+    """
+    if not is_file(fileobj):
+        return len(memoryview(fileobj))
+    position = fileobj.tell()
+    try:
+        return os.fstat(fileobj.fileno()).st_size - position
+    except Exception:
+        pass
+    fileobj.seek(0, os.SEEK_END)
+    length = fileobj.tell() - position
+    fileobj.seek(position)
+    return length
+
+
 class BaseParser(object):
+    # the number of bytes read from the server
+    bytes_received = 0
+    # the PhaseTimings of the command being executed, if it's being timed
+    timings = None
+
     EXCEPTION_CLASSES = {
         'ERR': ResponseError,
         'EXECABORT': ExecAbortError,
@@ -94,105 +216,415 @@ class BaseParser(object):
             return self.EXCEPTION_CLASSES[error_code](response)
         return ResponseError(response)
 
+    def read_responses(self, count):
+        "Read the replies to ``count`` commands"
+        return [self.read_response() for i in xrange(count)]
+
+    def set_timings(self, timings):
+        "Record the time spent reading from the socket in ``timings``"
+        self.timings = timings
+
+    def _copy_response_into(self, response, target, to_file):
+        "Store an already parsed bulk reply in ``target``"
+        if response is None or isinstance(response, ResponseError):
+            return response
+        if isinstance(response, unicode):
+            raise DataError("Values can't be streamed when responses are "
+                            "decoded")
+        if not isinstance(response, bytes):
+            raise InvalidResponse("Protocol Error: expected a bulk reply")
+        if to_file:
+            target.write(response)
+        else:
+            target = memoryview(target)
+            if getattr(target, 'itemsize', 1) != 1:
+                target = target.cast('B')
+            if len(target) < len(response):
+                raise DataError("The buffer is too small for a value of "
+                                "%d bytes" % len(response))
+            target[:len(response)] = response
+        return len(response)
+
+
+class AdaptiveReadSize(object):
+    """
+    Chooses how much to read from a socket at once from the sizes of recent
+    reads. The size doubles whenever a read fills all of the space it was
+    given, and halves when none of the last ``window`` reads used more than
+    a quarter of it, staying between ``minimum`` and ``maximum``.
+
+    Connections created with ``socket_read_size='adaptive'`` use one, so
+    workloads of small replies keep small buffers while bulk workloads
+    make fewer, larger reads.
+    """
+    def __init__(self, minimum=4096, maximum=1048576, window=16):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = window
+        self.size = minimum
+        self._reads = 0
+        self._largest = 0
+
+    def __repr__(self):
+        return "%s<size=%d>" % (type(self).__name__, self.size)
+
+    def record(self, length, space):
+        """
+        Record a read of ``length`` bytes into ``space`` free bytes, and
+        return the size of the next read
+        """
+        size = self.size
+        if length >= space and length >= size:
+            if size < self.maximum:
+                self.size = min(size * 2, self.maximum)
+            self._reads = self._largest = 0
+            return self.size
+        if length > self._largest:
+            self._largest = length
+        self._reads += 1
+        if self._reads >= self.window:
+            if self._largest * 4 <= size and size > self.minimum:
+                self.size = max(size // 2, self.minimum)
+            self._reads = self._largest = 0
+        return self.size
+
 
 class SocketBuffer(object):
+    """
+    Buffers data read from a socket in a growable ``bytearray``.
+
+    Data is received directly into the free tail of the buffer with
+    ``recv_into`` and consumed by moving a read offset forward, so the only
+    copy made of a reply is the one handed back to the caller.
+    """
     def __init__(self, socket, socket_read_size):
         self._sock = socket
+        # an AdaptiveReadSize adjusts socket_read_size after every read
+        if isinstance(socket_read_size, AdaptiveReadSize):
+            self.read_size = socket_read_size
+            socket_read_size = socket_read_size.size
+        else:
+            self.read_size = None
         self.socket_read_size = socket_read_size
-        self._buffer = BytesIO()
-        # number of bytes written to the buffer from the socket
+        self._buffer = bytearray(socket_read_size)
+        # offset of the end of the data written to the buffer from the socket
         self.bytes_written = 0
-        # number of bytes read from the buffer
+        # offset of the end of the data read from the buffer
         self.bytes_read = 0
+        # the number of bytes received from the socket
+        self.bytes_received = 0
+        # PhaseTimings the time spent receiving is recorded in, if any
+        self.timings = None
 
     @property
     def length(self):
         return self.bytes_written - self.bytes_read
 
+    def _ensure_free_space(self, size):
+        "Make sure at least ``size`` bytes are free at the end of the buffer"
+        buf = self._buffer
+        if len(buf) - self.bytes_written >= size:
+            return
+        # shift any unread data to the start of the buffer, then grow the
+        # buffer if it's still too small
+        length = self.length
+        if self.bytes_read:
+            buf[:length] = buf[self.bytes_read:self.bytes_written]
+            self.bytes_read = 0
+            self.bytes_written = length
+        if len(buf) - length < size:
+            buf.extend(bytearray(length + size - len(buf)))
+
+    def _recv_into(self, view):
+        "Receive data from the socket into ``view``, returning its length"
+        try:
+            timings = self.timings
+            if timings is None:
+                data_length = self._sock.recv_into(view)
+            else:
+                start = time.time()
+                data_length = self._sock.recv_into(view)
+                timings.received(start, time.time())
+            # 0 bytes indicates the server shutdown the socket
+            if data_length == 0:
+                raise socket.error(SERVER_CLOSED_CONNECTION_ERROR)
+            self.bytes_received += data_length
+            return data_length
+        except socket.timeout:
+            raise TimeoutError("Timeout reading from socket")
+        except socket.error:
+            e = sys.exc_info()[1]
+            raise ConnectionError("Error while reading from socket: %s" %
+                                  (e.args,))
+
     def _read_from_socket(self, length=None):
         socket_read_size = self.socket_read_size
-        buf = self._buffer
-        buf.seek(self.bytes_written)
+        # size the buffer for the whole payload up front so that large
+        # bulk replies are received with as few syscalls as possible
+        self._ensure_free_space(max(length or 0, socket_read_size))
+        view = memoryview(self._buffer)
         marker = 0
+        read_size = self.read_size
 
         try:
             while True:
-                data = self._sock.recv(socket_read_size)
-                # an empty string indicates the server shutdown the socket
-                if isinstance(data, bytes) and len(data) == 0:
-                    raise socket.error(SERVER_CLOSED_CONNECTION_ERROR)
-                buf.write(data)
-                data_length = len(data)
+                data_length = self._recv_into(view[self.bytes_written:])
+                if read_size is not None:
+                    self.socket_read_size = read_size.record(
+                        data_length, len(view) - self.bytes_written)
                 self.bytes_written += data_length
                 marker += data_length
 
                 if length is not None and length > marker:
                     continue
                 break
-        except socket.timeout:
-            raise TimeoutError("Timeout reading from socket")
-        except socket.error:
-            e = sys.exc_info()[1]
-            raise ConnectionError("Error while reading from socket: %s" %
-                                  (e.args,))
+        finally:
+            # drop our export of the buffer so it can be resized later
+            del view
+
+    def read_into(self, length, target, to_file=False):
+        """
+        Read ``length`` bytes and the \\r\\n terminator, storing the data in
+        ``target`` rather than in the buffer. ``target`` is either a writable
+        buffer, which the socket is received into directly, or a file-like
+        object when ``to_file`` is set, which is written to in chunks of at
+        most ``socket_read_size`` bytes.
+        """
+        if to_file:
+            write = target.write
+        else:
+            target = memoryview(target)
+            if getattr(target, 'itemsize', 1) != 1:
+                target = target.cast('B')
+            if len(target) < length:
+                raise DataError("The buffer is too small for a value of "
+                                "%d bytes" % length)
+
+        # hand over whatever has already been read from the socket
+        position = min(self.length, length)
+        if position:
+            start = self.bytes_read
+            chunk = memoryview(self._buffer)[start:start + position]
+            if to_file:
+                write(chunk)
+            else:
+                target[:position] = chunk
+            del chunk
+            self.bytes_read += position
+
+        # and receive the rest without going through the buffer
+        if position < length:
+            if to_file:
+                scratch = memoryview(
+                    bytearray(min(length - position, self.socket_read_size)))
+                while position < length:
+                    data_length = self._recv_into(
+                        scratch[:min(length - position, len(scratch))])
+                    write(scratch[:data_length])
+                    position += data_length
+            else:
+                while position < length:
+                    position += self._recv_into(target[position:length])
+
+        # consume the \r\n terminator
+        self.read(0)
 
     def read(self, length):
-        length = length + 2  # make sure to read the \r\n terminator
-        # make sure we've read enough data from the socket
-        if length > self.length:
-            self._read_from_socket(length - self.length)
+        # make sure we've read enough data (plus the \r\n terminator) from
+        # the socket
+        if length + 2 > self.length:
+            self._read_from_socket(length + 2 - self.length)
 
-        self._buffer.seek(self.bytes_read)
-        data = self._buffer.read(length)
-        self.bytes_read += len(data)
+        start = self.bytes_read
+        data = memoryview(self._buffer)[start:start + length].tobytes()
+        self.bytes_read += length + 2
 
         # purge the buffer when we've consumed it all so it doesn't
         # grow forever
         if self.bytes_read == self.bytes_written:
             self.purge()
 
-        return data[:-2]
+        return data
 
     def readline(self):
         buf = self._buffer
-        buf.seek(self.bytes_read)
-        data = buf.readline()
-        while not data.endswith(SYM_CRLF):
-            # there's more data in the socket that we need
+        start = self.bytes_read
+        index = buf.find(SYM_CRLF, start, self.bytes_written)
+        while index == -1:
+            # there's more data in the socket that we need. remember how far
+            # we've already searched so we don't scan the same bytes again
+            searched = max(self.length - 1, 0)
             self._read_from_socket()
-            buf.seek(self.bytes_read)
-            data = buf.readline()
+            buf = self._buffer
+            start = self.bytes_read
+            index = buf.find(SYM_CRLF, start + searched, self.bytes_written)
 
-        self.bytes_read += len(data)
+        data = memoryview(buf)[start:index].tobytes()
+        self.bytes_read = index + 2
 
         # purge the buffer when we've consumed it all so it doesn't
         # grow forever
         if self.bytes_read == self.bytes_written:
             self.purge()
 
-        return data[:-2]
+        return data
 
     def purge(self):
-        self._buffer.seek(0)
-        self._buffer.truncate()
         self.bytes_written = 0
         self.bytes_read = 0
+        # release the memory held by a large reply rather than keeping it
+        # around for the lifetime of the connection
+        if len(self._buffer) > self.socket_read_size:
+            self._buffer = bytearray(self.socket_read_size)
+
+    def write(self, data):
+        "Append ``data`` to the buffer as if it was read from the socket"
+        length = len(data)
+        self._ensure_free_space(length)
+        self._buffer[self.bytes_written:self.bytes_written + length] = data
+        self.bytes_written += length
 
     def close(self):
         self.purge()
-        self._buffer.close()
         self._buffer = None
         self._sock = None
 
 
+class PythonReader(object):
+    """
+    A pure Python implementation of the ``hiredis.Reader`` interface.
+
+    Data received from the server is handed to ``feed`` and complete replies
+    are returned by ``gets``, which returns False until a whole reply has
+    been buffered. Error replies are returned as the exception instances
+    created by ``replyError``.
+
+    Replies are parsed by an explicit state machine rather than recursively,
+    so arbitrarily nested replies can be parsed and parsing resumes where it
+    left off when more data arrives. ``buffer`` is an optional SocketBuffer
+    to parse from, which lets a PythonParser receive data into the same
+    buffer that's parsed rather than feeding it.
+    """
+    def __init__(self, protocolError=InvalidResponse,
+                 replyError=ResponseError, encoding=None, buffer=None):
+        self.protocolError = protocolError
+        self.replyError = replyError
+        self.encoding = encoding
+        if buffer is None:
+            buffer = SocketBuffer(None, 65536)
+        self._buffer = buffer
+        # the multi-bulk replies being parsed, as [elements, remaining] pairs
+        self._stack = []
+        # the length of a bulk reply whose header has been parsed
+        self._bulk_length = None
+        # the number of bytes still missing from a partially received bulk
+        # reply, so the caller can receive them in one go
+        self.needed = 0
+
+    def feed(self, data, offset=0, length=None):
+        "Buffer ``data``, optionally starting at ``offset`` for ``length``"
+        if length is None:
+            length = len(data) - offset
+        self._buffer.write(memoryview(data)[offset:offset + length])
+
+    def has_data(self):
+        return bool(self._buffer.length)
+
+    def is_idle(self):
+        "Whether no reply has been partially parsed"
+        return not self._stack and self._bulk_length is None
+
+    def gets(self):
+        "Return the next complete reply, or False if there isn't one yet"
+        buffer = self._buffer
+        buf = buffer._buffer
+        position = buffer.bytes_read
+        end = buffer.bytes_written
+        stack = self._stack
+        encoding = self.encoding
+
+        while True:
+            length = self._bulk_length
+            if length is not None:
+                if end - position < length + 2:
+                    self.needed = length + 2 - (end - position)
+                    buffer.bytes_read = position
+                    return False
+                response = memoryview(buf)[position:position + length]
+                response = response.tobytes()
+                if encoding:
+                    response = response.decode(encoding)
+                position += length + 2
+                self._bulk_length = None
+            else:
+                index = buf.find(SYM_CRLF, position, end)
+                if index == -1:
+                    self.needed = 0
+                    buffer.bytes_read = position
+                    return False
+                byte = buf[position]
+                response = buf[position + 1:index]
+                position = index + 2
+
+                if byte == ORD_DOLLAR:
+                    length = int(response)
+                    if length != -1:
+                        self._bulk_length = length
+                        continue
+                    response = None
+                elif byte == ORD_STAR:
+                    length = int(response)
+                    if length > 0:
+                        stack.append([[], length])
+                        continue
+                    response = [] if length == 0 else None
+                elif byte == ORD_COLON:
+                    response = long(response)
+                elif byte == ORD_PLUS:
+                    response = response.decode(encoding) if encoding \
+                        else bytes(response)
+                elif byte == ORD_MINUS:
+                    response = self.replyError(nativestr(bytes(response)))
+                else:
+                    buffer.bytes_read = position
+                    raise self.protocolError("Protocol Error: %s, %s" %
+                                             (chr(byte), bytes(response)))
+
+            # add the reply to the multi-bulk replies it completes
+            while stack:
+                parent = stack[-1]
+                parent[0].append(response)
+                parent[1] -= 1
+                if parent[1]:
+                    break
+                response = stack.pop()[0]
+            else:
+                break
+
+        buffer.bytes_read = position
+        self.needed = 0
+        # purge the buffer when we've consumed it all so it doesn't
+        # grow forever
+        if position == end:
+            buffer.purge()
+        return response
+
+
 class PythonParser(BaseParser):
     "Plain Python parsing class"
     encoding = None
 
     def __init__(self, socket_read_size):
         self.socket_read_size = socket_read_size
+        # kept across reconnects, so the size isn't relearned every time
+        self._read_size = None
+        if socket_read_size == 'adaptive':
+            self._read_size = AdaptiveReadSize()
         self._sock = None
         self._buffer = None
+        self._reader = None
+        # bytes received by the buffers of previous connections
+        self._bytes_received = 0
 
     def __del__(self):
         try:
@@ -202,10 +634,25 @@ class PythonParser(BaseParser):
 
     def on_connect(self, connection):
         "Called when the socket connects"
-        self._sock = connection._sock
-        self._buffer = SocketBuffer(self._sock, self.socket_read_size)
-        if connection.decode_responses:
-            self.encoding = connection.encoding
+        encoding = None
+        # a codec has to decompress values before they're decoded
+        if connection.decode_responses and \
+                not getattr(connection, 'transform_replies', False):
+            encoding = connection.encoding
+        self._attach(connection._sock, encoding)
+
+    def _attach(self, sock, encoding):
+        "Read and parse replies from ``sock``"
+        self._sock = sock
+        self._buffer = SocketBuffer(sock, self._read_size or
+                                    self.socket_read_size)
+        self._buffer.timings = self.timings
+        self.encoding = encoding
+        # the reader parses straight out of the buffer the socket is read
+        # into, so replies are never copied into a second buffer
+        self._reader = PythonReader(protocolError=InvalidResponse,
+                                    replyError=self.parse_error,
+                                    encoding=encoding, buffer=self._buffer)
 
     def on_disconnect(self):
         "Called when the socket disconnects"
@@ -213,69 +660,154 @@ class PythonParser(BaseParser):
             self._sock.close()
             self._sock = None
         if self._buffer is not None:
+            self._bytes_received += self._buffer.bytes_received
             self._buffer.close()
             self._buffer = None
+        self._reader = None
         self.encoding = None
 
+    def set_timings(self, timings):
+        self.timings = timings
+        if self._buffer is not None:
+            self._buffer.timings = timings
+
+    @property
+    def bytes_received(self):
+        if self._buffer is None:
+            return self._bytes_received
+        return self._bytes_received + self._buffer.bytes_received
+
     def can_read(self):
         return self._buffer and bool(self._buffer.length)
 
+    def feed(self, data):
+        "Feed data read by the caller, for use without a blocking socket"
+        if self._reader is None:
+            raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+        self._reader.feed(data)
+
+    def gets(self):
+        """
+        Return the next reply from data passed to ``feed``, or False if a
+        complete reply hasn't been fed yet.
+        """
+        if self._reader is None:
+            raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+        response = self._reader.gets()
+        if isinstance(response, ConnectionError):
+            raise response
+        return response
+
     def read_response(self):
+        reader = self._reader
+        if reader is None:
+            raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+        response = reader.gets()
+        while response is False:
+            # receive the rest of a partially received bulk reply in one go
+            self._buffer._read_from_socket(reader.needed or None)
+            response = reader.gets()
+
+        # if the error is a ConnectionError, raise immediately so the user
+        # is notified. otherwise, we're dealing with a ResponseError that
+        # might belong inside a pipeline response. the connection's
+        # read_response() and/or the pipeline's execute() will raise this
+        # error if necessary, so just return the exception instance here.
+        if isinstance(response, ConnectionError):
+            raise response
+        return response
+
+    def read_responses(self, count):
+        """
+        Read the replies to ``count`` pipelined commands in one pass over the
+        buffer, only reading from the socket when it's been exhausted
+        """
+        reader = self._reader
+        if reader is None:
+            raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+        gets = reader.gets
+        responses = []
+        append = responses.append
+        while count:
+            response = gets()
+            if response is False:
+                self._buffer._read_from_socket(reader.needed or None)
+                continue
+            if isinstance(response, ConnectionError):
+                raise response
+            append(response)
+            count -= 1
+        return responses
+
+    def _read_header(self, expected):
+        """
+        Read the first line of a reply of type ``expected``, returning its
+        length or the exception instance for an error reply.
+        """
         response = self._buffer.readline()
         if not response:
             raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
 
         byte, response = byte_to_chr(response[0]), response[1:]
-
-        if byte not in ('-', '+', ':', '$', '*'):
-            raise InvalidResponse("Protocol Error: %s, %s" %
-                                  (str(byte), str(response)))
-
-        # server returned an error
         if byte == '-':
-            response = nativestr(response)
-            error = self.parse_error(response)
-            # if the error is a ConnectionError, raise immediately so the user
-            # is notified
+            error = self.parse_error(nativestr(response))
             if isinstance(error, ConnectionError):
                 raise error
-            # otherwise, we're dealing with a ResponseError that might belong
-            # inside a pipeline response. the connection's read_response()
-            # and/or the pipeline's execute() will raise this error if
-            # necessary, so just return the exception instance here.
             return error
-        # single value
-        elif byte == '+':
-            pass
-        # int value
-        elif byte == ':':
-            response = long(response)
-        # bulk response
-        elif byte == '$':
-            length = int(response)
-            if length == -1:
-                return None
-            response = self._buffer.read(length)
-        # multi-bulk response
-        elif byte == '*':
-            length = int(response)
-            if length == -1:
-                return None
-            response = [self.read_response() for i in xrange(length)]
-        if isinstance(response, bytes) and self.encoding:
-            response = response.decode(self.encoding)
-        return response
+        elif byte != expected:
+            raise InvalidResponse("Protocol Error: %s, %s" %
+                                  (str(byte), str(response)))
+        return int(response)
+
+    def read_response_into(self, target, to_file=False):
+        """
+        Read a bulk reply, storing the value in ``target`` instead of
+        returning it. See ``SocketBuffer.read_into``.
+        """
+        if self.encoding:
+            raise DataError("Values can't be streamed when responses are "
+                            "decoded")
+        length = self._read_header('$')
+        if isinstance(length, ResponseError):
+            return length
+        if length == -1:
+            return None
+        self._buffer.read_into(length, target, to_file)
+        return length
+
+    def read_response_iter(self):
+        """
+        Read a multi-bulk reply lazily. Returns an iterator that parses each
+        element off the socket as it's requested, or the exception instance
+        for an error reply.
+        """
+        length = self._read_header('*')
+        if isinstance(length, ResponseError):
+            return length
+        return self._iter_elements(length)
+
+    def _iter_elements(self, length):
+        read_response = self.read_response
+        for i in xrange(length):
+            yield read_response()
 
 
 class HiredisParser(BaseParser):
     "Parser class for connections using Hiredis"
+    encoding = None
+
     def __init__(self, socket_read_size):
         if not HIREDIS_AVAILABLE:
             raise RedisError("Hiredis is not installed")
         self.socket_read_size = socket_read_size
+        self._read_size = None
+        if socket_read_size == 'adaptive':
+            self._read_size = AdaptiveReadSize()
+            socket_read_size = self._read_size.size
 
         if HIREDIS_USE_BYTE_BUFFER:
             self._buffer = bytearray(socket_read_size)
+        self.bytes_received = 0
 
     def __del__(self):
         try:
@@ -294,8 +826,10 @@ class HiredisParser(BaseParser):
         if not HIREDIS_SUPPORTS_CALLABLE_ERRORS:
             kwargs['replyError'] = ResponseError
 
-        if connection.decode_responses:
+        if connection.decode_responses and \
+                not getattr(connection, 'transform_replies', False):
             kwargs['encoding'] = connection.encoding
+            self.encoding = connection.encoding
         self._reader = hiredis.Reader(**kwargs)
         self._next_response = False
 
@@ -303,6 +837,7 @@ class HiredisParser(BaseParser):
         self._sock = None
         self._reader = None
         self._next_response = False
+        self.encoding = None
 
     def can_read(self):
         if not self._reader:
@@ -323,8 +858,20 @@ class HiredisParser(BaseParser):
             return response
 
         response = self._reader.gets()
-        socket_read_size = self.socket_read_size
+        read_size = self._read_size
+        if read_size is not None:
+            socket_read_size = read_size.size
+        else:
+            socket_read_size = self.socket_read_size
         while response is False:
+            if HIREDIS_USE_BYTE_BUFFER and \
+                    socket_read_size != len(self._buffer):
+                # hiredis copies the data it's fed, so the buffer can be
+                # replaced once it has been
+                self._buffer = bytearray(socket_read_size)
+            timings = self.timings
+            if timings is not None:
+                start = time.time()
             try:
                 if HIREDIS_USE_BYTE_BUFFER:
                     bufflen = self._sock.recv_into(self._buffer)
@@ -341,10 +888,21 @@ class HiredisParser(BaseParser):
                 e = sys.exc_info()[1]
                 raise ConnectionError("Error while reading from socket: %s" %
                                       (e.args,))
+            if timings is not None:
+                timings.received(start, time.time())
             if HIREDIS_USE_BYTE_BUFFER:
                 self._reader.feed(self._buffer, 0, bufflen)
+                self.bytes_received += bufflen
             else:
                 self._reader.feed(buffer)
+                self.bytes_received += len(buffer)
+            if read_size is not None:
+                if HIREDIS_USE_BYTE_BUFFER:
+                    socket_read_size = read_size.record(bufflen,
+                                                        len(self._buffer))
+                else:
+                    socket_read_size = read_size.record(len(buffer),
+                                                        socket_read_size)
             # proactively, but not conclusively, check if more data is in the
             # buffer. if the data received doesn't end with \r\n, there's more.
             if HIREDIS_USE_BYTE_BUFFER:
@@ -355,6 +913,92 @@ class HiredisParser(BaseParser):
                 if not buffer.endswith(SYM_CRLF):
                     continue
             response = self._reader.gets()
+        return self._handle_response(response)
+
+    def _socket_parser(self):
+        """
+        Return a PythonParser that reads directly from the socket, used to
+        stream a reply rather than handing it to hiredis as a whole. Returns
+        None if hiredis already holds part of the reply.
+        """
+        if not self._reader:
+            raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+        has_data = getattr(self._reader, 'has_data', None)
+        if self._next_response is not False or (has_data and has_data()):
+            return None
+        parser = PythonParser(self._read_size and self._read_size.size or
+                              self.socket_read_size)
+        parser._attach(self._sock, self.encoding)
+        return parser
+
+    def _release_socket_parser(self, parser):
+        "Feed anything read past the end of the reply back to hiredis"
+        buffer = parser._buffer
+        if buffer.length and self._reader:
+            self._reader.feed(bytes(
+                buffer._buffer[buffer.bytes_read:buffer.bytes_written]))
+        # detach the socket so it isn't closed along with the parser
+        parser._sock = parser._buffer = parser._reader = None
+        buffer.close()
+
+    def read_response_into(self, target, to_file=False):
+        """
+        Read a bulk reply, storing the value in ``target`` instead of
+        returning it. See ``SocketBuffer.read_into``.
+        """
+        parser = self._socket_parser()
+        if parser is None:
+            return self._copy_response_into(self.read_response(), target,
+                                            to_file)
+        response = parser.read_response_into(target, to_file)
+        self._release_socket_parser(parser)
+        return response
+
+    def read_response_iter(self):
+        """
+        Read a multi-bulk reply lazily. Returns an iterator that parses each
+        element off the socket as it's requested, or the exception instance
+        for an error reply.
+        """
+        parser = self._socket_parser()
+        if parser is None:
+            response = self.read_response()
+            if isinstance(response, ResponseError):
+                return response
+            if not isinstance(response, list):
+                raise InvalidResponse("Protocol Error: expected a multi-bulk "
+                                      "reply")
+            return iter(response)
+        response = parser.read_response_iter()
+        if isinstance(response, ResponseError):
+            self._release_socket_parser(parser)
+            return response
+        return self._iter_socket_parser(parser, response)
+
+    def _iter_socket_parser(self, parser, iterator):
+        for item in iterator:
+            yield item
+        self._release_socket_parser(parser)
+
+    def feed(self, data):
+        "Feed data read by the caller, for use without a blocking socket"
+        if not self._reader:
+            raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+        self._reader.feed(data)
+
+    def gets(self):
+        """
+        Return the next reply from data passed to ``feed``, or False if a
+        complete reply hasn't been fed yet.
+        """
+        if not self._reader:
+            raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+        response = self._reader.gets()
+        if response is False:
+            return response
+        return self._handle_response(response)
+
+    def _handle_response(self, response):
         # if an older version of hiredis is installed, we need to attempt
         # to convert ResponseErrors to their appropriate types.
         if not HIREDIS_SUPPORTS_CALLABLE_ERRORS:
@@ -379,19 +1023,142 @@ else:
     DefaultParser = PythonParser
 
 
+# non-blocking connect() results meaning the connection is still being made
+CONNECT_IN_PROGRESS = set((0, errno.EINPROGRESS, errno.EWOULDBLOCK,
+                           errno.EALREADY, 10035))  # 10035: WSAEWOULDBLOCK
+
+
+def interleave_families(addresses):
+    """
+    Reorder the results of getaddrinfo so address families alternate,
+    starting with the first one returned, as recommended by RFC 8305
+    """
+    families = []
+    by_family = {}
+    for address in addresses:
+        family = address[0]
+        if family not in by_family:
+            families.append(family)
+            by_family[family] = deque()
+        by_family[family].append(address)
+    result = []
+    while len(result) < len(addresses):
+        for family in families:
+            if by_family[family]:
+                result.append(by_family[family].popleft())
+    return result
+
+
+class PendingLookup(object):
+    "A getaddrinfo() call other connections are waiting for the result of"
+    __slots__ = ('done', 'addresses', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.addresses = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.addresses
+
+
+class Resolver(object):
+    """
+    Caches the addresses host names resolve to for ``ttl`` seconds. A
+    connection pool shares one between all of its connections, so
+    reconnecting doesn't wait on DNS every time.
+    """
+    def __init__(self, ttl=30):
+        self.ttl = float(ttl)
+        self._cache = {}
+        # (host, port) -> the PendingLookup of a lookup in progress
+        self._lookups = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        "Return the result of getaddrinfo() for a TCP connection to host:port"
+        key = (host, port)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.time():
+                return entry[1]
+            lookup = self._lookups.get(key)
+            if lookup is None:
+                lookup = self._lookups[key] = PendingLookup()
+                waiting = False
+            else:
+                waiting = True
+        if waiting:
+            # other connections wait for the lookup in progress instead of
+            # making their own
+            return lookup.wait()
+        # the lock isn't held while looking up, so a slow lookup only holds
+        # up the connections to the same host
+        try:
+            addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except Exception:
+            lookup.error = sys.exc_info()[1]
+            with self._lock:
+                del self._lookups[key]
+            lookup.done.set()
+            raise
+        lookup.addresses = addresses
+        with self._lock:
+            self._cache[key] = (time.time() + self.ttl, addresses)
+            del self._lookups[key]
+        lookup.done.set()
+        return addresses
+
+    def invalidate(self, host, port):
+        "Forget the addresses of host:port, e.g. after none were reachable"
+        with self._lock:
+            self._cache.pop((host, port), None)
+
+
+def _encode_bytes(value):
+    return value
+
+
+def _encode_int(value):
+    return b(str(value))
+
+
+def _encode_float(value):
+    return b(repr(value))
+
+
+def _encode_token(value):
+    return b(value.value)
+
+
 class Connection(object):
     "Manages TCP communication to and from a Redis server"
     description_format = "Connection<host=%(host)s,port=%(port)s,db=%(db)s>"
+    use_sendmsg = SENDMSG_AVAILABLE
+    # the EventListeners told about connects and disconnects, which are
+    # shared with the connection's pool
+    listeners = ()
+    # the PhaseTimings of the command being executed, if it's being timed
+    timings = None
 
     def __init__(self, host='localhost', port=6379, db=0, password=None,
                  socket_timeout=None, socket_connect_timeout=None,
                  socket_keepalive=False, socket_keepalive_options=None,
                  retry_on_timeout=False, encoding='utf-8',
                  encoding_errors='strict', decode_responses=False,
-                 parser_class=DefaultParser, socket_read_size=65536):
+                 parser_class=DefaultParser, socket_read_size=65536,
+                 health_check_interval=0, dns_cache_ttl=None, resolver=None,
+                 happy_eyeballs_delay=None, codec=None, serializers=None):
         self.pid = os.getpid()
         self.host = host
         self.port = int(port)
+        if resolver is None and dns_cache_ttl:
+            resolver = Resolver(dns_cache_ttl)
+        self.resolver = resolver
+        self.happy_eyeballs_delay = happy_eyeballs_delay
         self.db = db
         self.password = password
         self.socket_timeout = socket_timeout
@@ -399,11 +1166,22 @@ class Connection(object):
         self.socket_keepalive = socket_keepalive
         self.socket_keepalive_options = socket_keepalive_options or {}
         self.retry_on_timeout = retry_on_timeout
+        self.health_check_interval = float(health_check_interval or 0)
+        self.next_health_check = 0
         self.encoding = encoding
         self.encoding_errors = encoding_errors
         self.decode_responses = decode_responses
+        self.codec = codec
+        self.serializers = serializers
+        self._encoders = self._make_encoders()
+        # whether replies are decompressed, loaded or decoded by the
+        # connection rather than its parser
+        self.transform_replies = codec is not None or serializers is not None
         self._sock = None
         self._parser = parser_class(socket_read_size=socket_read_size)
+        # the number of bytes written to the server
+        self.bytes_sent = 0
+        self._buffer_cutoff = MIN_BUFFER_CUTOFF
         self._description_args = {
             'host': self.host,
             'port': self.port,
@@ -420,6 +1198,19 @@ class Connection(object):
         except Exception:
             pass
 
+    @property
+    def bytes_received(self):
+        "The number of bytes read from the server"
+        return self._parser.bytes_received
+
+    def set_timings(self, timings):
+        """
+        Record how long the phases of the commands sent from now on take in
+        ``timings``, a PhaseTimings, or stop timing them if it's None
+        """
+        self.timings = timings
+        self._parser.set_timings(timings)
+
     def register_connect_callback(self, callback):
         self._connect_callbacks.append(callback)
 
@@ -430,6 +1221,9 @@ class Connection(object):
         "Connects to the Redis server if not already connected"
         if self._sock:
             return
+        listeners = self.listeners
+        if listeners:
+            start = time.time()
         try:
             sock = self._connect()
         except socket.error:
@@ -437,12 +1231,15 @@ class Connection(object):
             raise ConnectionError(self._error_message(e))
 
         self._sock = sock
+        self._set_buffer_cutoff(sock)
         try:
             self.on_connect()
         except RedisError:
             # clean up after any error in on_connect
             self.disconnect()
             raise
+        if listeners:
+            events.notify(listeners, 'connected', self, time.time() - start)
 
         # run any user callbacks. right now the only internal callback
         # is for pubsub channel/pattern resubscription
@@ -454,40 +1251,145 @@ class Connection(object):
         # we want to mimic what socket.create_connection does to support
         # ipv4/ipv6, but we want to set options prior to calling
         # socket.connect()
+        if self.resolver is not None:
+            addresses = self.resolver.resolve(self.host, self.port)
+        else:
+            addresses = socket.getaddrinfo(self.host, self.port, 0,
+                                           socket.SOCK_STREAM)
+        if not addresses:
+            raise socket.error("socket.getaddrinfo returned an empty list")
+        try:
+            if self.happy_eyeballs_delay is not None and len(addresses) > 1:
+                sock = self._race(interleave_families(addresses))
+            else:
+                sock = self._connect_in_turn(addresses)
+        except socket.error:
+            if self.resolver is not None:
+                # the server may have moved. look it up again next time
+                self.resolver.invalidate(self.host, self.port)
+            raise
+        # set the socket_timeout now that we're connected
+        sock.settimeout(self.socket_timeout)
+        return sock
+
+    def _create_socket(self, family, socktype, proto):
+        sock = socket.socket(family, socktype, proto)
+        try:
+            # TCP_NODELAY
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            # TCP_KEEPALIVE
+            if self.socket_keepalive:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                for k, v in iteritems(self.socket_keepalive_options):
+                    sock.setsockopt(socket.SOL_TCP, k, v)
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def _connect_in_turn(self, addresses):
+        "Try connecting to each of ``addresses`` in turn"
         err = None
-        for res in socket.getaddrinfo(self.host, self.port, 0,
-                                      socket.SOCK_STREAM):
+        for res in addresses:
             family, socktype, proto, canonname, socket_address = res
             sock = None
             try:
-                sock = socket.socket(family, socktype, proto)
-                # TCP_NODELAY
-                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-
-                # TCP_KEEPALIVE
-                if self.socket_keepalive:
-                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-                    for k, v in iteritems(self.socket_keepalive_options):
-                        sock.setsockopt(socket.SOL_TCP, k, v)
+                sock = self._create_socket(family, socktype, proto)
 
                 # set the socket_connect_timeout before we connect
                 sock.settimeout(self.socket_connect_timeout)
 
                 # connect
                 sock.connect(socket_address)
-
-                # set the socket_timeout now that we're connected
-                sock.settimeout(self.socket_timeout)
                 return sock
 
             except socket.error as _:
                 err = _
                 if sock is not None:
                     sock.close()
+        raise err
 
-        if err is not None:
-            raise err
-        raise socket.error("socket.getaddrinfo returned an empty list")
+    def _race(self, addresses):
+        """
+        Connect to ``addresses`` Happy Eyeballs style: a new attempt is
+        started every ``happy_eyeballs_delay`` seconds, or as soon as one
+        fails, while earlier ones are still in progress, and the first
+        socket to connect wins
+        """
+        addresses = deque(addresses)
+        delay = self.happy_eyeballs_delay
+        timeout = self.socket_connect_timeout
+        # socket -> the time its attempt times out
+        pending = {}
+        err = None
+        next_attempt = 0
+        try:
+            while addresses or pending:
+                now = time.time()
+                if addresses and (now >= next_attempt or not pending):
+                    family, socktype, proto, canonname, socket_address = \
+                        addresses.popleft()
+                    try:
+                        sock = self._create_socket(family, socktype, proto)
+                    except socket.error as _:
+                        err = _
+                        continue
+                    sock.setblocking(0)
+                    code = sock.connect_ex(socket_address)
+                    if code not in CONNECT_IN_PROGRESS:
+                        err = socket.error(code, os.strerror(code))
+                        sock.close()
+                        continue
+                    pending[sock] = timeout and now + timeout
+                    next_attempt = now + delay
+
+                wait = None
+                if addresses:
+                    wait = next_attempt - now
+                for expires in pending.values():
+                    if expires and (wait is None or expires - now < wait):
+                        wait = expires - now
+                if wait is not None:
+                    wait = max(wait, 0)
+                socks = list(pending)
+                writable, failed = select([], socks, socks, wait)[1:]
+                now = time.time()
+                for sock in socks:
+                    if sock in writable or sock in failed:
+                        code = sock.getsockopt(socket.SOL_SOCKET,
+                                               socket.SO_ERROR)
+                        if code == 0:
+                            del pending[sock]
+                            return sock
+                        err = socket.error(code, os.strerror(code))
+                    elif pending[sock] and pending[sock] <= now:
+                        err = socket.timeout("timed out")
+                    else:
+                        continue
+                    del pending[sock]
+                    sock.close()
+                    # don't wait to try the next address
+                    next_attempt = 0
+        finally:
+            for sock in pending:
+                sock.close()
+        raise err
+
+    def _set_buffer_cutoff(self, sock):
+        """
+        Size the chunks produced by pack_command and pack_commands to the
+        socket's send buffer, so each chunk can be handed to the kernel in
+        one go while larger arguments are passed through without copying.
+        """
+        try:
+            send_buffer_size = sock.getsockopt(socket.SOL_SOCKET,
+                                               socket.SO_SNDBUF)
+        except (socket.error, AttributeError):
+            return
+        self._buffer_cutoff = max(MIN_BUFFER_CUTOFF,
+                                  min(send_buffer_size // 2,
+                                      MAX_BUFFER_CUTOFF))
 
     def _error_message(self, exception):
         # args for socket.error can either be (errno, "message")
@@ -526,35 +1428,175 @@ class Connection(object):
         except socket.error:
             pass
         self._sock = None
+        if self.listeners:
+            events.notify(self.listeners, 'disconnected', self)
 
     def send_packed_command(self, command):
         "Send an already packed command to the Redis server"
         if not self._sock:
             self.connect()
+        timings = self.timings
+        if timings is not None:
+            start = time.time()
         try:
-            if isinstance(command, str):
+            if isinstance(command, bytes):
                 command = [command]
-            for item in command:
-                self._sock.sendall(item)
+            if self.use_sendmsg:
+                self._sendmsg_all(command)
+            else:
+                for item in command:
+                    self._sock.sendall(item)
+                    self.bytes_sent += len(item)
         except socket.timeout:
             self.disconnect()
             raise TimeoutError("Timeout writing to socket")
         except socket.error:
             e = sys.exc_info()[1]
             self.disconnect()
-            if len(e.args) == 1:
-                _errno, errmsg = 'UNKNOWN', e.args[0]
-            else:
-                _errno, errmsg = e.args
-            raise ConnectionError("Error %s while writing to socket. %s." %
-                                  (_errno, errmsg))
+            raise self._write_error(e)
         except:
             self.disconnect()
             raise
+        if timings is not None:
+            timings.sent(start, time.time())
+
+    def _write_error(self, e):
+        "Convert a socket.error raised while writing to a ConnectionError"
+        if len(e.args) == 1:
+            _errno, errmsg = 'UNKNOWN', e.args[0]
+        else:
+            _errno, errmsg = e.args[:2]
+        return ConnectionError("Error %s while writing to socket. %s." %
+                               (_errno, errmsg))
+
+    def _sendmsg_all(self, chunks):
+        "Write all ``chunks`` to the socket using vectored sendmsg calls"
+        sock = self._sock
+        # sendmsg can't make progress on empty chunks
+        chunks = [chunk for chunk in chunks if len(chunk)]
+        index = 0
+        count = len(chunks)
+        while index < count:
+            sent = sock.sendmsg(chunks[index:index + IOV_MAX])
+            self.bytes_sent += sent
+            # skip past the chunks that were written completely and keep a
+            # view of the remainder of a partially written chunk
+            while sent:
+                chunk_length = len(chunks[index])
+                if sent >= chunk_length:
+                    sent -= chunk_length
+                    index += 1
+                else:
+                    chunks[index] = memoryview(chunks[index])[sent:]
+                    sent = 0
 
     def send_command(self, *args):
         "Pack and send a command to the Redis server"
-        self.send_packed_command(self.pack_command(*args))
+        timings = self.timings
+        if timings is None:
+            self.send_packed_command(self.pack_command(*args))
+            return
+        start = time.time()
+        encoded = self.encode_all(args[1:])
+        encoded_at = time.time()
+        # encoding the already encoded arguments again is a no-op
+        command = self.pack_command(args[0], *encoded)
+        timings.encode += encoded_at - start
+        timings.pack += time.time() - encoded_at
+        self.send_packed_command(command)
+
+    def send_command_from_file(self, args, fileobj, length=None,
+                               trailing_args=()):
+        """
+        Send the command ``args`` with an additional argument whose contents
+        are streamed from ``fileobj``, followed by ``trailing_args``.
+
+        ``fileobj`` is either a file-like object, which is read from its
+        current position, or an object supporting the buffer interface such
+        as an ``mmap``. ``length`` defaults to the remaining size of the file
+        or the size of the buffer. Real files are sent with
+        ``socket.sendfile`` where it's available and other files are read in
+        chunks of ``FILE_CHUNK_SIZE`` bytes, so the value is never held in
+        memory as a whole.
+        """
+        check_streamable(self)
+        if length is None:
+            length = file_length(fileobj)
+        name_length, packed_name = pack_command_name(args[0])
+        count = name_length + len(args) + len(trailing_args)
+        head = [SYM_STAR, b(str(count)), SYM_CRLF, packed_name]
+        head.extend(self._pack_arguments(args[1:]))
+        head.extend((SYM_DOLLAR, b(str(length)), SYM_CRLF))
+        tail = [SYM_CRLF]
+        tail.extend(self._pack_arguments(trailing_args))
+
+        self.send_packed_command(SYM_EMPTY.join(head))
+        try:
+            self._send_file(fileobj, length)
+        except socket.timeout:
+            self.disconnect()
+            raise TimeoutError("Timeout writing to socket")
+        except socket.error:
+            e = sys.exc_info()[1]
+            self.disconnect()
+            raise self._write_error(e)
+        except:
+            # the server is still waiting for the rest of the value
+            self.disconnect()
+            raise
+        self.bytes_sent += length
+        self.send_packed_command(SYM_EMPTY.join(tail))
+
+    def _pack_arguments(self, args):
+        "Return the pieces of the Redis protocol for the arguments ``args``"
+        pieces = []
+        for arg in imap(self.encode, args):
+            pieces.extend((SYM_DOLLAR, b(str(len(arg))), SYM_CRLF, arg,
+                           SYM_CRLF))
+        return pieces
+
+    def _send_file(self, fileobj, length):
+        "Write ``length`` bytes of ``fileobj`` to the socket"
+        if not length:
+            return
+        sock = self._sock
+        if not is_file(fileobj):
+            # a buffer, such as an mmap, which can be sent without copying
+            view = memoryview(fileobj)
+            if len(view) < length:
+                raise DataError("The buffer holds fewer than %d bytes" %
+                                length)
+            sock.sendall(view[:length])
+            return
+
+        if hasattr(sock, 'sendfile'):
+            try:
+                fileobj.fileno()
+                offset = fileobj.tell()
+            except Exception:
+                pass
+            else:
+                if sock.sendfile(fileobj, offset, length) < length:
+                    raise DataError("The file holds fewer than %d bytes" %
+                                    length)
+                return
+
+        scratch = memoryview(bytearray(min(length, FILE_CHUNK_SIZE)))
+        readinto = getattr(fileobj, 'readinto', None)
+        remaining = length
+        while remaining:
+            size = min(remaining, len(scratch))
+            if readinto is not None:
+                data_length = readinto(scratch[:size])
+                data = scratch[:data_length]
+            else:
+                data = fileobj.read(size)
+                data_length = len(data)
+            if not data_length:
+                raise DataError("The file holds fewer than %d bytes" %
+                                length)
+            sock.sendall(data)
+            remaining -= data_length
 
     def can_read(self, timeout=0):
         "Poll the socket to see if there's data that can be read."
@@ -565,91 +1607,334 @@ class Connection(object):
         return self._parser.can_read() or \
             bool(select([sock], [], [], timeout)[0])
 
+    def check_health(self):
+        """
+        Make sure a connection that's been idle for longer than
+        ``health_check_interval`` seconds is still usable before it's used
+        again, reconnecting if it isn't
+        """
+        if not self.health_check_interval or self._sock is None or \
+                time.time() < self.next_health_check:
+            return
+        try:
+            # an idle connection has nothing to read unless the server or
+            # something in between has closed it
+            if self.can_read():
+                raise ConnectionError("Idle connection has unread data")
+            self.send_command('PING')
+            if nativestr(self.read_response()) != 'PONG':
+                raise ConnectionError("Bad response to health check")
+        except (ConnectionError, TimeoutError):
+            self.disconnect()
+            self.connect()
+        self.next_health_check = time.time() + self.health_check_interval
+
     def read_response(self):
         "Read the response from a previously sent command"
+        timings = self.timings
+        if timings is not None:
+            # the time spent outside of reading from the socket
+            start = time.time() - timings.read
         try:
             response = self._parser.read_response()
         except:
             self.disconnect()
             raise
+        if self.transform_replies:
+            # error replies are returned as they are
+            response = self._decode_response(response)
+        if timings is not None:
+            timings.parse += time.time() - timings.read - start
         if isinstance(response, ResponseError):
             raise response
         return response
 
-    def encode(self, value):
-        "Return a bytestring representation of the value"
-        if isinstance(value, Token):
-            return b(value.value)
-        elif isinstance(value, bytes):
-            return value
-        elif isinstance(value, (int, long)):
-            value = b(str(value))
-        elif isinstance(value, float):
+    def read_responses(self, count):
+        """
+        Read the replies to ``count`` previously sent commands. Error replies
+        are returned as exception instances rather than raised.
+        """
+        timings = self.timings
+        if timings is not None:
+            start = time.time() - timings.read
+        try:
+            responses = self._parser.read_responses(count)
+        except:
+            self.disconnect()
+            raise
+        if self.transform_replies:
+            responses = [self._decode_response(response)
+                         for response in responses]
+        if timings is not None:
+            timings.parse += time.time() - timings.read - start
+        return responses
+
+    def _decode_response(self, response):
+        """
+        Decompress and load the values in a reply, then decode it if
+        needed
+        """
+        encoding = self.decode_responses and self.encoding or None
+        codec, serializers = self.codec, self.serializers
+        if codec is not None:
+            response = codec.decode_response(
+                response, serializers is None and encoding or None,
+                self.encoding_errors)
+        if serializers is not None:
+            response = serializers.decode_response(response, encoding,
+                                                   self.encoding_errors)
+        return response
+
+    def read_response_iter(self):
+        """
+        Read a multi-bulk reply from a previously sent command lazily,
+        returning an iterator over its elements. The reply must be read in
+        full before the connection is used again.
+        """
+        try:
+            response = self._parser.read_response_iter()
+        except:
+            self.disconnect()
+            raise
+        if isinstance(response, ResponseError):
+            raise response
+        return self._iter_response(response)
+
+    def _iter_response(self, iterator):
+        try:
+            for item in iterator:
+                if self.transform_replies:
+                    item = self._decode_response(item)
+                yield item
+        except:
+            self.disconnect()
+            raise
+
+    def read_response_into(self, target, to_file=False):
+        """
+        Read a bulk reply from a previously sent command into ``target``, a
+        writable buffer, or a file-like object if ``to_file`` is set. Returns
+        the length of the value or None if the reply was nil.
+        """
+        if self.transform_replies:
+            # the reply can't be left on the connection
+            self.disconnect()
+            check_streamable(self)
+        try:
+            response = self._parser.read_response_into(target, to_file)
+        except:
+            self.disconnect()
+            raise
+        if isinstance(response, ResponseError):
+            raise response
+        return response
+
+    def _make_encoders(self):
+        "Return a dict mapping types to the functions encode() uses for them"
+        encoding, errors = self.encoding, self.encoding_errors
+        encoders = {}
+        if self.serializers is not None:
+            encoders.update(self.serializers.encoders())
+        # strings and numbers are never serialized
+        encoders.update({
+            bytes: _encode_bytes,
+            unicode: lambda value: value.encode(encoding, errors),
+            int: _encode_int,
+            long: _encode_int,
+            float: _encode_float,
+            Token: _encode_token,
+        })
+        return encoders
+
+    def encode(self, value):
+        "Return a bytestring representation of the value"
+        try:
+            return self._encoders[type(value)](value)
+        except KeyError:
+            pass
+        # subclasses of the types above, and anything else
+        if isinstance(value, Token):
+            return b(value.value)
+        elif isinstance(value, bytes):
+            return value
+        elif isinstance(value, (int, long)):
+            value = b(str(value))
+        elif isinstance(value, float):
             value = b(repr(value))
         elif not isinstance(value, basestring):
+            if self.serializers is not None:
+                encoder = self.serializers.encoder(type(value))
+                if encoder is not None:
+                    self._encoders[type(value)] = encoder
+                    return encoder(value)
             value = str(value)
         if isinstance(value, unicode):
             value = value.encode(self.encoding, self.encoding_errors)
         return value
 
+    def encode_all(self, values):
+        "Return a list of the bytestring representations of ``values``"
+        encoders = self._encoders
+        encode = self.encode
+        result = []
+        append = result.append
+        for value in values:
+            encoder = encoders.get(type(value))
+            if encoder is not None:
+                append(encoder(value))
+            else:
+                append(encode(value))
+        return result
+
     def pack_command(self, *args):
         "Pack a series of arguments into the Redis protocol"
+        if self.codec is not None:
+            args = self.codec.encode_command(self, args)
         output = []
-        # the client might have included 1 or more literal arguments in
-        # the command name, e.g., 'CONFIG GET'. The Redis server expects these
-        # arguments to be sent separately, so split the first argument
-        # manually. All of these arguements get wrapped in the Token class
-        # to prevent them from being encoded.
-        command = args[0]
-        if ' ' in command:
-            args = tuple([Token(s) for s in command.split(' ')]) + args[1:]
+        name_length, packed_name = pack_command_name(args[0])
+        count = name_length + len(args) - 1
+        if count < len(ARRAY_HEADERS):
+            header = ARRAY_HEADERS[count]
         else:
-            args = (Token(command),) + args[1:]
-
-        buff = SYM_EMPTY.join(
-            (SYM_STAR, b(str(len(args))), SYM_CRLF))
-
-        for arg in imap(self.encode, args):
+            header = SYM_EMPTY.join((SYM_STAR, b(str(count)), SYM_CRLF))
+
+        pieces = [header, packed_name]
+        buffer_length = len(header) + len(packed_name)
+        buffer_cutoff = self._buffer_cutoff
+        for arg in self.encode_all(args[1:]):
+            arg_length = len(arg)
+            if arg_length < len(LENGTH_PREFIXES):
+                prefix = LENGTH_PREFIXES[arg_length]
+            else:
+                prefix = SYM_EMPTY.join((SYM_DOLLAR, b(str(arg_length)),
+                                         SYM_CRLF))
             # to avoid large string mallocs, chunk the command into the
             # output list if we're sending large values
-            if len(buff) > 6000 or len(arg) > 6000:
-                buff = SYM_EMPTY.join(
-                    (buff, SYM_DOLLAR, b(str(len(arg))), SYM_CRLF))
-                output.append(buff)
+            if buffer_length > buffer_cutoff or arg_length > buffer_cutoff:
+                pieces.append(prefix)
+                output.append(SYM_EMPTY.join(pieces))
                 output.append(arg)
-                buff = SYM_CRLF
+                pieces = [SYM_CRLF]
+                buffer_length = 2
             else:
-                buff = SYM_EMPTY.join((buff, SYM_DOLLAR, b(str(len(arg))),
-                                       SYM_CRLF, arg, SYM_CRLF))
-        output.append(buff)
+                pieces.extend((prefix, arg, SYM_CRLF))
+                buffer_length += len(prefix) + arg_length + 2
+        output.append(SYM_EMPTY.join(pieces))
         return output
 
     def pack_commands(self, commands):
         "Pack multiple commands into the Redis protocol"
+        timings = self.timings
+        if timings is not None:
+            start = time.time()
         output = []
         pieces = []
         buffer_length = 0
+        buffer_cutoff = self._buffer_cutoff
 
         for cmd in commands:
             for chunk in self.pack_command(*cmd):
-                pieces.append(chunk)
-                buffer_length += len(chunk)
-
-            if buffer_length > 6000:
-                output.append(SYM_EMPTY.join(pieces))
-                buffer_length = 0
-                pieces = []
+                chunklen = len(chunk)
+                if pieces and (buffer_length > buffer_cutoff or
+                               chunklen > buffer_cutoff):
+                    output.append(SYM_EMPTY.join(pieces))
+                    buffer_length = 0
+                    pieces = []
+
+                # large values are passed through as-is rather than being
+                # copied into the joined buffer
+                if chunklen > buffer_cutoff:
+                    output.append(chunk)
+                else:
+                    pieces.append(chunk)
+                    buffer_length += chunklen
 
         if pieces:
             output.append(SYM_EMPTY.join(pieces))
+        if timings is not None:
+            timings.pack += time.time() - start
         return output
 
 
+def ssl_cert_reqs_flag(ssl_cert_reqs):
+    "Return the ssl module's flag for a certificate requirements option"
+    if ssl_cert_reqs is None:
+        return ssl.CERT_NONE
+    elif isinstance(ssl_cert_reqs, basestring):
+        CERT_REQS = {
+            'none': ssl.CERT_NONE,
+            'optional': ssl.CERT_OPTIONAL,
+            'required': ssl.CERT_REQUIRED
+        }
+        if ssl_cert_reqs not in CERT_REQS:
+            raise RedisError(
+                "Invalid SSL Certificate Requirements Flag: %s" %
+                ssl_cert_reqs)
+        return CERT_REQS[ssl_cert_reqs]
+    return ssl_cert_reqs
+
+
+def create_ssl_context(ssl_keyfile=None, ssl_certfile=None,
+                       ssl_cert_reqs=None, ssl_ca_certs=None, **kwargs):
+    """
+    Create an SSLContext configured like the sockets ssl.wrap_socket()
+    returns for the same options. Any other keyword arguments are ignored.
+    """
+    protocol = getattr(ssl, 'PROTOCOL_TLS_CLIENT', ssl.PROTOCOL_SSLv23)
+    context = ssl.SSLContext(protocol)
+    # wrap_socket() never checked host names
+    context.check_hostname = False
+    context.verify_mode = ssl_cert_reqs_flag(ssl_cert_reqs)
+    if ssl_certfile:
+        context.load_cert_chain(ssl_certfile, ssl_keyfile)
+    if ssl_ca_certs:
+        context.load_verify_locations(ssl_ca_certs)
+    return context
+
+
+class SSLSessionCache(object):
+    """
+    The most recent TLS session with each server, so that SSLConnections
+    reconnecting to it can resume the session with an abbreviated handshake.
+    A connection pool shares one between all of its connections.
+    """
+    def __init__(self):
+        self._sessions = {}
+        # the number of handshakes that resumed a session, and that didn't
+        self.resumed = 0
+        self.full = 0
+
+    def get(self, key):
+        return self._sessions.get(key)
+
+    def save(self, key, sock):
+        "Remember ``sock``'s session, if it can be resumed"
+        try:
+            session = sock.session
+        except (AttributeError, ValueError, socket.error):
+            return
+        if session is not None:
+            self._sessions[key] = session
+
+    def handshake_done(self, key, sock):
+        if sock.session_reused:
+            self.resumed += 1
+        else:
+            self.full += 1
+            self.save(key, sock)
+
+    def clear(self):
+        self._sessions.clear()
+
+
 class SSLConnection(Connection):
     description_format = "SSLConnection<host=%(host)s,port=%(port)s,db=%(db)s>"
+    # SSL sockets don't implement sendmsg
+    use_sendmsg = False
 
     def __init__(self, ssl_keyfile=None, ssl_certfile=None, ssl_cert_reqs=None,
-                 ssl_ca_certs=None, **kwargs):
+                 ssl_ca_certs=None, ssl_context=None, ssl_session_cache=None,
+                 **kwargs):
         if not ssl_available:
             raise RedisError("Python wasn't built with SSL support")
 
@@ -657,32 +1942,51 @@ class SSLConnection(Connection):
 
         self.keyfile = ssl_keyfile
         self.certfile = ssl_certfile
-        if ssl_cert_reqs is None:
-            ssl_cert_reqs = ssl.CERT_NONE
-        elif isinstance(ssl_cert_reqs, basestring):
-            CERT_REQS = {
-                'none': ssl.CERT_NONE,
-                'optional': ssl.CERT_OPTIONAL,
-                'required': ssl.CERT_REQUIRED
-            }
-            if ssl_cert_reqs not in CERT_REQS:
-                raise RedisError(
-                    "Invalid SSL Certificate Requirements Flag: %s" %
-                    ssl_cert_reqs)
-            ssl_cert_reqs = CERT_REQS[ssl_cert_reqs]
-        self.cert_reqs = ssl_cert_reqs
+        self.cert_reqs = ssl_cert_reqs_flag(ssl_cert_reqs)
         self.ca_certs = ssl_ca_certs
+        if ssl_context is None and SSL_CONTEXT_AVAILABLE:
+            ssl_context = create_ssl_context(ssl_keyfile, ssl_certfile,
+                                             self.cert_reqs, ssl_ca_certs)
+        self.ssl_context = ssl_context
+        if ssl_session_cache is None and SSL_SESSIONS_AVAILABLE:
+            ssl_session_cache = SSLSessionCache()
+        # False turns session resumption off
+        self.ssl_session_cache = ssl_session_cache or None
 
     def _connect(self):
         "Wrap the socket with SSL support"
         sock = super(SSLConnection, self)._connect()
-        sock = ssl.wrap_socket(sock,
-                               cert_reqs=self.cert_reqs,
-                               keyfile=self.keyfile,
-                               certfile=self.certfile,
-                               ca_certs=self.ca_certs)
+        if self.ssl_context is None:
+            # Python < 2.7.9
+            return ssl.wrap_socket(sock,
+                                   cert_reqs=self.cert_reqs,
+                                   keyfile=self.keyfile,
+                                   certfile=self.certfile,
+                                   ca_certs=self.ca_certs)
+        cache = self.ssl_session_cache
+        if cache is None:
+            return self.ssl_context.wrap_socket(sock)
+        key = (self.host, self.port)
+        session = cache.get(key)
+        if session is not None:
+            sock = self.ssl_context.wrap_socket(sock, session=session)
+        else:
+            sock = self.ssl_context.wrap_socket(sock)
+        cache.handshake_done(key, sock)
         return sock
 
+    def disconnect(self):
+        "Disconnects from the Redis server"
+        sock = self._sock
+        if sock is not None and self.ssl_session_cache is not None and \
+                not sock.session_reused:
+            # TLS 1.3 servers send their session tickets after the
+            # handshake, so the session is only resumable once the
+            # connection has been used. connections that resumed a session
+            # leave it cached, as fetching a session isn't free
+            self.ssl_session_cache.save((self.host, self.port), sock)
+        super(SSLConnection, self).disconnect()
+
 
 class UnixDomainSocketConnection(Connection):
     description_format = "UnixDomainSocketConnection<path=%(path)s,db=%(db)s>"
@@ -691,18 +1995,30 @@ class UnixDomainSocketConnection(Connection):
                  socket_timeout=None, encoding='utf-8',
                  encoding_errors='strict', decode_responses=False,
                  retry_on_timeout=False,
-                 parser_class=DefaultParser, socket_read_size=65536):
+                 parser_class=DefaultParser, socket_read_size=65536,
+                 health_check_interval=0, codec=None, serializers=None):
         self.pid = os.getpid()
         self.path = path
         self.db = db
         self.password = password
         self.socket_timeout = socket_timeout
         self.retry_on_timeout = retry_on_timeout
+        self.health_check_interval = float(health_check_interval or 0)
+        self.next_health_check = 0
         self.encoding = encoding
         self.encoding_errors = encoding_errors
         self.decode_responses = decode_responses
+        self.codec = codec
+        self.serializers = serializers
+        self._encoders = self._make_encoders()
+        # whether replies are decompressed, loaded or decoded by the
+        # connection rather than its parser
+        self.transform_replies = codec is not None or serializers is not None
         self._sock = None
         self._parser = parser_class(socket_read_size=socket_read_size)
+        # the number of bytes written to the server
+        self.bytes_sent = 0
+        self._buffer_cutoff = MIN_BUFFER_CUTOFF
         self._description_args = {
             'path': self.path,
             'db': self.db,
@@ -727,6 +2043,83 @@ class UnixDomainSocketConnection(Connection):
                 (exception.args[0], self.path, exception.args[1])
 
 
+def reaper(pool_ref, token):
+    """
+    Reap and replenish a pool's connections every ``reap_interval`` seconds,
+    until the pool is reset or garbage collected
+    """
+    while True:
+        pool = pool_ref()
+        if pool is None or pool._reaper is not token:
+            return
+        interval = pool.reap_interval
+        try:
+            pool.reap()
+            pool.replenish()
+        except Exception:
+            # the server may be unavailable for now. try again later
+            pass
+        del pool
+        time.sleep(interval)
+
+
+def parse_url(url, db=None):
+    """
+    Return the connection options described by ``url``, as documented by
+    ``ConnectionPool.from_url``. The connection class is only included for
+    unix:// and rediss:// URLs.
+    """
+    url_string = url
+    url = urlparse(url)
+    qs = ''
+
+    # in python2.6, custom URL schemes don't recognize querystring values
+    # they're left as part of the url.path.
+    if '?' in url.path and not url.query:
+        # chop the querystring including the ? off the end of the url
+        # and reparse it.
+        qs = url.path.split('?', 1)[1]
+        url = urlparse(url_string[:-(len(qs) + 1)])
+    else:
+        qs = url.query
+
+    url_options = {}
+
+    for name, value in iteritems(parse_qs(qs)):
+        if value and len(value) > 0:
+            url_options[name] = value[0]
+
+    # We only support redis:// and unix:// schemes.
+    if url.scheme == 'unix':
+        url_options.update({
+            'password': url.password,
+            'path': url.path,
+            'connection_class': UnixDomainSocketConnection,
+        })
+
+    else:
+        url_options.update({
+            'host': url.hostname,
+            'port': int(url.port or 6379),
+            'password': url.password,
+        })
+
+        # If there's a path argument, use it as the db argument if a
+        # querystring value wasn't specified
+        if 'db' not in url_options and url.path:
+            try:
+                url_options['db'] = int(url.path.replace('/', ''))
+            except (AttributeError, ValueError):
+                pass
+
+        if url.scheme == 'rediss':
+            url_options['connection_class'] = SSLConnection
+
+    # last shot at the db value
+    url_options['db'] = int(url_options.get('db', db or 0))
+    return url_options
+
+
 class ConnectionPool(object):
     "Generic connection pool"
     @classmethod
@@ -758,57 +2151,8 @@ class ConnectionPool(object):
         passed along to the ConnectionPool class's initializer. In the case
         of conflicting arguments, querystring arguments always win.
         """
-        url_string = url
-        url = urlparse(url)
-        qs = ''
-
-        # in python2.6, custom URL schemes don't recognize querystring values
-        # they're left as part of the url.path.
-        if '?' in url.path and not url.query:
-            # chop the querystring including the ? off the end of the url
-            # and reparse it.
-            qs = url.path.split('?', 1)[1]
-            url = urlparse(url_string[:-(len(qs) + 1)])
-        else:
-            qs = url.query
-
-        url_options = {}
-
-        for name, value in iteritems(parse_qs(qs)):
-            if value and len(value) > 0:
-                url_options[name] = value[0]
-
-        # We only support redis:// and unix:// schemes.
-        if url.scheme == 'unix':
-            url_options.update({
-                'password': url.password,
-                'path': url.path,
-                'connection_class': UnixDomainSocketConnection,
-            })
-
-        else:
-            url_options.update({
-                'host': url.hostname,
-                'port': int(url.port or 6379),
-                'password': url.password,
-            })
-
-            # If there's a path argument, use it as the db argument if a
-            # querystring value wasn't specified
-            if 'db' not in url_options and url.path:
-                try:
-                    url_options['db'] = int(url.path.replace('/', ''))
-                except (AttributeError, ValueError):
-                    pass
-
-            if url.scheme == 'rediss':
-                url_options['connection_class'] = SSLConnection
-
-        # last shot at the db value
-        url_options['db'] = int(url_options.get('db', db or 0))
-
         # update the arguments from the URL values
-        kwargs.update(url_options)
+        kwargs.update(parse_url(url, db))
 
         # backwards compatability
         if 'charset' in kwargs:
@@ -823,7 +2167,8 @@ class ConnectionPool(object):
         return cls(**kwargs)
 
     def __init__(self, connection_class=Connection, max_connections=None,
-                 **connection_kwargs):
+                 max_idle_time=None, max_connection_lifetime=None, min_idle=0,
+                 reap_interval=1, reaper_thread=False, **connection_kwargs):
         """
         Create a connection pool. If max_connections is set, then this
         object raises redis.ConnectionError when the pool's limit is reached.
@@ -831,6 +2176,14 @@ class ConnectionPool(object):
         By default, TCP connections are created connection_class is specified.
         Use redis.UnixDomainSocketConnection for unix sockets.
 
+        Idle connections are closed once they've been idle for
+        ``max_idle_time`` seconds, leaving at least ``min_idle`` of them
+        open, and connections are closed once they're
+        ``max_connection_lifetime`` seconds old. Idle connections are reaped
+        at most every ``reap_interval`` seconds when a connection is
+        released, or by a background thread if ``reaper_thread`` is set,
+        which also opens connections until ``min_idle`` are idle.
+
         Any additional keyword arguments are passed to the constructor of
         connection_class.
         """
@@ -838,9 +2191,41 @@ class ConnectionPool(object):
         if not isinstance(max_connections, (int, long)) or max_connections < 0:
             raise ValueError('"max_connections" must be a positive integer')
 
+        # all of the pool's connections share a cache of DNS lookups
+        if connection_kwargs.get('dns_cache_ttl') and \
+                connection_kwargs.get('resolver') is None:
+            connection_kwargs['resolver'] = \
+                Resolver(connection_kwargs['dns_cache_ttl'])
+        # and an SSLContext and the TLS sessions they can resume
+        if ssl_available and isinstance(connection_class, type) and \
+                issubclass(connection_class, SSLConnection):
+            if connection_kwargs.get('ssl_context') is None and \
+                    SSL_CONTEXT_AVAILABLE:
+                connection_kwargs['ssl_context'] = \
+                    create_ssl_context(**connection_kwargs)
+            if connection_kwargs.get('ssl_session_cache') is None and \
+                    SSL_SESSIONS_AVAILABLE:
+                connection_kwargs['ssl_session_cache'] = SSLSessionCache()
+
         self.connection_class = connection_class
         self.connection_kwargs = connection_kwargs
         self.max_connections = max_connections
+        # EventListeners, shared with the pool's connections
+        self.listeners = []
+        # connections idle for longer than this are checked before they're
+        # handed out again
+        self.health_check_interval = float(
+            connection_kwargs.get('health_check_interval') or 0)
+        self.max_idle_time = max_idle_time and float(max_idle_time)
+        self.max_connection_lifetime = max_connection_lifetime and \
+            float(max_connection_lifetime)
+        self.min_idle = int(min_idle or 0)
+        self.reap_interval = float(reap_interval)
+        self.reaper_thread = reaper_thread
+        # whether connections' ages and idle times need to be tracked
+        self._reaping = bool(self.max_idle_time or
+                             self.max_connection_lifetime or
+                             (reaper_thread and self.min_idle))
 
         self.reset()
 
@@ -856,6 +2241,22 @@ class ConnectionPool(object):
         self._available_connections = []
         self._in_use_connections = set()
         self._check_lock = threading.Lock()
+        self._reset_reaping()
+
+    def _reset_reaping(self):
+        # when each connection was created, and when each idle connection
+        # was released
+        self._created_at = {}
+        self._idle_since = {}
+        self._next_reap = 0
+        self._reap_lock = threading.Lock()
+        # a reaper thread exits once the pool has been reset
+        self._reaper = object()
+        if self.reaper_thread:
+            thread = threading.Thread(target=reaper,
+                                      args=(weakref.ref(self), self._reaper))
+            thread.daemon = True
+            thread.start()
 
     def _checkpid(self):
         if self.pid != os.getpid():
@@ -870,6 +2271,30 @@ class ConnectionPool(object):
     def get_connection(self, command_name, *keys, **options):
         "Get a connection from the pool"
         self._checkpid()
+        try:
+            connection = self._available_connections.pop()
+        except IndexError:
+            connection = self.make_connection()
+        else:
+            if self._reaping and self._expired(connection, time.time()):
+                self._discard(connection)
+                connection = self.make_connection()
+        self._in_use_connections.add(connection)
+        if self.health_check_interval:
+            try:
+                connection.check_health()
+            except:
+                self.release(connection)
+                raise
+        return connection
+
+    def _get_connection_nowait(self):
+        """
+        Get an idle connection, or a new one if the pool may make it,
+        without waiting, health checks or reaping. Raises ConnectionError
+        when every connection is in use
+        """
+        self._checkpid()
         try:
             connection = self._available_connections.pop()
         except IndexError:
@@ -882,14 +2307,42 @@ class ConnectionPool(object):
         if self._created_connections >= self.max_connections:
             raise ConnectionError("Too many connections")
         self._created_connections += 1
-        return self.connection_class(**self.connection_kwargs)
+        connection = self.connection_class(**self.connection_kwargs)
+        connection.listeners = self.listeners
+        if self._reaping:
+            self._created_at[connection] = time.time()
+        return connection
+
+    def add_listener(self, listener):
+        """
+        Add an EventListener to be told about the commands executed, and
+        the connections checked out, opened and closed, using the pool
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        "Stop telling ``listener`` about the pool's events"
+        self.listeners.remove(listener)
 
     def release(self, connection):
         "Releases the connection back to the pool"
         self._checkpid()
         if connection.pid != self.pid:
             return
+        if self.health_check_interval:
+            connection.next_health_check = \
+                time.time() + self.health_check_interval
         self._in_use_connections.remove(connection)
+        if self._reaping:
+            now = time.time()
+            if self._expired(connection, now):
+                self._discard(connection)
+                return
+            self._idle_since[connection] = now
+            self._available_connections.append(connection)
+            if now >= self._next_reap:
+                self.reap()
+            return
         self._available_connections.append(connection)
 
     def disconnect(self):
@@ -899,6 +2352,146 @@ class ConnectionPool(object):
         for connection in all_conns:
             connection.disconnect()
 
+    def _expired(self, connection, now):
+        "Whether ``connection`` has outlived max_connection_lifetime"
+        lifetime = self.max_connection_lifetime
+        return bool(lifetime) and \
+            now - self._created_at.get(connection, now) >= lifetime
+
+    def _reapable(self, idle, now):
+        """
+        Return the connections in ``idle``, ordered from least to most
+        recently used, that should be closed
+        """
+        max_idle_time = self.max_idle_time
+        remaining = len(idle)
+        reapable = []
+        for connection in idle:
+            if self._expired(connection, now) or (
+                    max_idle_time and remaining > self.min_idle and
+                    now - self._idle_since.get(connection, now) >=
+                    max_idle_time):
+                reapable.append(connection)
+                remaining -= 1
+        return reapable
+
+    def _discard(self, connection):
+        "Close ``connection`` and forget about it"
+        connection.disconnect()
+        self._created_at.pop(connection, None)
+        self._idle_since.pop(connection, None)
+        self._created_connections -= 1
+
+    def reap(self):
+        """
+        Close the idle connections that have been idle for longer than
+        max_idle_time or are older than max_connection_lifetime
+        """
+        self._checkpid()
+        now = time.time()
+        self._next_reap = now + self.reap_interval
+        with self._reap_lock:
+            for connection in self._reapable(
+                    list(self._available_connections), now):
+                try:
+                    self._available_connections.remove(connection)
+                except ValueError:
+                    # it was handed out in the meantime
+                    continue
+                self._discard(connection)
+
+    def replenish(self):
+        "Open new connections until at least min_idle connections are idle"
+        self._checkpid()
+        with self._reap_lock:
+            while len(self._available_connections) < self.min_idle and \
+                    self._created_connections < self.max_connections:
+                connection = self.make_connection()
+                try:
+                    connection.connect()
+                except:
+                    self._discard(connection)
+                    raise
+                self._idle_since[connection] = time.time()
+                self._available_connections.insert(0, connection)
+
+    def warm(self, n, parallelism=4):
+        """
+        Open and initialize up to ``n`` connections, ``parallelism`` at a
+        time, so they're ready before they're needed. Returns a list with a
+        dict for each connection that was opened, holding the
+        ``connection``, the ``time`` in seconds it took to connect and
+        initialize, and the ``error`` raised if it couldn't be.
+
+        Only the connections that are free right now are warmed: this never
+        waits for one to be released, and the pool's listeners aren't told
+        about the connections opened, since the results report them.
+        """
+        connections = []
+        try:
+            for i in xrange(min(n, self.max_connections)):
+                connections.append(self._get_connection_nowait())
+        except ConnectionError:
+            # every connection the pool may create is in use
+            pass
+        pending = deque([connection for connection in connections
+                         if connection._sock is None])
+        results = []
+
+        def connect():
+            while True:
+                try:
+                    connection = pending.popleft()
+                except IndexError:
+                    return
+                error = None
+                listeners, connection.listeners = connection.listeners, ()
+                start = time.time()
+                try:
+                    connection.connect()
+                except RedisError:
+                    error = sys.exc_info()[1]
+                finally:
+                    connection.listeners = listeners
+                results.append({
+                    'connection': connection,
+                    'time': time.time() - start,
+                    'error': error,
+                })
+
+        try:
+            threads = [threading.Thread(target=connect)
+                       for i in xrange(min(parallelism, len(pending)))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for connection in connections:
+                self.release(connection)
+        return results
+
+
+# the upper bounds, in seconds, of the buckets of the wait time histograms
+# kept by BlockingConnectionPool. the last bucket holds longer waits
+WAIT_TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                     0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class PoolWaiter(object):
+    "A caller waiting for a BlockingConnectionPool to hand it a connection"
+    __slots__ = ('priority', 'deadline', 'condition', 'handed', 'connection',
+                 'cancelled', 'dropped')
+
+    def __init__(self, priority, deadline, condition):
+        self.priority = priority
+        self.deadline = deadline
+        self.condition = condition
+        self.handed = False
+        self.connection = None
+        self.cancelled = False
+        self.dropped = False
+
 
 class BlockingConnectionPool(ConnectionPool):
     """
@@ -932,6 +2525,18 @@ class BlockingConnectionPool(ConnectionPool):
         # Raise a ``ConnectionError`` after five seconds if a connection is
         # not available.
         >>> pool = BlockingConnectionPool(timeout=5)
+
+    Callers waiting for a connection are handed released connections in the
+    order they started waiting, highest ``priority`` first. A caller whose
+    ``deadline`` (a ``time.time()`` timestamp) passes while it waits is
+    dropped, raising a ``ConnectionError``. Both can be passed to
+    get_connection(), or set for the commands run by the current thread:
+
+        >>> with pool.waiting(priority=10, deadline=time.time() + 0.1):
+        ...     client.get('foo')
+
+    ``waiters`` is the number of callers waiting right now, and
+    wait_time_histograms() returns how long callers have waited.
     """
     def __init__(self, max_connections=50, timeout=20,
                  connection_class=Connection, queue_class=LifoQueue,
@@ -960,10 +2565,130 @@ class BlockingConnectionPool(ConnectionPool):
         # disconnect them later.
         self._connections = []
 
+        # a heap of (-priority, sequence, waiter) entries, so released
+        # connections go to the highest priority, longest waiting caller
+        self._waiting = []
+        self._sequence = count()
+        # the priority and deadline set by waiting() for each thread
+        self._local = threading.local()
+        # priority -> the number of checkouts in each WAIT_TIME_BUCKETS
+        # bucket
+        self._wait_times = {}
+        self.timeouts = 0
+        self.dropped = 0
+        self._reset_reaping()
+
+    @contextmanager
+    def waiting(self, priority=0, deadline=None):
+        """
+        Wait for connections with ``priority`` and ``deadline`` when none
+        are passed to get_connection() in the current thread
+        """
+        local = self._local
+        previous = getattr(local, 'options', None)
+        local.options = (priority, deadline)
+        try:
+            yield
+        finally:
+            local.options = previous
+
+    @property
+    def waiters(self):
+        "The number of callers waiting for a connection"
+        with self.pool.mutex:
+            return len([entry for entry in self._waiting
+                        if not entry[2].cancelled])
+
+    def wait_time_histograms(self):
+        """
+        Return a dict mapping each priority to a list of
+        ``(upper_bound, count)`` pairs, counting the checkouts that waited
+        at most ``upper_bound`` seconds for a connection
+        """
+        bounds = WAIT_TIME_BUCKETS + (float('inf'),)
+        with self.pool.mutex:
+            return dict([(priority, list(izip(bounds, counts)))
+                         for priority, counts in iteritems(self._wait_times)])
+
+    def _record_wait(self, priority, seconds):
+        try:
+            counts = self._wait_times[priority]
+        except KeyError:
+            counts = self._wait_times[priority] = \
+                [0] * (len(WAIT_TIME_BUCKETS) + 1)
+        counts[bisect_left(WAIT_TIME_BUCKETS, seconds)] += 1
+
+    def _wait(self, priority, deadline, start):
+        """
+        Wait for a connection to be handed over, until the pool's timeout
+        or ``deadline``. Must be called holding the pool's mutex.
+        """
+        end = None
+        if self.timeout is not None:
+            end = start + self.timeout
+        if deadline is not None and (end is None or deadline < end):
+            end = deadline
+        waiter = PoolWaiter(priority, deadline,
+                            threading.Condition(self.pool.mutex))
+        heappush(self._waiting, (-priority, next(self._sequence), waiter))
+        while not waiter.handed and not waiter.dropped:
+            if end is None:
+                waiter.condition.wait()
+                continue
+            remaining = end - time.time()
+            if remaining <= 0:
+                break
+            waiter.condition.wait(remaining)
+        if waiter.handed:
+            return waiter.connection
+        # released connections skip over cancelled waiters
+        waiter.cancelled = True
+        if waiter.dropped or \
+                (deadline is not None and time.time() >= deadline):
+            self.dropped += 1
+            raise ConnectionError("Deadline passed while waiting for a "
+                                  "connection.")
+        self.timeouts += 1
+        # Note that this is not caught by the redis client and will be
+        # raised unless handled by application code.
+        raise ConnectionError("No connection available.")
+
+    def _put(self, connection):
+        """
+        Hand ``connection``, or a free slot for one if it's None, to the
+        next waiter or put it back in the queue. Must be called holding the
+        pool's mutex.
+        """
+        waiting = self._waiting
+        now = None
+        while waiting:
+            waiter = heappop(waiting)[2]
+            if waiter.cancelled:
+                continue
+            if waiter.deadline is not None:
+                now = now or time.time()
+                if waiter.deadline <= now:
+                    # it's too late for this one
+                    waiter.dropped = True
+                    waiter.condition.notify()
+                    continue
+            waiter.handed = True
+            waiter.connection = connection
+            waiter.condition.notify()
+            return
+        pool = self.pool
+        if pool._qsize() < pool.maxsize:
+            pool._put(connection)
+        # otherwise perhaps the pool has been reset() after a fork?
+        # regardless, we don't want this connection
+
     def make_connection(self):
         "Make a fresh connection."
         connection = self.connection_class(**self.connection_kwargs)
+        connection.listeners = self.listeners
         self._connections.append(connection)
+        if self._reaping:
+            self._created_at[connection] = time.time()
         return connection
 
     def get_connection(self, command_name, *keys, **options):
@@ -981,21 +2706,50 @@ class BlockingConnectionPool(ConnectionPool):
         # Make sure we haven't changed process.
         self._checkpid()
 
+        priority = options.get('priority')
+        deadline = options.get('deadline')
+        if priority is None and deadline is None:
+            priority, deadline = getattr(self._local, 'options', None) or \
+                (0, None)
+        priority = priority or 0
+
         # Try and get a connection from the pool. If one isn't available within
-        # self.timeout then raise a ``ConnectionError``.
-        connection = None
-        try:
-            connection = self.pool.get(block=True, timeout=self.timeout)
-        except Empty:
-            # Note that this is not caught by the redis client and will be
-            # raised unless handled by application code. If you want never to
-            raise ConnectionError("No connection available.")
+        # self.timeout then raise a ``ConnectionError``. Released connections
+        # are handed straight to waiting callers, so the queue is only ever
+        # holding connections when nobody is waiting.
+        start = time.time()
+        with self.pool.mutex:
+            if self.pool._qsize():
+                connection = self.pool._get()
+            else:
+                connection = self._wait(priority, deadline, start)
+            self._record_wait(priority, time.time() - start)
 
         # If the ``connection`` is actually ``None`` then that's a cue to make
         # a new connection to add to the pool.
         if connection is None:
             connection = self.make_connection()
+        elif self._reaping and self._expired(connection, time.time()):
+            self._discard(connection)
+            connection = self.make_connection()
+
+        if self.health_check_interval:
+            try:
+                connection.check_health()
+            except:
+                self.release(connection)
+                raise
+        return connection
 
+    def _get_connection_nowait(self):
+        "Get a connection if one is free, never waiting for a release"
+        self._checkpid()
+        with self.pool.mutex:
+            if not self.pool._qsize():
+                raise ConnectionError("No connection available.")
+            connection = self.pool._get()
+        if connection is None:
+            connection = self.make_connection()
         return connection
 
     def release(self, connection):
@@ -1004,16 +2758,547 @@ class BlockingConnectionPool(ConnectionPool):
         self._checkpid()
         if connection.pid != self.pid:
             return
+        if self.health_check_interval:
+            connection.next_health_check = \
+                time.time() + self.health_check_interval
+        if self._reaping:
+            now = time.time()
+            if self._expired(connection, now):
+                # give up the connection's slot for a new one
+                self._discard(connection)
+                connection = None
+            else:
+                self._idle_since[connection] = now
 
         # Put the connection back into the pool.
-        try:
-            self.pool.put_nowait(connection)
-        except Full:
-            # perhaps the pool has been reset() after a fork? regardless,
-            # we don't want this connection
-            pass
+        with self.pool.mutex:
+            self._put(connection)
+
+        if self._reaping and now >= self._next_reap:
+            self.reap()
 
     def disconnect(self):
         "Disconnects all connections in the pool."
         for connection in self._connections:
             connection.disconnect()
+
+    def _discard(self, connection):
+        "Close ``connection`` and forget about it"
+        connection.disconnect()
+        self._created_at.pop(connection, None)
+        self._idle_since.pop(connection, None)
+        try:
+            self._connections.remove(connection)
+        except ValueError:
+            pass
+
+    def reap(self):
+        """
+        Close the idle connections that have been idle for longer than
+        max_idle_time or are older than max_connection_lifetime
+        """
+        self._checkpid()
+        now = time.time()
+        self._next_reap = now + self.reap_interval
+        with self.pool.mutex:
+            queue = self.pool.queue
+            reapable = self._reapable(
+                [connection for connection in queue if connection is not None],
+                now)
+            if not reapable:
+                return
+            # the slots of reaped connections are freed up for new ones
+            for index, connection in enumerate(queue):
+                if connection in reapable:
+                    queue[index] = None
+            if isinstance(queue, list):
+                # keep the LifoQueue handing out open connections first
+                queue.sort(key=lambda connection: connection is not None)
+        for connection in reapable:
+            self._discard(connection)
+
+    def replenish(self):
+        "Open new connections until at least min_idle connections are idle"
+        self._checkpid()
+        while True:
+            with self.pool.mutex:
+                queue = self.pool.queue
+                idle = len(queue) - list(queue).count(None)
+                if idle >= self.min_idle or idle == len(queue):
+                    return
+                # claim a free slot for the new connection
+                queue.remove(None)
+            connection = self.make_connection()
+            try:
+                connection.connect()
+            except:
+                self._discard(connection)
+                connection = None
+                raise
+            finally:
+                if connection is not None:
+                    self._idle_since[connection] = time.time()
+                with self.pool.mutex:
+                    self._put(connection)
+
+
+class StripedConnectionPool(ConnectionPool):
+    """
+    Connection pool that scales to many threads::
+
+        >>> pool = StripedConnectionPool(max_connections=100)
+        >>> client = StrictRedis(connection_pool=pool)
+
+    Idle connections are kept in ``stripes`` separate stacks, and each thread
+    is assigned a stripe of its own. A thread releases connections to its
+    own stripe and takes them back from it first, so it keeps reusing the
+    same connection while other threads do the same with theirs. Only when
+    its stripe is empty does a thread take the least recently used
+    connection from another stripe, or make a new one.
+
+    Checking a connection out and releasing it don't take any locks; the
+    stacks are deques, whose appends and pops are thread-safe. A lock is
+    only taken to count connections as they're made and closed, so no more
+    than ``max_connections`` are ever open. Like ConnectionPool, a
+    ConnectionError is raised when all of them are in use.
+    """
+    def __init__(self, stripes=32, **kwargs):
+        if not isinstance(stripes, (int, long)) or stripes < 1:
+            raise ValueError('"stripes" must be a positive integer')
+        self.stripes = stripes
+        super(StripedConnectionPool, self).__init__(**kwargs)
+
+    def reset(self):
+        self.pid = os.getpid()
+        self._check_lock = threading.Lock()
+        self._stripes = [deque() for i in xrange(self.stripes)]
+        # the thread local stripe index of each thread
+        self._local = threading.local()
+        self._next_stripe = 0
+        # guards the count of connections and the set of all of them
+        self._count_lock = threading.Lock()
+        self._created_connections = 0
+        self._connections = set()
+        self._reset_reaping()
+
+    def _stripe(self):
+        "Return the index of the current thread's stripe"
+        try:
+            return self._local.stripe
+        except AttributeError:
+            with self._count_lock:
+                stripe = self._next_stripe
+                self._next_stripe = (stripe + 1) % self.stripes
+            self._local.stripe = stripe
+            self._local.idle = self._stripes[stripe]
+            return stripe
+
+    def get_connection(self, command_name, *keys, **options):
+        "Get a connection from the pool"
+        if self.pid != os.getpid():
+            self._checkpid()
+        try:
+            # the connection this thread released last
+            connection = self._local.idle.pop()
+        except (AttributeError, IndexError):
+            connection = self._steal()
+            if connection is None:
+                connection = self.make_connection()
+        if self._reaping and self._expired(connection, time.time()):
+            self._discard(connection)
+            connection = self.make_connection()
+        if self.health_check_interval:
+            try:
+                connection.check_health()
+            except:
+                self.release(connection)
+                raise
+        return connection
+
+    def _get_connection_nowait(self):
+        "Get an idle connection, or a new one if the pool may make it"
+        if self.pid != os.getpid():
+            self._checkpid()
+        try:
+            connection = self._local.idle.pop()
+        except (AttributeError, IndexError):
+            connection = self._steal()
+            if connection is None:
+                connection = self.make_connection()
+        return connection
+
+    def _steal(self):
+        """
+        Take the least recently used connection of the first stripe that
+        has one, starting with the current thread's own
+        """
+        stripes = self._stripes
+        index = self._stripe()
+        for i in xrange(self.stripes):
+            try:
+                return stripes[(index + i) % self.stripes].popleft()
+            except IndexError:
+                pass
+        return None
+
+    def make_connection(self):
+        "Create a new connection"
+        with self._count_lock:
+            if self._created_connections >= self.max_connections:
+                raise ConnectionError("Too many connections")
+            self._created_connections += 1
+        try:
+            connection = self.connection_class(**self.connection_kwargs)
+        except:
+            with self._count_lock:
+                self._created_connections -= 1
+            raise
+        connection.listeners = self.listeners
+        with self._count_lock:
+            self._connections.add(connection)
+        if self._reaping:
+            self._created_at[connection] = time.time()
+        return connection
+
+    def release(self, connection):
+        "Releases the connection back to the pool"
+        if self.pid != os.getpid():
+            self._checkpid()
+        if connection.pid != self.pid or \
+                connection not in self._connections:
+            # it was made before the pool was reset
+            return
+        if self.health_check_interval:
+            connection.next_health_check = \
+                time.time() + self.health_check_interval
+        try:
+            idle = self._local.idle
+        except AttributeError:
+            idle = self._stripes[self._stripe()]
+        if self._reaping:
+            now = time.time()
+            if self._expired(connection, now):
+                self._discard(connection)
+                return
+            self._idle_since[connection] = now
+            idle.append(connection)
+            if now >= self._next_reap:
+                self.reap()
+            return
+        idle.append(connection)
+
+    def disconnect(self):
+        "Disconnects all connections in the pool"
+        with self._count_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.disconnect()
+
+    def _discard(self, connection):
+        "Close ``connection`` and forget about it"
+        connection.disconnect()
+        self._created_at.pop(connection, None)
+        self._idle_since.pop(connection, None)
+        with self._count_lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+                self._created_connections -= 1
+
+    def reap(self):
+        """
+        Close the idle connections that have been idle for longer than
+        max_idle_time or are older than max_connection_lifetime
+        """
+        self._checkpid()
+        now = time.time()
+        self._next_reap = now + self.reap_interval
+        idle_since = self._idle_since
+        with self._reap_lock:
+            idle = [connection for stripe in self._stripes
+                    for connection in list(stripe)]
+            idle.sort(key=lambda connection: idle_since.get(connection, now))
+            for connection in self._reapable(idle, now):
+                for stripe in self._stripes:
+                    try:
+                        stripe.remove(connection)
+                    except ValueError:
+                        continue
+                    self._discard(connection)
+                    break
+
+    def replenish(self):
+        "Open new connections until at least min_idle connections are idle"
+        self._checkpid()
+        with self._reap_lock:
+            stripe = 0
+            while sum(imap(len, self._stripes)) < self.min_idle:
+                try:
+                    connection = self.make_connection()
+                except ConnectionError:
+                    # every connection the pool may make is in use
+                    return
+                try:
+                    connection.connect()
+                except:
+                    self._discard(connection)
+                    raise
+                self._idle_since[connection] = time.time()
+                # spread them out, behind the stripes' recently used ones
+                self._stripes[stripe].appendleft(connection)
+                stripe = (stripe + 1) % self.stripes
+
+
+class PendingReply(object):
+    "A command written to an AutoPipeline whose reply hasn't been read yet"
+    __slots__ = ('args', 'sent', 'done', 'response', 'error')
+
+    def __init__(self, args):
+        self.args = args
+        self.sent = False
+        self.done = False
+        self.response = None
+        self.error = None
+
+    def set_error(self, error):
+        self.error = error
+        self.done = True
+
+
+class AutoPipeline(object):
+    """
+    Multiplexes commands from many threads over a single connection.
+
+    Commands queued while another thread is writing are coalesced into one
+    ``pack_commands`` write. Replies arrive in the order the commands were
+    written, so whichever thread is reading resolves the oldest outstanding
+    reply until its own reply has been read. If anything goes wrong with the
+    connection, the AutoPipeline is marked as broken and every outstanding
+    reply is failed with the error.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.broken = False
+        self._queue_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._queued = []
+        self._in_flight = deque()
+
+    def send(self, args):
+        "Queue a command and make sure it's been written to the socket"
+        reply = PendingReply(args)
+        with self._queue_lock:
+            if self.broken:
+                raise ConnectionError("Error while writing to socket. "
+                                      "The auto pipeline is broken.")
+            self._queued.append(reply)
+
+        with self._write_lock:
+            # another thread may have written our command along with its own
+            # while we were waiting for the lock
+            if not reply.done and not reply.sent:
+                with self._queue_lock:
+                    batch, self._queued = self._queued, []
+                connection = self.connection
+                try:
+                    if not batch:
+                        # a failure already drained the queue
+                        raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+                    connection.send_packed_command(
+                        connection.pack_commands([r.args for r in batch]))
+                except Exception:
+                    self.fail(sys.exc_info()[1], batch)
+                else:
+                    for r in batch:
+                        r.sent = True
+                    self._in_flight.extend(batch)
+
+        if reply.error is not None:
+            raise self._copy_error(reply.error)
+        return reply
+
+    def read(self, reply):
+        "Read replies off the connection until ``reply`` has been resolved"
+        with self._read_lock:
+            while not reply.done:
+                try:
+                    pending = self._in_flight.popleft()
+                except IndexError:
+                    # a failure elsewhere already drained the replies
+                    break
+                try:
+                    pending.response = self.connection.read_response()
+                except ResponseError:
+                    pending.response = sys.exc_info()[1]
+                except Exception:
+                    self.fail(sys.exc_info()[1], [pending])
+                    break
+                pending.done = True
+
+        if reply.error is not None:
+            raise self._copy_error(reply.error)
+        if not reply.done:
+            raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
+        if isinstance(reply.response, ResponseError):
+            raise reply.response
+        return reply.response
+
+    def fail(self, error, replies=()):
+        "Mark the AutoPipeline broken and fail all outstanding replies"
+        with self._queue_lock:
+            self.broken = True
+            failed = list(replies) + self._queued
+            self._queued = []
+            while self._in_flight:
+                failed.append(self._in_flight.popleft())
+        for reply in failed:
+            reply.set_error(error)
+        self.connection.disconnect()
+
+    def _copy_error(self, error):
+        # several threads may raise the same failure concurrently, so each
+        # gets its own exception instance
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return error.__class__(*error.args)
+        return ConnectionError("Error while communicating with the server: "
+                               "%r" % (error,))
+
+
+class AutoPipelineConnection(object):
+    """
+    A lightweight, per-command stand in for a Connection that's handed out
+    by AutoPipelineConnectionPool. Commands are sent through the pool's
+    shared AutoPipeline and ``read_response`` blocks until the reply for
+    this command has been read.
+
+    If the connection is used for anything other than ``send_command`` and
+    ``read_response``, such as by a Pipeline, a dedicated connection is
+    checked out of the pool and used from then on.
+    """
+    # bytes aren't counted per command on the shared connection
+    bytes_sent = None
+    bytes_received = None
+
+    def __init__(self, connection_pool):
+        self.connection_pool = connection_pool
+        self.pid = connection_pool.pid
+        self.retry_on_timeout = connection_pool.connection_kwargs.get(
+            'retry_on_timeout', False)
+        self.dedicated = None
+        self._auto_pipeline = None
+        self._reply = None
+
+    def __repr__(self):
+        return "%s<%s>" % (type(self).__name__, repr(self.connection_pool))
+
+    def get_dedicated_connection(self):
+        if self.dedicated is None:
+            self.dedicated = self.connection_pool.get_dedicated_connection()
+        return self.dedicated
+
+    def send_command(self, *args):
+        if self.dedicated is not None:
+            return self.dedicated.send_command(*args)
+        self._auto_pipeline = self.connection_pool.get_auto_pipeline()
+        self._reply = self._auto_pipeline.send(args)
+
+    def read_response(self):
+        if self.dedicated is not None:
+            return self.dedicated.read_response()
+        reply, self._reply = self._reply, None
+        if reply is None:
+            raise ConnectionError("No command has been sent")
+        return self._auto_pipeline.read(reply)
+
+    def read_responses(self, count):
+        return self.get_dedicated_connection().read_responses(count)
+
+    def pack_command(self, *args):
+        return self.get_dedicated_connection().pack_command(*args)
+
+    def pack_commands(self, commands):
+        return self.get_dedicated_connection().pack_commands(commands)
+
+    def send_packed_command(self, command):
+        return self.get_dedicated_connection().send_packed_command(command)
+
+    def can_read(self, timeout=0):
+        return self.get_dedicated_connection().can_read(timeout)
+
+    def set_timings(self, timings):
+        # phases aren't timed on the shared connection
+        if self.dedicated is not None:
+            self.dedicated.set_timings(timings)
+
+    def disconnect(self):
+        # the shared connection disconnects itself when it fails
+        if self.dedicated is not None:
+            self.dedicated.disconnect()
+        self._reply = None
+
+
+class AutoPipelineConnectionPool(ConnectionPool):
+    """
+    Connection pool that transparently pipelines commands issued
+    concurrently by multiple threads over a single shared connection::
+
+        >>> pool = AutoPipelineConnectionPool(host='localhost')
+        >>> client = StrictRedis(connection_pool=pool)
+
+    Commands that block the connection or change its state, as well as
+    Pipelines, PubSub and commands that stream their reply, are given a
+    dedicated connection just as they would be by ConnectionPool.
+    """
+    DEDICATED_COMMANDS = set((
+        'pubsub', 'MULTI', 'WATCH', 'UNWATCH', 'EXEC', 'DISCARD',
+        'BLPOP', 'BRPOP', 'BRPOPLPUSH', 'SUBSCRIBE', 'PSUBSCRIBE',
+        'MONITOR', 'SELECT', 'AUTH', 'QUIT', 'SHUTDOWN', 'CLIENT SETNAME',
+        'DEBUG SLEEP',
+    ))
+
+    def reset(self):
+        super(AutoPipelineConnectionPool, self).reset()
+        self._auto_pipeline = None
+        self._auto_pipeline_lock = threading.Lock()
+
+    def get_auto_pipeline(self):
+        "Return the shared AutoPipeline, replacing it if it has failed"
+        self._checkpid()
+        auto_pipeline = self._auto_pipeline
+        if auto_pipeline is None or auto_pipeline.broken:
+            with self._auto_pipeline_lock:
+                auto_pipeline = self._auto_pipeline
+                if auto_pipeline is None or auto_pipeline.broken:
+                    if auto_pipeline is not None:
+                        # give the failed connection's slot back
+                        self._discard(auto_pipeline.connection)
+                    auto_pipeline = AutoPipeline(self.make_connection())
+                    self._auto_pipeline = auto_pipeline
+        return auto_pipeline
+
+    def get_dedicated_connection(self):
+        "Get a connection that isn't shared with other threads"
+        return super(AutoPipelineConnectionPool, self).get_connection('_')
+
+    def get_connection(self, command_name, *keys, **options):
+        "Get a connection from the pool"
+        if options.get('dedicated') or \
+                command_name in self.DEDICATED_COMMANDS:
+            return self.get_dedicated_connection()
+        self._checkpid()
+        return AutoPipelineConnection(self)
+
+    def release(self, connection):
+        "Releases the connection back to the pool"
+        if isinstance(connection, AutoPipelineConnection):
+            if connection.dedicated is None:
+                return
+            connection, connection.dedicated = connection.dedicated, None
+        super(AutoPipelineConnectionPool, self).release(connection)
+
+    def disconnect(self):
+        "Disconnects all connections in the pool"
+        super(AutoPipelineConnectionPool, self).disconnect()
+        auto_pipeline = self._auto_pipeline
+        if auto_pipeline is not None:
+            auto_pipeline.fail(ConnectionError("Connection pool disconnected"))
@@ -0,0 +1,208 @@
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventListener(object):
+    """
+    Receives events from the connection pools it's added to, and from the
+    clients and connections using them::
+
+        >>> class SlowCommands(EventListener):
+        ...     def command_finished(self, event):
+        ...         if event.duration > 0.01:
+        ...             log.warning('%s took %.3fs', event.command_name,
+        ...                         event.duration)
+        >>> r = StrictRedis(event_listeners=[SlowCommands()])
+
+    Subclasses override the methods for the events they're interested in.
+    Listeners are called synchronously by the thread executing the command,
+    so they should be quick. Exceptions raised by a listener are logged to
+    the 'redis.events' logger and otherwise ignored, so they never fail the
+    command.
+    """
+    def command_started(self, event):
+        "A command or pipeline is about to be sent on ``event.connection``"
+
+    def command_finished(self, event):
+        """
+        A command or pipeline has finished. ``event.error`` is the exception
+        it raised, if any. When getting a connection from the pool failed,
+        the command never started and ``event.connection`` is None
+        """
+
+    def command_retried(self, event, error):
+        "A command or pipeline is being sent again after ``error``"
+
+    def connection_checked_out(self, pool, connection, wait_time):
+        "``connection`` was taken from ``pool`` after ``wait_time`` seconds"
+
+    def connected(self, connection, duration):
+        "``connection`` connected, including its handshake, in ``duration``"
+
+    def disconnected(self, connection):
+        "``connection`` closed its socket"
+
+
+class CommandEvent(object):
+    """
+    Describes a single command, or a pipeline of them, to EventListeners.
+
+    ``args`` are the command's arguments, including its name, with a value
+    streamed from a file standing in as '<length bytes>', and
+    ``commands`` the arguments of each command for a pipeline, whose name
+    is 'PIPELINE', or 'MULTI' for a transaction. ``pool`` is the connection
+    pool the command was executed with. Times are in seconds:
+    ``pool_wait`` is how long checking a connection out took, and
+    ``duration`` how long the command took from when it started, retries
+    and response callbacks included. ``bytes_sent`` and ``bytes_received``
+    count what was written and read on the connection meanwhile, and are
+    None for connections that are shared by several commands. ``timings``
+    are the command's PhaseTimings if a listener asked for them by calling
+    ``time_phases`` when the command started.
+    """
+    __slots__ = ('command_name', 'args', 'commands', 'pool', 'connection',
+                 'start_time', 'pool_wait', 'duration', 'bytes_sent',
+                 'bytes_received', 'retries', 'error', 'timings')
+
+    def __init__(self, command_name, args=(), commands=None, pool=None):
+        self.command_name = command_name
+        self.args = args
+        self.commands = commands
+        self.pool = pool
+        self.connection = None
+        self.start_time = None
+        self.pool_wait = 0.0
+        self.duration = None
+        self.bytes_sent = None
+        self.bytes_received = None
+        self.retries = 0
+        self.error = None
+        self.timings = None
+
+    def __repr__(self):
+        return "%s<%s, duration=%r>" % (type(self).__name__,
+                                        self.command_name, self.duration)
+
+    def time_phases(self):
+        "Time the phases of the command, returning its PhaseTimings"
+        if self.timings is None:
+            self.timings = PhaseTimings()
+        return self.timings
+
+
+class PhaseTimings(object):
+    """
+    How long each phase of a command took, in seconds. ``encode`` is
+    turning the arguments into bytes, ``pack`` building the Redis protocol
+    out of them (including encoding, for pipelines), ``send`` writing to the
+    socket and ``read`` reading from it, ``parse`` parsing and decoding
+    replies outside of those reads, and ``callback`` running the response
+    callback of a single command. ``first_byte`` is how long after the
+    command was sent its reply started arriving, which overlaps ``read``.
+    """
+    PHASES = ('encode', 'pack', 'send', 'first_byte', 'read', 'parse',
+              'callback')
+    __slots__ = PHASES + ('sent_at',)
+
+    def __init__(self):
+        self.encode = 0.0
+        self.pack = 0.0
+        self.send = 0.0
+        self.first_byte = None
+        self.read = 0.0
+        self.parse = 0.0
+        self.callback = 0.0
+        # when sending the command last finished
+        self.sent_at = None
+
+    def __repr__(self):
+        return "%s<%s>" % (type(self).__name__, ', '.join([
+            '%s=%r' % (phase, getattr(self, phase))
+            for phase in self.PHASES]))
+
+    def sent(self, start, end):
+        "Called by a connection when it has written to its socket"
+        self.send += end - start
+        self.sent_at = end
+
+    def received(self, start, end):
+        "Called by a parser when it has read from its socket"
+        self.read += end - start
+        if self.first_byte is None and self.sent_at is not None:
+            self.first_byte = end - self.sent_at
+
+    def as_dict(self):
+        "Return a dict mapping each phase to how long it took"
+        return dict([(phase, getattr(self, phase)) for phase in self.PHASES])
+
+
+def notify(listeners, name, *args):
+    """
+    Call the method ``name`` of each of ``listeners`` with ``args``, logging
+    the exceptions they raise rather than raising them
+    """
+    for listener in listeners:
+        try:
+            getattr(listener, name)(*args)
+        except Exception:
+            logger.exception('%r raised an exception in %s()', listener, name)
+
+
+def check_out(listeners, event, pool, *args, **options):
+    "Get a connection from ``pool`` for ``event``, timing how long it takes"
+    start = time.time()
+    try:
+        connection = pool.get_connection(*args, **options)
+    finally:
+        event.pool_wait = wait_time = time.time() - start
+    notify(listeners, 'connection_checked_out', pool, connection, wait_time)
+    return connection
+
+
+def command_started(listeners, event, connection):
+    event.connection = connection
+    # the byte counts are finished as differences from these
+    event.bytes_sent = connection.bytes_sent
+    event.bytes_received = connection.bytes_received
+    event.start_time = time.time()
+    notify(listeners, 'command_started', event)
+    if event.timings is not None:
+        connection.set_timings(event.timings)
+
+
+def parse_response(event, client, connection, command_name, options):
+    "Call the client's parse_response(), timing the response callback"
+    timings = event.timings
+    if timings is None:
+        return client.parse_response(connection, command_name, **options)
+    # the time spent outside of reading and parsing the reply
+    start = time.time() - timings.read - timings.parse
+    response = client.parse_response(connection, command_name, **options)
+    timings.callback += time.time() - timings.read - timings.parse - start
+    return response
+
+
+def command_retried(listeners, event, error):
+    event.retries += 1
+    notify(listeners, 'command_retried', event, error)
+
+
+def command_finished(listeners, event, error=None):
+    now = time.time()
+    if event.start_time is None:
+        # the command failed before it could be started
+        event.start_time = now
+    event.duration = now - event.start_time
+    event.error = error
+    connection = event.connection
+    if connection is not None:
+        if event.timings is not None:
+            connection.set_timings(None)
+        if event.bytes_sent is not None:
+            event.bytes_sent = connection.bytes_sent - event.bytes_sent
+            event.bytes_received = \
+                connection.bytes_received - event.bytes_received
+    notify(listeners, 'command_finished', event)
@@ -0,0 +1,355 @@
+import threading
+import weakref
+from functools import partial
+
+from redis._compat import iteritems
+from redis.events import EventListener
+
+
+# latencies are recorded in microseconds, in buckets whose width is at most
+# 1 / 2 ** (SUB_BUCKET_BITS - 1) of their lower bound, as in an HDR
+# histogram. 5 bits keeps percentiles within about 6% of the real value
+SUB_BUCKET_BITS = 5
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+
+if hasattr(int, 'bit_length'):
+    bit_length = int.bit_length
+else:
+    # Python 2.6
+    def bit_length(value):
+        return len(bin(value)) - 2
+
+
+def bucket_index(value):
+    "Return the index of the bucket holding ``value``, a positive integer"
+    exponent = bit_length(value) - SUB_BUCKET_BITS
+    if exponent <= 0:
+        return value
+    return exponent * SUB_BUCKET_HALF + (value >> exponent)
+
+
+def bucket_bounds(index):
+    "Return the lowest and highest values held by the bucket ``index``"
+    if index < SUB_BUCKET_COUNT:
+        return index, index
+    exponent = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF + 1
+    mantissa = index - exponent * SUB_BUCKET_HALF
+    return mantissa << exponent, ((mantissa + 1) << exponent) - 1
+
+
+class LatencyHistogram(object):
+    """
+    A log-bucketed histogram of durations. Durations are recorded in
+    seconds, and percentiles are reported as the highest duration of the
+    bucket they fall in.
+    """
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, duration):
+        # the clock may have gone backwards
+        index = bucket_index(max(int(duration * 1000000), 0))
+        counts = self.counts
+        counts[index] = counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += duration
+
+    def merge(self, other):
+        "Add the durations recorded by ``other`` to this histogram"
+        counts = self.counts
+        for index, count in iteritems(dict(other.counts)):
+            counts[index] = counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+
+    def buckets(self):
+        """
+        Return a list of (upper bound, count) pairs for the buckets that
+        have been recorded into, in order
+        """
+        return [((bucket_bounds(index)[1] + 1) / 1000000.0, count)
+                for index, count in sorted(iteritems(self.counts))]
+
+    def percentile(self, percentile):
+        "Return the duration ``percentile`` percent of durations are under"
+        if not self.count:
+            return 0.0
+        target = self.count * percentile / 100.0
+        seen = 0
+        for upper_bound, count in self.buckets():
+            seen += count
+            if seen >= target:
+                return upper_bound
+        return upper_bound
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+            'max': self.percentile(100),
+            'buckets': self.buckets(),
+        }
+
+
+class CommandStats(object):
+    "The metrics of one command on one pool, as recorded by one thread"
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.errors += other.errors
+        self.retries += other.retries
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+
+    def snapshot(self):
+        return {
+            'latency': self.latency.snapshot(),
+            'errors': self.errors,
+            'retries': self.retries,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+        }
+
+
+class ThreadMetrics(object):
+    """
+    The metrics recorded by one thread, keyed by the id of their pool so
+    they don't keep it alive
+    """
+    def __init__(self):
+        # (id(pool), command name) -> CommandStats
+        self.commands = {}
+        # id(pool) -> LatencyHistogram
+        self.pool_waits = {}
+
+    def forget(self, pool_id):
+        "Drop the metrics of the pool whose id is ``pool_id``"
+        for key in list(self.commands):
+            if key[0] == pool_id:
+                self.commands.pop(key, None)
+        self.pool_waits.pop(pool_id, None)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _format_float(value):
+    return repr(float(value))
+
+
+class MetricsCollector(EventListener):
+    """
+    Keeps latency histograms and counters of errors, retries and bytes sent
+    and received for each command executed through the pools it's added
+    to, and a histogram of how long checking connections out of each pool
+    took::
+
+        >>> metrics = MetricsCollector()
+        >>> pool = ConnectionPool(host='localhost')
+        >>> metrics.attach(pool, 'cache')
+        >>> r = StrictRedis(connection_pool=pool)
+        >>> r.get('foo')
+        >>> metrics.snapshot()['cache']['commands']['GET']['latency']['p99']
+        0.000192
+
+    Each thread records into its own counters, which are only combined when
+    a snapshot or the Prometheus text is asked for. Pools are named after
+    their connections unless they're given a name by ``attach``. The
+    metrics of a pool are dropped once it's garbage collected.
+    """
+    def __init__(self):
+        self._names = weakref.WeakKeyDictionary()
+        self.reset()
+
+    def reset(self):
+        "Forget everything recorded so far"
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._threads = []
+        # id(pool) -> a weak reference to the pool
+        self._pools = {}
+
+    def attach(self, pool, name=None):
+        "Collect the metrics of ``pool``, naming them ``name``"
+        if name is not None:
+            self._names[pool] = name
+        pool.add_listener(self)
+
+    def pool_name(self, pool):
+        "Return the name ``pool``'s metrics are reported under"
+        if pool is None:
+            return 'unknown'
+        try:
+            return self._names[pool]
+        except KeyError:
+            return repr(pool)
+
+    def _pool_id(self, pool):
+        "Return the key ``pool``'s metrics are recorded under"
+        if pool is None:
+            return None
+        pool_id = id(pool)
+        if pool_id not in self._pools:
+            self._pools[pool_id] = weakref.ref(pool,
+                                               partial(self._forget, pool_id))
+        return pool_id
+
+    def _forget(self, pool_id, ref):
+        "Called when the pool whose id is ``pool_id`` is garbage collected"
+        if self._pools.get(pool_id) is ref:
+            del self._pools[pool_id]
+        # copying the list doesn't need the lock, which this may have been
+        # called while holding
+        for metrics in list(self._threads):
+            metrics.forget(pool_id)
+
+    def _pool_id_name(self, pool_id):
+        ref = self._pools.get(pool_id)
+        return self.pool_name(ref and ref())
+
+    def _thread_metrics(self):
+        "Return the calling thread's metrics"
+        try:
+            return self._local.metrics
+        except AttributeError:
+            metrics = self._local.metrics = ThreadMetrics()
+            with self._lock:
+                self._threads.append(metrics)
+            return metrics
+
+    def command_finished(self, event):
+        try:
+            commands = self._local.metrics.commands
+        except AttributeError:
+            commands = self._thread_metrics().commands
+        key = (self._pool_id(event.pool), event.command_name)
+        stats = commands.get(key)
+        if stats is None:
+            stats = commands[key] = CommandStats()
+        stats.latency.record(event.duration)
+        if event.error is not None:
+            stats.errors += 1
+        stats.retries += event.retries
+        if event.bytes_sent is not None:
+            stats.bytes_sent += event.bytes_sent
+            stats.bytes_received += event.bytes_received
+
+    def connection_checked_out(self, pool, connection, wait_time):
+        try:
+            pool_waits = self._local.metrics.pool_waits
+        except AttributeError:
+            pool_waits = self._thread_metrics().pool_waits
+        pool_id = self._pool_id(pool)
+        histogram = pool_waits.get(pool_id)
+        if histogram is None:
+            histogram = pool_waits[pool_id] = LatencyHistogram()
+        histogram.record(wait_time)
+
+    def _combine(self):
+        """
+        Return the metrics of all threads combined, as dicts of pool name
+        -> command name -> CommandStats and pool name -> LatencyHistogram
+        """
+        with self._lock:
+            threads = list(self._threads)
+        commands = {}
+        pool_waits = {}
+        for metrics in threads:
+            for (pool_id, command_name), stats in \
+                    list(metrics.commands.items()):
+                pool_commands = commands.setdefault(
+                    self._pool_id_name(pool_id), {})
+                if command_name not in pool_commands:
+                    pool_commands[command_name] = CommandStats()
+                pool_commands[command_name].merge(stats)
+            for pool_id, histogram in list(metrics.pool_waits.items()):
+                name = self._pool_id_name(pool_id)
+                if name not in pool_waits:
+                    pool_waits[name] = LatencyHistogram()
+                pool_waits[name].merge(histogram)
+        return commands, pool_waits
+
+    def snapshot(self):
+        """
+        Return a dict mapping each pool's name to a dict of its 'commands',
+        keyed by command name, and its 'pool_wait' histogram
+        """
+        commands, pool_waits = self._combine()
+        snapshot = {}
+        for name in set(commands) | set(pool_waits):
+            snapshot[name] = {
+                'commands': dict([
+                    (command_name, stats.snapshot())
+                    for command_name, stats
+                    in iteritems(commands.get(name, {}))]),
+                'pool_wait': pool_waits.get(name,
+                                            LatencyHistogram()).snapshot(),
+            }
+        return snapshot
+
+    def prometheus(self, prefix='redis'):
+        "Return the metrics in the Prometheus text exposition format"
+        commands, pool_waits = self._combine()
+        lines = []
+        command_stats = sorted([
+            ('pool="%s",command="%s"' % (_escape(name),
+                                         _escape(command_name)), stats)
+            for name, pool_commands in iteritems(commands)
+            for command_name, stats in iteritems(pool_commands)])
+
+        def histogram(metric, help_text, histograms):
+            lines.append('# HELP %s %s' % (metric, help_text))
+            lines.append('# TYPE %s histogram' % metric)
+            for labels, latency in histograms:
+                seen = 0
+                for upper_bound, count in latency.buckets():
+                    seen += count
+                    lines.append('%s_bucket{%s,le="%s"} %d' % (
+                        metric, labels, _format_float(upper_bound), seen))
+                lines.append('%s_bucket{%s,le="+Inf"} %d' % (
+                    metric, labels, latency.count))
+                lines.append('%s_sum{%s} %s' % (
+                    metric, labels, _format_float(latency.sum)))
+                lines.append('%s_count{%s} %d' % (
+                    metric, labels, latency.count))
+
+        def counter(metric, help_text, attribute):
+            lines.append('# HELP %s %s' % (metric, help_text))
+            lines.append('# TYPE %s counter' % metric)
+            for labels, stats in command_stats:
+                lines.append('%s{%s} %d' % (metric, labels,
+                                            getattr(stats, attribute)))
+
+        histogram('%s_command_duration_seconds' % prefix,
+                  'How long commands took, including retries.',
+                  [(labels, stats.latency)
+                   for labels, stats in command_stats])
+        counter('%s_command_errors_total' % prefix,
+                'Commands that raised an error.', 'errors')
+        counter('%s_command_retries_total' % prefix,
+                'Commands that were sent again after a connection error.',
+                'retries')
+        counter('%s_command_sent_bytes_total' % prefix,
+                'Bytes written to the server by commands.', 'bytes_sent')
+        counter('%s_command_received_bytes_total' % prefix,
+                'Bytes read from the server by commands.', 'bytes_received')
+        histogram('%s_pool_wait_seconds' % prefix,
+                  'How long checking a connection out of the pool took.',
+                  sorted([('pool="%s"' % _escape(name), latency)
+                          for name, latency in iteritems(pool_waits)]))
+        return '\n'.join(lines) + '\n'
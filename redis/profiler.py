@@ -0,0 +1,115 @@
+import threading
+from itertools import count
+
+from redis._compat import iteritems
+from redis.events import EventListener, PhaseTimings
+from redis.metrics import LatencyHistogram
+
+
+# the phases a command's time is broken down into, in the order they happen
+PHASES = ('pool_wait',) + PhaseTimings.PHASES + ('total',)
+
+
+class PhaseProfiler(EventListener):
+    """
+    Times the phases of one in every ``sample_every`` commands executed
+    through the pools it's added to, and aggregates them per command::
+
+        >>> profiler = PhaseProfiler(sample_every=100)
+        >>> r = StrictRedis(event_listeners=[profiler])
+        >>> ...
+        >>> print(profiler.report())
+        command     samples  phase       mean (ms)  p99 (ms)  share
+        HGETALL         120  pool_wait       0.002     0.004   0.1%
+                             encode          0.003     0.005   0.2%
+        ...
+
+    The phases are waiting for the pool, encoding the arguments, packing
+    the command, sending it, waiting for the first byte of the reply
+    (which overlaps reading), reading from the socket, parsing the reply
+    outside of those reads, running the response callback, and the total.
+    Only the sampled commands pay for reading the clock around each phase.
+    """
+    def __init__(self, sample_every=100):
+        if sample_every < 1:
+            raise ValueError('"sample_every" must be a positive integer')
+        self.sample_every = sample_every
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        "Forget the samples taken so far"
+        self._counter = count()
+        # command name -> phase -> LatencyHistogram
+        self._phases = {}
+
+    def command_started(self, event):
+        if next(self._counter) % self.sample_every == 0:
+            event.time_phases()
+
+    def command_finished(self, event):
+        timings = event.timings
+        if timings is None:
+            return
+        durations = timings.as_dict()
+        durations['pool_wait'] = event.pool_wait
+        durations['total'] = event.pool_wait + event.duration
+        with self._lock:
+            phases = self._phases.get(event.command_name)
+            if phases is None:
+                phases = self._phases[event.command_name] = dict([
+                    (phase, LatencyHistogram()) for phase in PHASES])
+            for phase, duration in iteritems(durations):
+                if duration is not None:
+                    phases[phase].record(duration)
+
+    def stats(self):
+        """
+        Return a dict mapping each sampled command's name to a dict of its
+        'samples' and, for each phase, a dict of its 'mean', 'p50', 'p99'
+        and 'max' durations and its 'share' of the total time
+        """
+        stats = {}
+        with self._lock:
+            for command_name, phases in iteritems(self._phases):
+                total = phases['total'].sum
+                command_stats = {'samples': phases['total'].count}
+                for phase in PHASES:
+                    histogram = phases[phase]
+                    samples = histogram.count
+                    command_stats[phase] = {
+                        'mean': samples and histogram.sum / samples or 0.0,
+                        'p50': histogram.percentile(50),
+                        'p99': histogram.percentile(99),
+                        'max': histogram.percentile(100),
+                        'share': total and histogram.sum / total or 0.0,
+                    }
+                stats[command_name] = command_stats
+        return stats
+
+    def report(self):
+        """
+        Return the stats as a table, with the commands that took the most
+        time overall first
+        """
+        stats = self.stats()
+        lines = ['%-12s %8s  %-10s %10s %9s %6s' % (
+            'command', 'samples', 'phase', 'mean (ms)', 'p99 (ms)', 'share')]
+        commands = sorted(
+            iteritems(stats),
+            key=lambda item: item[1]['samples'] * item[1]['total']['mean'],
+            reverse=True)
+        for command_name, command_stats in commands:
+            first = True
+            for phase in PHASES:
+                phase_stats = command_stats[phase]
+                if first:
+                    prefix = '%-12s %8d' % (command_name,
+                                            command_stats['samples'])
+                    first = False
+                else:
+                    prefix = ' ' * 21
+                lines.append('%s  %-10s %10.3f %9.3f %5.1f%%' % (
+                    prefix, phase, phase_stats['mean'] * 1000,
+                    phase_stats['p99'] * 1000, phase_stats['share'] * 100))
+        return '\n'.join(lines)
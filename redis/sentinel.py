@@ -64,6 +64,19 @@ class SentinelManagedConnection(Connection):
                 raise ConnectionError('The previous master is now a slave')
             raise
 
+    def read_responses(self, count):
+        responses = super(SentinelManagedConnection, self).read_responses(
+            count)
+        if self.connection_pool.is_master:
+            for response in responses:
+                if isinstance(response, ReadOnlyError):
+                    # the replies of a pipeline sent to a demoted master are
+                    # handled like those of a single command above
+                    self.disconnect()
+                    raise ConnectionError(
+                        'The previous master is now a slave')
+        return responses
+
 
 class SentinelConnectionPool(ConnectionPool):
     """
@@ -0,0 +1,177 @@
+import json
+import struct
+
+from redis._compat import b, basestring, bytes, iteritems, long, unicode
+from redis.exceptions import DataError
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+# serialized values start with MAGIC followed by their serializer's tag
+MAGIC = b('\x00\x1fRS')
+HEADER_LENGTH = len(MAGIC) + 1
+
+# the types whose values are sent as they are, bool included
+SCALAR_TYPES = (bytes, unicode, basestring, int, long, float)
+
+
+class Serializer(object):
+    "Converts values of some type to bytes and back"
+    # a single byte naming the serializer in the header of its values
+    tag = None
+
+    def dumps(self, value):
+        raise NotImplementedError
+
+    def loads(self, data):
+        raise NotImplementedError
+
+
+class PickleSerializer(Serializer):
+    """
+    Serializes values with pickle. Only use it with servers that are
+    trusted, as unpickling a reply can run arbitrary code.
+    """
+    tag = b('p')
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def dumps(self, value):
+        return pickle.dumps(value, self.protocol)
+
+    def loads(self, data):
+        return pickle.loads(data)
+
+
+class JSONSerializer(Serializer):
+    "Serializes values as compact, UTF-8 encoded JSON"
+    tag = b('j')
+
+    def __init__(self, **dumps_kwargs):
+        dumps_kwargs.setdefault('separators', (',', ':'))
+        self.dumps_kwargs = dumps_kwargs
+
+    def dumps(self, value):
+        return json.dumps(value, **self.dumps_kwargs).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data.decode('utf-8'))
+
+
+class StructSerializer(Serializer):
+    """
+    Packs numbers, or tuples of them, with a struct format such as '>d' or
+    '>3q'. Values of a single field are loaded as a number, and values of
+    several fields as a tuple.
+    """
+    tag = b('s')
+
+    def __init__(self, format='>d'):
+        self.struct = struct.Struct(format)
+        self.single = len(self.struct.unpack(b('\x00') * self.struct.size)) \
+            == 1
+
+    def dumps(self, value):
+        try:
+            if isinstance(value, tuple):
+                return self.struct.pack(*value)
+            return self.struct.pack(value)
+        except struct.error:
+            raise DataError("Can't pack %r as %r" % (value,
+                                                     self.struct.format))
+
+    def loads(self, data):
+        value = self.struct.unpack(data)
+        if self.single:
+            return value[0]
+        return value
+
+
+class SerializerRegistry(object):
+    """
+    Serializes command arguments according to their type, and loads the
+    values they're read back as::
+
+        >>> serializers = SerializerRegistry({dict: JSONSerializer(),
+        ...                                   list: JSONSerializer()})
+        >>> r = StrictRedis(serializers=serializers)
+        >>> r.set('user:1', {'name': 'Bob', 'roles': ['admin']})
+        >>> r.get('user:1')
+        {'name': 'Bob', 'roles': ['admin']}
+
+    Serialized values are marked with a short header naming their
+    serializer, so replies are only loaded if they were stored by one.
+    Types are matched by the class of each argument, or failing that its
+    closest registered base class. bytes, strings and numbers, which
+    commands also take as keys, counts and options, are always encoded as
+    they are and can't be registered.
+    """
+    def __init__(self, serializers=None):
+        self._serializers = {}
+        self._tags = {}
+        for type_, serializer in iteritems(serializers or {}):
+            self.register(type_, serializer)
+
+    def register(self, type_, serializer):
+        "Serialize values of ``type_`` with ``serializer``"
+        if issubclass(type_, SCALAR_TYPES):
+            raise DataError("%s values are sent as they are and can't be "
+                            "serialized" % type_.__name__)
+        if not isinstance(serializer.tag, bytes) or len(serializer.tag) != 1:
+            raise DataError("A serializer's tag must be a single byte")
+        # instances of the same class load each other's values alike
+        other = self._tags.get(serializer.tag)
+        if other is not None and type(other) is not type(serializer):
+            raise DataError("Another serializer already uses the tag %r" %
+                            serializer.tag)
+        self._serializers[type_] = serializer
+        self._tags[serializer.tag] = serializer
+
+    def encoder(self, type_):
+        """
+        Return a function serializing values of ``type_`` with their header,
+        or None if no serializer is registered for it
+        """
+        for cls in getattr(type_, '__mro__', (type_,)):
+            serializer = self._serializers.get(cls)
+            if serializer is not None:
+                header = MAGIC + serializer.tag
+                dumps = serializer.dumps
+                return lambda value: header + dumps(value)
+        return None
+
+    def encoders(self):
+        "Return a dict mapping each registered type to its encoder"
+        return dict([(type_, self.encoder(type_))
+                     for type_ in self._serializers])
+
+    def loads(self, data):
+        "Load ``data`` if it was serialized, returning it as is otherwise"
+        if data[:len(MAGIC)] != MAGIC:
+            return data
+        serializer = self._tags.get(data[len(MAGIC):HEADER_LENGTH])
+        if serializer is None:
+            return data
+        return serializer.loads(data[HEADER_LENGTH:])
+
+    def decode_response(self, response, encoding=None, errors='strict'):
+        """
+        Load the serialized values in ``response``, and decode its other
+        strings with ``encoding`` if it's set
+        """
+        if isinstance(response, bytes):
+            if response[:len(MAGIC)] == MAGIC:
+                value = self.loads(response)
+                if value is not response:
+                    return value
+            if encoding is not None:
+                return response.decode(encoding, errors)
+            return response
+        if isinstance(response, list):
+            return [self.decode_response(item, encoding, errors)
+                    for item in response]
+        return response
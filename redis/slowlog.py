@@ -0,0 +1,108 @@
+from collections import deque
+from itertools import count
+
+from redis._compat import b, bytes, long, unicode
+from redis.events import EventListener
+
+
+class ClientSlowLog(EventListener):
+    """
+    Keeps the most recent commands and pipelines whose end to end time on
+    the client, waiting for a connection included, reached ``threshold``
+    seconds::
+
+        >>> slowlog = ClientSlowLog(threshold=0.01, max_len=128,
+        ...                         time_phases=True)
+        >>> r = StrictRedis(event_listeners=[slowlog])
+        >>> r.get('foo')
+        >>> slowlog.get(1)
+        [{'id': 0, 'start_time': 1445431316.162, 'duration': 0.0132,
+          'command': 'GET', 'args': ('foo',), 'error': None,
+          'connection': 'Connection<host=localhost,port=6379,db=0>',
+          'phases': {'pool_wait': 0.0, 'encode': 0.000002, 'pack': ...}}]
+
+    Unlike SLOWLOG GET, the duration includes the time spent on the
+    client and the network. Each entry's phases hold how long waiting for
+    the pool took and, with ``time_phases``, how long encoding and packing
+    the command, sending it, waiting for the first byte of the reply,
+    reading and parsing it and running the response callback took.
+    Arguments are truncated to ``max_arg_length`` bytes or characters, and
+    only the first ``max_args`` are kept, as are the first ``max_args``
+    commands of a pipeline.
+
+    Timing the phases costs a few clock reads per command, which would be
+    paid by every command executed through the pools the slow log is added
+    to, fast or not, so it's off by default.
+    """
+    def __init__(self, threshold=0.01, max_len=128, max_arg_length=64,
+                 max_args=16, time_phases=False):
+        self.threshold = threshold
+        self.max_arg_length = max_arg_length
+        self.max_args = max_args
+        self.time_phases = time_phases
+        self._entries = deque(maxlen=max_len)
+        self._ids = count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, num=None):
+        "Return the ``num`` most recent entries, or all of them, newest first"
+        entries = list(self._entries)
+        entries.reverse()
+        if num is not None:
+            entries = entries[:num]
+        return entries
+
+    def reset(self):
+        "Remove all entries"
+        self._entries.clear()
+
+    def command_started(self, event):
+        if self.time_phases:
+            event.time_phases()
+
+    def command_finished(self, event):
+        duration = event.pool_wait + event.duration
+        if duration < self.threshold:
+            return
+        if event.commands is not None:
+            args = [self._truncate_args(command)
+                    for command in event.commands[:self.max_args]]
+            if len(event.commands) > self.max_args:
+                args.append('... (%d more commands)' %
+                            (len(event.commands) - self.max_args))
+        else:
+            args = self._truncate_args(event.args[1:])
+        phases = {'pool_wait': event.pool_wait}
+        if event.timings is not None:
+            phases.update(event.timings.as_dict())
+        self._entries.append({
+            'id': next(self._ids),
+            'start_time': event.start_time - event.pool_wait,
+            'duration': duration,
+            'command': event.command_name,
+            'args': args,
+            'error': event.error,
+            'connection': repr(event.connection),
+            'phases': phases,
+        })
+
+    def _truncate_args(self, args):
+        max_args = self.max_args
+        truncated = tuple([self._truncate(arg) for arg in args[:max_args]])
+        if len(args) > max_args:
+            truncated += ('... (%d more arguments)' % (len(args) - max_args),)
+        return truncated
+
+    def _truncate(self, arg):
+        if isinstance(arg, (int, long, float)):
+            return arg
+        if not isinstance(arg, (bytes, unicode)):
+            arg = repr(arg)
+        if len(arg) <= self.max_arg_length:
+            return arg
+        more = len(arg) - self.max_arg_length
+        if isinstance(arg, bytes):
+            return arg[:self.max_arg_length] + b('... (%d more bytes)' % more)
+        return arg[:self.max_arg_length] + '... (%d more characters)' % more
@@ -1,11 +1,17 @@
 import pytest
 import redis
+import sys
 
 from distutils.version import StrictVersion
 
 
 _REDIS_VERSIONS = {}
 
+# the asyncio client uses syntax that's only available in Python 3.6+
+collect_ignore = []
+if sys.version_info < (3, 6):
+    collect_ignore.append('test_asyncio.py')
+
 
 def get_version(**kwargs):
     params = {'host': 'localhost', 'port': 6379, 'db': 9}
@@ -31,6 +37,14 @@ def _get_client(cls, request=None, **kwargs):
     return client
 
 
+def _get_listening_client(request, listener):
+    "A StrictRedis client whose connection pool tells ``listener`` its events"
+    client = _get_client(redis.StrictRedis, request)
+    # added after the FLUSHDB issued by _get_client, so it isn't seen
+    client.connection_pool.add_listener(listener)
+    return client
+
+
 def skip_if_server_version_lt(min_version):
     check = StrictVersion(get_version()) < StrictVersion(min_version)
     return pytest.mark.skipif(check, reason="")
@@ -0,0 +1,182 @@
+from __future__ import with_statement
+import asyncio
+import pytest
+import redis
+
+from redis._compat import b
+from redis.asyncio import AsyncStrictRedis, AsyncConnectionPool
+from redis.connection import PythonParser
+
+
+loop = asyncio.new_event_loop()
+
+
+def run(coroutine):
+    return loop.run_until_complete(coroutine)
+
+
+@pytest.fixture()
+def ar(request):
+    client = AsyncStrictRedis(host='localhost', port=6379, db=9)
+    run(client.flushdb())
+
+    def teardown():
+        run(client.flushdb())
+        client.connection_pool.disconnect()
+    request.addfinalizer(teardown)
+    return client
+
+
+class TestAsyncStrictRedis(object):
+    def test_commands_return_awaitables(self, ar):
+        assert run(ar.set('a', 'foo'))
+        assert run(ar.get('a')) == b('foo')
+
+    def test_response_callbacks(self, ar):
+        run(ar.hset('h', 'f', 'v'))
+        assert run(ar.hgetall('h')) == {b('f'): b('v')}
+        assert run(ar.ping()) is True
+
+    def test_response_error(self, ar):
+        run(ar.set('a', 'foo'))
+        with pytest.raises(redis.ResponseError):
+            run(ar.hgetall('a'))
+        assert run(ar.get('a')) == b('foo')
+
+    def test_large_value(self, ar):
+        value = b('x') * 1000000
+        run(ar.set('a', value))
+        assert run(ar.get('a')) == value
+
+    def test_python_parser(self):
+        client = AsyncStrictRedis(
+            connection_pool=AsyncConnectionPool(db=9,
+                                                parser_class=PythonParser))
+        run(client.rpush('a', 1, 2, 3))
+        try:
+            assert run(client.lrange('a', 0, -1)) == [b('1'), b('2'), b('3')]
+        finally:
+            run(client.delete('a'))
+            client.connection_pool.disconnect()
+
+    def test_concurrency_is_bounded(self):
+        client = AsyncStrictRedis(db=9, max_connections=3)
+
+        async def incr_many():
+            return await asyncio.gather(*[client.incr('c')
+                                          for i in range(50)])
+        try:
+            assert sorted(run(incr_many())) == list(range(1, 51))
+            assert client.connection_pool._created_connections == 3
+        finally:
+            run(client.delete('c'))
+            client.connection_pool.disconnect()
+
+    def test_from_url(self):
+        client = AsyncStrictRedis.from_url('redis://localhost:6379/9')
+        try:
+            assert run(client.ping()) is True
+            assert client.connection_pool.connection_kwargs['db'] == 9
+        finally:
+            client.connection_pool.disconnect()
+
+    def test_from_url_ssl_and_unix(self):
+        pool = AsyncConnectionPool.from_url('rediss://:pw@localhost/2')
+        assert pool.connection_kwargs == {
+            'host': 'localhost', 'port': 6379, 'password': 'pw', 'db': 2,
+            'ssl': True}
+        pool = AsyncConnectionPool.from_url('unix:///socket?db=3')
+        assert pool.connection_kwargs == {
+            'path': '/socket', 'password': None, 'db': 3}
+
+    def test_executors(self, ar):
+        run(ar.set('a', 'foo'))
+        assert run(ar.executors['GET']('a')) == b('foo')
+
+    @pytest.mark.parametrize('method', [
+        'lock', 'pubsub', 'register_script', 'get_into', 'get_to_file',
+        'set_from_file', 'keys_iter', 'lrange_iter', 'smembers_iter',
+        'hgetall_iter'])
+    def test_unsupported_methods_dont_exist(self, ar, method):
+        assert not hasattr(ar, method)
+        assert not hasattr(ar.pipeline(), method)
+        with pytest.raises(AttributeError):
+            getattr(ar, method)('a', 'b')
+
+    def test_item_access(self, ar):
+        with pytest.raises(AttributeError):
+            ar['a']
+        with pytest.raises(AttributeError):
+            ar['a'] = 'foo'
+        with pytest.raises(AttributeError):
+            del ar['a']
+        assert run(ar.get('a')) is None
+
+    def test_shutdown_is_awaited(self, ar, monkeypatch):
+        commands = []
+
+        async def execute_command(*args, **options):
+            commands.append(args)
+            raise redis.ConnectionError('closed')
+        monkeypatch.setattr(ar, 'execute_command', execute_command)
+        assert run(ar.shutdown()) is None
+        assert commands == [('SHUTDOWN',)]
+
+
+class TestAsyncPipeline(object):
+    def test_pipeline(self, ar):
+        pipe = ar.pipeline()
+        pipe.set('a', 1).incr('a').get('a')
+        assert run(pipe.execute()) == [True, 2, b('2')]
+
+    def test_pipeline_no_transaction_errors(self, ar):
+        run(ar.set('a', 'foo'))
+        pipe = ar.pipeline(transaction=False)
+        pipe.get('a').hgetall('a').get('a')
+        result = run(pipe.execute(raise_on_error=False))
+        assert result[0] == b('foo')
+        assert isinstance(result[1], redis.ResponseError)
+        assert result[2] == b('foo')
+
+    def test_watch_and_multi(self, ar):
+        run(ar.set('a', 1))
+
+        async def increment():
+            async with ar.pipeline() as pipe:
+                await pipe.watch('a')
+                value = int(await pipe.get('a'))
+                pipe.multi()
+                pipe.set('a', value + 1)
+                return await pipe.execute()
+        assert run(increment()) == [True]
+        assert run(ar.get('a')) == b('2')
+
+    def test_transaction(self, ar):
+        run(ar.set('a', 1))
+
+        async def increment(pipe):
+            value = int(await pipe.get('a'))
+            pipe.multi()
+            pipe.set('a', value + 1)
+            return value
+
+        assert run(ar.transaction(increment, 'a')) == [True]
+        assert run(ar.transaction(increment, 'a',
+                                  value_from_callable=True)) == 2
+        assert run(ar.get('a')) == b('3')
+
+    def test_transaction_retries_on_watch_error(self, ar):
+        run(ar.set('a', 1))
+        attempts = []
+
+        async def increment(pipe):
+            value = int(await pipe.get('a'))
+            attempts.append(value)
+            if len(attempts) == 1:
+                raise redis.WatchError('Watched variable changed.')
+            pipe.multi()
+            pipe.set('a', value + 1)
+
+        assert run(ar.transaction(increment, 'a')) == [True]
+        assert attempts == [1, 1]
+        assert run(ar.get('a')) == b('2')
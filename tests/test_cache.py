@@ -0,0 +1,345 @@
+from __future__ import with_statement
+import pytest
+import redis
+import socket
+import threading
+import time
+
+from redis._compat import b, iteritems
+from redis.cache import ClientCache
+
+
+def encode_reply(value):
+    if value is None:
+        return b('$-1\r\n')
+    if isinstance(value, int):
+        return b(':%d\r\n' % value)
+    if isinstance(value, list):
+        return b('*%d\r\n' % len(value)) + \
+            b('').join([encode_reply(item) for item in value])
+    if value in ('OK', 'PONG'):
+        return b('+%s\r\n' % value)
+    return b('$%d\r\n' % len(value)) + value + b('\r\n')
+
+
+class StandInClient(object):
+    def __init__(self, server, sock, client_id):
+        self.server = server
+        self.sock = sock
+        self.id = client_id
+        self.redirect = None
+        self.caching = False
+        self.buffer = b('')
+
+    def read_command(self):
+        while True:
+            command = self.parse_command()
+            if command is not None:
+                return command
+            data = self.sock.recv(65536)
+            if not data:
+                return None
+            self.buffer += data
+
+    def parse_command(self):
+        lines = self.buffer.split(b('\r\n'))
+        if len(lines) < 2:
+            return None
+        count = int(lines[0][1:])
+        if len(lines) < count * 2 + 2:
+            return None
+        args = lines[2:count * 2 + 1:2]
+        self.buffer = b('\r\n').join(lines[count * 2 + 1:])
+        return args
+
+
+class StandInServer(object):
+    """
+    Just enough of a Redis server to test client side caching, including
+    the invalidation messages sent for tracked keys
+    """
+    def __init__(self):
+        self.data = {}
+        self.clients = {}
+        # key name -> ids of the clients invalidations are redirected to
+        self.tracked = {}
+        self.commands = []
+        self.lock = threading.Lock()
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+        thread = threading.Thread(target=self.accept)
+        thread.daemon = True
+        thread.start()
+
+    def accept(self):
+        while True:
+            try:
+                sock, address = self.listener.accept()
+            except socket.error:
+                return
+            with self.lock:
+                client = StandInClient(self, sock, len(self.clients) + 1)
+                self.clients[client.id] = client
+            thread = threading.Thread(target=self.serve, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        self.listener.close()
+        for client in self.clients.values():
+            client.sock.close()
+
+    def serve(self, client):
+        while True:
+            try:
+                args = client.read_command()
+            except socket.error:
+                return
+            if args is None:
+                return
+            with self.lock:
+                self.commands.append(args)
+                reply = self.handle(client, args[0].upper(), args[1:])
+            client.sock.sendall(reply)
+
+    def track(self, client, *names):
+        if client.caching and client.redirect:
+            for name in names:
+                self.tracked.setdefault(name, set()).add(client.redirect)
+        client.caching = False
+
+    def invalidate(self, name):
+        for client_id in self.tracked.pop(name, ()):
+            message = [b('message'), b('__redis__:invalidate'), [name]]
+            self.clients[client_id].sock.sendall(encode_reply(message))
+
+    def handle(self, client, command, args):
+        if command == b('CLIENT'):
+            subcommand = args[0].upper()
+            if subcommand == b('ID'):
+                return encode_reply(client.id)
+            if subcommand == b('TRACKING'):
+                client.redirect = int(args[3])
+            if subcommand == b('CACHING'):
+                client.caching = True
+            return encode_reply('OK')
+        if command == b('SUBSCRIBE'):
+            return encode_reply([b('subscribe'), args[0], 1])
+        if command == b('PING'):
+            return encode_reply('PONG')
+        if command == b('GET'):
+            self.track(client, args[0])
+            return encode_reply(self.data.get(args[0]))
+        if command == b('MGET'):
+            self.track(client, *args)
+            return encode_reply([self.data.get(name) for name in args])
+        if command == b('HGET'):
+            self.track(client, args[0])
+            return encode_reply(self.data.get(args[0], {}).get(args[1]))
+        if command == b('HGETALL'):
+            self.track(client, args[0])
+            reply = []
+            for field, value in iteritems(self.data.get(args[0], {})):
+                reply.extend((field, value))
+            return encode_reply(reply)
+        if command == b('SET'):
+            self.data[args[0]] = args[1]
+            self.invalidate(args[0])
+            return encode_reply('OK')
+        if command == b('HSET'):
+            self.data.setdefault(args[0], {})[args[1]] = args[2]
+            self.invalidate(args[0])
+            return encode_reply(1)
+        if command == b('FLUSHDB'):
+            self.data.clear()
+            redirects = set()
+            for client_ids in self.tracked.values():
+                redirects.update(client_ids)
+            self.tracked.clear()
+            message = encode_reply([b('message'), b('__redis__:invalidate'),
+                                    None])
+            for client_id in redirects:
+                self.clients[client_id].sock.sendall(message)
+            return encode_reply('OK')
+        return b('-ERR unknown command\r\n')
+
+    def reads(self):
+        "The number of cacheable commands that reached the server"
+        return len([args for args in self.commands
+                    if args[0] in (b('GET'), b('MGET'), b('HGET'),
+                                   b('HGETALL'))])
+
+
+def wait_for(condition, timeout=2):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture()
+def server(request):
+    server = StandInServer()
+    request.addfinalizer(server.close)
+    return server
+
+
+@pytest.fixture()
+def cache(server):
+    return ClientCache(max_size=3)
+
+
+@pytest.fixture()
+def r(server, cache):
+    return redis.StrictRedis(port=server.port, client_cache=cache)
+
+
+@pytest.fixture()
+def other(server):
+    return redis.StrictRedis(port=server.port)
+
+
+def invalidated(cache, count):
+    def condition():
+        cache.process_invalidations()
+        return cache.invalidations >= count
+    return condition
+
+
+class TestClientCache(object):
+    def test_get_is_cached(self, r, server, cache):
+        r.set('a', 'foo')
+        assert r.get('a') == b('foo')
+        assert r.get('a') == b('foo')
+        assert server.reads() == 1
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_missing_keys_are_cached(self, r, server):
+        assert r.get('a') is None
+        assert r.get('a') is None
+        assert server.reads() == 1
+
+    def test_invalidation(self, r, other, cache):
+        other.set('a', 'foo')
+        assert r.get('a') == b('foo')
+        other.set('a', 'bar')
+        wait_for(invalidated(cache, 1))
+        assert len(cache) == 0
+        assert r.get('a') == b('bar')
+
+    def test_hget_and_hgetall(self, r, other, server, cache):
+        other.hset('a', 'x', '1')
+        assert r.hget('a', 'x') == b('1')
+        assert r.hgetall('a') == {b('x'): b('1')}
+        assert r.hget('a', 'x') == b('1')
+        # callbacks are run for every hit, so callers get their own dict
+        r.hgetall('a')['y'] = 2
+        assert r.hgetall('a') == {b('x'): b('1')}
+        assert server.reads() == 2
+        other.hset('a', 'y', '2')
+        # both replies for the key are invalidated
+        wait_for(invalidated(cache, 2))
+        assert r.hgetall('a') == {b('x'): b('1'), b('y'): b('2')}
+
+    def test_mget_only_reads_missing_keys(self, r, other, server):
+        other.set('a', '1')
+        other.set('b', '2')
+        assert r.get('a') == b('1')
+        assert r.mget('a', 'b', 'c') == [b('1'), b('2'), None]
+        assert server.commands[-1] == [b('MGET'), b('b'), b('c')]
+        assert r.mget(['a', 'b', 'c']) == [b('1'), b('2'), None]
+        assert server.reads() == 2
+
+    def test_lru_eviction(self, r, cache):
+        for name in ('a', 'b', 'c'):
+            r.get(name)
+        r.get('a')
+        r.get('d')
+        assert cache.evictions == 1
+        # 'b' was the least recently used
+        assert len(cache) == 3
+        misses = cache.misses
+        r.get('b')
+        assert cache.misses == misses + 1
+        r.get('a')
+        assert cache.misses == misses + 1
+
+    def test_flush_clears_cache(self, r, other, cache):
+        r.get('a')
+        r.get('b')
+        other.flushdb()
+        wait_for(lambda: cache.process_invalidations() or len(cache) == 0)
+
+    def test_lost_connection_clears_cache(self, r, cache):
+        r.get('a')
+        cache._pool.disconnect()
+        r.get('b')
+        # 'a' was tracked by a connection that's gone, so it was flushed
+        assert len(cache) == 1
+
+    def test_pipelines_are_not_cached(self, r, server):
+        r.get('a')
+        r.pipeline(transaction=False).get('a').execute()
+        assert server.reads() == 2
+
+    def test_stats(self, r, cache):
+        r.get('a')
+        r.get('a')
+        assert cache.stats() == {
+            'size': 1,
+            'max_size': 3,
+            'hits': 1,
+            'misses': 1,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+    def test_bound_to_one_pool(self, cache, server):
+        redis.StrictRedis(port=server.port, client_cache=cache)
+        with pytest.raises(ValueError):
+            redis.StrictRedis(port=server.port, client_cache=cache)
+
+    def test_invalidated_while_reading(self, r, cache):
+        r.get('b')
+        # an invalidation processed while 'a' is being read means the value
+        # read may already be stale, so it isn't cached
+        names = [b('a')]
+        generation = cache._begin_read(names)
+        cache.invalidate('a')
+        assert cache._end_read(names, generation) == [False]
+        generation = cache._begin_read(names)
+        assert cache._end_read(names, generation) == [True]
+
+    def test_misses_are_reported_to_listeners(self, server, cache):
+        finished = []
+
+        class Listener(redis.EventListener):
+            def command_finished(self, event):
+                finished.append(event)
+
+        r = redis.StrictRedis(port=server.port, client_cache=cache,
+                              event_listeners=[Listener()])
+        r.get('a')
+        r.get('a')
+        r.mget('a', 'b')
+        assert [event.command_name for event in finished] == ['GET', 'MGET']
+        get, mget = finished
+        assert get.args == ('GET', 'a')
+        assert get.pool is r.connection_pool
+        assert get.bytes_received > 0
+        # only the keys that weren't cached are read
+        assert mget.args == ('MGET', 'b')
+        assert get.error is None and mget.error is None
+
+    def test_pool_options(self, server, cache):
+        pool = redis.BlockingConnectionPool(port=server.port)
+        r = redis.StrictRedis(connection_pool=pool, client_cache=cache)
+        r.set_response_callback('GET', lambda response, **options: options)
+        assert r.execute_command('GET', 'a', priority=1) == {}
+        # the cache's own pool was asked with the priority
+        histograms = cache._pool.wait_time_histograms()
+        assert sum([count for bound, count in histograms[1]]) == 1
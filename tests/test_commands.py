@@ -1,12 +1,14 @@
 from __future__ import with_statement
 import binascii
 import datetime
+import mmap
 import pytest
 import redis
+import tempfile
 import time
 
 from redis._compat import (unichr, u, b, ascii_letters, iteritems, iterkeys,
-                           itervalues)
+                           itervalues, BytesIO)
 from redis.client import parse_info
 from redis import exceptions
 
@@ -46,6 +48,90 @@ class TestResponseCallbacks(object):
         assert r['a'] == 'static'
 
 
+class TestCommandExecutors(object):
+    "Tests for the per-command executors"
+
+    def test_executors_are_created_once(self, r):
+        executor = r.executors['GET']
+        assert isinstance(executor, redis.client.CommandExecutor)
+        assert r.executors['GET'] is executor
+        r['a'] = 'foo'
+        assert executor('a') == b('foo')
+
+    def test_callback_is_applied(self, r):
+        assert r.executors['SET']('a', 'foo') is True
+
+    def test_options_are_passed_to_callback(self, r):
+        r.set_response_callback('GET', lambda x, **options: (x, options))
+        r['a'] = 'foo'
+        assert r.executors['GET']('a', flag=True) == (b('foo'),
+                                                      {'flag': True})
+
+    def test_set_response_callback_replaces_executor(self, r):
+        executor = r.executors['GET']
+        r.set_response_callback('GET', lambda x: 'static')
+        assert r.executors['GET'] is not executor
+        assert r.get('a') == 'static'
+
+    def test_callbacks_are_looked_up_on_each_call(self, r):
+        executor = r.executors['GET']
+        r['a'] = 'foo'
+        r.response_callbacks['GET'] = lambda x: 'static'
+        assert executor('a') == 'static'
+        del r.response_callbacks['GET']
+        assert executor('a') == b('foo')
+
+    def test_overridden_parse_response_uses_generic_path(self, r):
+        class ParsingRedis(redis.StrictRedis):
+            def parse_response(self, connection, command_name, **options):
+                return ('parsed', connection.read_response())
+
+        client = ParsingRedis(connection_pool=r.connection_pool)
+        assert not isinstance(client.executors['GET'],
+                              redis.client.CommandExecutor)
+        assert client.get('a') == ('parsed', None)
+
+    def test_pipelines_use_generic_path(self, r):
+        pipe = r.pipeline()
+        assert not isinstance(pipe.executors['GET'],
+                              redis.client.CommandExecutor)
+        pipe.set('a', 'foo').get('a')
+        assert pipe.execute() == [True, b('foo')]
+
+    def test_client_cache_set_after_first_use(self, r):
+        class StubCache(object):
+            COMMANDS = set(['GET'])
+
+            def execute_command(self, client, *args, **options):
+                return 'cached'
+
+        executor = r.executors['GET']
+        r.client_cache = StubCache()
+        assert executor('a') == 'cached'
+        assert r.get('a') == 'cached'
+
+    def test_reconnects_after_connection_error(self, r):
+        r['a'] = 'foo'
+        connection = r.connection_pool.get_connection('GET')
+        connection.disconnect()
+        connection._sock = FailingSocket()
+        r.connection_pool.release(connection)
+        assert r.get('a') == b('foo')
+
+
+class FailingSocket(object):
+    "A socket whose connection has been lost"
+    def sendall(self, data):
+        raise redis.ConnectionError("Connection lost")
+    send = sendmsg = sendall
+
+    def close(self):
+        pass
+
+    def shutdown(self, how):
+        pass
+
+
 class TestRedisCommands(object):
 
     def test_command_on_invalid_key_type(self, r):
@@ -333,6 +419,63 @@ class TestRedisCommands(object):
         assert r.get('integer') == b(str(integer))
         assert r.get('unicode_string').decode('utf-8') == unicode_string
 
+    def test_get_into(self, r):
+        value = b('x') * 100000
+        r['a'] = value
+        buffer = bytearray(len(value) + 10)
+        assert r.get_into('a', buffer) == len(value)
+        assert buffer[:len(value)] == value
+        assert r.get_into('b', buffer) is None
+        with pytest.raises(exceptions.DataError):
+            r.get_into('a', bytearray(10))
+        # the connection is still usable afterwards
+        assert r.get('a') == value
+
+    def test_get_to_file(self, r):
+        value = b('x') * 100000
+        r['a'] = value
+        fileobj = BytesIO()
+        assert r.get_to_file('a', fileobj) == len(value)
+        assert fileobj.getvalue() == value
+        assert r.get_to_file('b', fileobj) is None
+
+    def test_set_from_file(self, r):
+        value = b('x') * 100000
+        fileobj = BytesIO(b('abc') + value)
+        fileobj.seek(3)
+        assert r.set_from_file('a', fileobj)
+        assert r['a'] == value
+        fileobj.seek(0)
+        assert r.set_from_file('a', fileobj, length=3, px=10000)
+        assert r['a'] == b('abc')
+        assert 0 < r.pttl('a') <= 10000
+
+    def test_set_from_real_file(self, r):
+        value = b('x') * 100000
+        with tempfile.TemporaryFile() as fileobj:
+            fileobj.write(value)
+            fileobj.seek(0)
+            assert r.set_from_file('a', fileobj)
+        assert r['a'] == value
+
+    def test_set_from_mmap(self, r):
+        value = b('x') * 100000
+        buffer = mmap.mmap(-1, len(value))
+        buffer[:] = value
+        assert r.set_from_file('a', buffer)
+        assert r['a'] == value
+        assert not r.set_from_file('a', buffer, length=1, nx=True)
+
+    def test_set_from_short_file(self, r):
+        with pytest.raises(exceptions.DataError):
+            r.set_from_file('a', BytesIO(b('abc')), length=4)
+        assert r.get('a') is None
+
+    def test_get_into_wrong_type(self, r):
+        r.rpush('a', '1')
+        with pytest.raises(exceptions.ResponseError):
+            r.get_into('a', bytearray(10))
+
     def test_getitem_and_setitem(self, r):
         r['a'] = 'bar'
         assert r['a'] == b('bar')
@@ -397,6 +540,14 @@ class TestRedisCommands(object):
         assert set(r.keys(pattern='test_*')) == keys_with_underscores
         assert set(r.keys(pattern='test*')) == keys
 
+    def test_keys_iter(self, r):
+        assert list(r.keys_iter()) == []
+        r['test_a'] = 1
+        r['test_b'] = 1
+        r['c'] = 1
+        assert set(r.keys_iter(pattern='test_*')) == \
+            set([b('test_a'), b('test_b')])
+
     def test_mget(self, r):
         assert r.mget(['a', 'b']) == [None, None]
         r['a'] = '1'
@@ -663,6 +814,30 @@ class TestRedisCommands(object):
         assert r.lrange('a', 2, 10) == [b('3'), b('4'), b('5')]
         assert r.lrange('a', 0, -1) == [b('1'), b('2'), b('3'), b('4'), b('5')]
 
+    def test_lrange_iter(self, r):
+        r.rpush('a', *range(1000))
+        iterator = r.lrange_iter('a')
+        assert next(iterator) == b('0')
+        # the connection is held until the reply has been read in full
+        assert len(r.connection_pool._in_use_connections) == 1
+        assert list(iterator) == [b(str(i)) for i in range(1, 1000)]
+        assert len(r.connection_pool._in_use_connections) == 0
+        assert list(r.lrange_iter('a', 2, 3)) == [b('2'), b('3')]
+        assert list(r.lrange_iter('b')) == []
+
+    def test_lrange_iter_closed_early(self, r):
+        r.rpush('a', *range(1000))
+        iterator = r.lrange_iter('a')
+        assert next(iterator) == b('0')
+        iterator.close()
+        assert len(r.connection_pool._in_use_connections) == 0
+        assert r.lrange('a', 0, 1) == [b('0'), b('1')]
+
+    def test_lrange_iter_wrong_type(self, r):
+        r['a'] = 'foo'
+        with pytest.raises(exceptions.ResponseError):
+            list(r.lrange_iter('a'))
+
     def test_lrem(self, r):
         r.rpush('a', '1', '1', '1', '1')
         assert r.lrem('a', '1', 1) == 1
@@ -830,6 +1005,10 @@ class TestRedisCommands(object):
         r.sadd('a', '1', '2', '3')
         assert r.smembers('a') == set([b('1'), b('2'), b('3')])
 
+    def test_smembers_iter(self, r):
+        r.sadd('a', '1', '2', '3')
+        assert set(r.smembers_iter('a')) == set([b('1'), b('2'), b('3')])
+
     def test_smove(self, r):
         r.sadd('a', 'a1', 'a2')
         r.sadd('b', 'b1', 'b2')
@@ -1155,6 +1334,11 @@ class TestRedisCommands(object):
         r.hmset('a', h)
         assert r.hgetall('a') == h
 
+    def test_hgetall_iter(self, r):
+        h = {b('a1'): b('1'), b('a2'): b('2'), b('a3'): b('3')}
+        r.hmset('a', h)
+        assert dict(r.hgetall_iter('a')) == h
+
     def test_hincrby(self, r):
         assert r.hincrby('a', '1') == 1
         assert r.hincrby('a', '1', amount=2) == 3
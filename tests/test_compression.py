@@ -0,0 +1,183 @@
+from __future__ import with_statement
+import pytest
+import redis
+import time
+
+from redis._compat import b, unicode, BytesIO
+from redis.compression import CompressionCodec, MAGIC
+from .conftest import _get_client
+
+
+LARGE = b('{"key": "value", "list": [1, 2, 3]}') * 100
+
+
+@pytest.fixture()
+def codec():
+    return CompressionCodec(threshold=100)
+
+
+@pytest.fixture()
+def r(request, codec):
+    return _get_client(redis.StrictRedis, request, codec=codec)
+
+
+@pytest.fixture()
+def raw(request):
+    "A client without a codec, to see what's stored on the server"
+    return _get_client(redis.StrictRedis, request)
+
+
+def wait_for_message(pubsub, timeout=1):
+    end = time.time() + timeout
+    while time.time() < end:
+        message = pubsub.get_message()
+        if message is not None and message['type'] == 'message':
+            return message
+        time.sleep(0.01)
+    return None
+
+
+class TestCompressionCodec(object):
+    def test_large_values_are_compressed(self, r, raw, codec):
+        r.set('a', LARGE)
+        stored = raw.get('a')
+        assert stored.startswith(MAGIC)
+        assert len(stored) < len(LARGE)
+        assert r.get('a') == LARGE
+        assert codec.compressed == 1
+        assert codec.decompressed == 1
+
+    def test_small_values_are_not_compressed(self, r, raw, codec):
+        r.set('a', 'foo')
+        assert raw.get('a') == b('foo')
+        assert codec.compressed == 0
+
+    def test_incompressible_values_are_stored_as_is(self, r, raw, codec):
+        value = bytes(bytearray(range(256)))
+        r.set('a', value)
+        assert raw.get('a') == value
+        assert codec.incompressible == 1
+
+    def test_hashes_and_lists(self, r, raw):
+        r.hset('h', 'field', LARGE)
+        assert raw.hget('h', 'field').startswith(MAGIC)
+        assert r.hget('h', 'field') == LARGE
+        assert r.hgetall('h') == {b('field'): LARGE}
+        r.rpush('l', 'small', LARGE)
+        assert r.lrange('l', 0, -1) == [b('small'), LARGE]
+
+    def test_pipelines(self, r):
+        pipe = r.pipeline()
+        pipe.set('a', LARGE).set('b', 'small').mget('a', 'b')
+        assert pipe.execute() == [True, True, [LARGE, b('small')]]
+        pipe = r.pipeline(transaction=False)
+        assert pipe.get('a').get('b').execute() == [LARGE, b('small')]
+
+    def test_pubsub(self, r, raw):
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe('channel')
+        raw_pubsub = raw.pubsub(ignore_subscribe_messages=True)
+        raw_pubsub.subscribe('channel')
+        r.publish('channel', LARGE)
+        assert wait_for_message(pubsub)['data'] == LARGE
+        assert wait_for_message(raw_pubsub)['data'].startswith(MAGIC)
+
+    def test_decode_responses(self, request, codec):
+        r = _get_client(redis.StrictRedis, request, codec=codec,
+                        decode_responses=True)
+        value = unicode(LARGE.decode('utf-8'))
+        r.set('a', value)
+        r.set('b', 'small')
+        assert r.get('a') == value
+        assert r.mget('a', 'b') == [value, 'small']
+        assert r.set('c', 'd') is True
+
+    def test_prefixes(self, request, raw):
+        codec = CompressionCodec(threshold=100,
+                                 prefixes={'page:': 100, 'page:tiny:': None,
+                                           'blob:': 0})
+        r = _get_client(redis.StrictRedis, request, codec=codec)
+        r.set('page:index', LARGE)
+        r.set('page:tiny:index', LARGE)
+        r.set('other', LARGE)
+        r.set('blob:a', 'x' * 20)
+        assert raw.get('page:index').startswith(MAGIC)
+        assert raw.get('page:tiny:index') == LARGE
+        assert raw.get('other') == LARGE
+        assert raw.get('blob:a').startswith(MAGIC)
+
+    def test_prefix_list(self):
+        codec = CompressionCodec(threshold=10, prefixes=['a', 'b'])
+        assert codec.threshold_for(b('abc')) == 10
+        assert codec.threshold_for(b('c')) is None
+
+    def test_mset_is_compressed_per_key(self):
+        codec = CompressionCodec(threshold=10, prefixes=['page:'])
+        connection = redis.Connection()
+        args = codec.encode_command(connection, ('MSET', 'page:a', LARGE,
+                                                 'other', LARGE))
+        assert args[2].startswith(MAGIC)
+        assert args[4] == LARGE
+
+    def test_other_commands_are_untouched(self, codec):
+        connection = redis.Connection()
+        args = ('APPEND', 'a', LARGE)
+        assert codec.encode_command(connection, args) is args
+
+    def test_values_that_only_look_compressed(self, codec):
+        value = MAGIC + b('znot zlib data')
+        assert codec.decode_response(value) == value
+        assert codec.decompressed == 0
+
+    def test_lzma(self, request):
+        pytest.importorskip('lzma')
+        codec = CompressionCodec(method='lzma', threshold=100)
+        r = _get_client(redis.StrictRedis, request, codec=codec)
+        r.set('a', LARGE)
+        # a codec reads values compressed by another method
+        assert redis.StrictRedis(codec=CompressionCodec(), db=9).get('a') \
+            == LARGE
+
+    def test_unknown_method(self):
+        with pytest.raises(redis.RedisError):
+            CompressionCodec(method='snappy')
+
+    def test_stats(self, r, codec):
+        r.set('a', LARGE)
+        stats = codec.stats()
+        assert stats['bytes_in'] == len(LARGE)
+        assert stats['bytes_out'] < len(LARGE)
+        assert stats['ratio'] == float(stats['bytes_out']) / len(LARGE)
+        assert stats['compressed'] == 1
+        codec.reset_stats()
+        assert codec.ratio == 1.0
+
+    def test_get_into_is_refused(self, r):
+        r.set('a', LARGE)
+        with pytest.raises(redis.DataError):
+            r.get_into('a', bytearray(len(LARGE)))
+        assert r.get('a') == LARGE
+
+    def test_get_to_file_is_refused(self, r):
+        r.set('a', LARGE)
+        with pytest.raises(redis.DataError):
+            r.get_to_file('a', BytesIO())
+        assert r.get('a') == LARGE
+
+    def test_set_from_file_is_refused(self, r, raw):
+        with pytest.raises(redis.DataError):
+            r.set_from_file('a', BytesIO(LARGE))
+        assert raw.get('a') is None
+        assert r.set('a', LARGE)
+
+    def test_connections_refuse_to_stream(self, r):
+        connection = r.connection_pool.get_connection('GET')
+        try:
+            with pytest.raises(redis.DataError):
+                connection.send_command_from_file(('SET', 'a'), BytesIO(LARGE))
+            connection.send_command('GET', 'a')
+            with pytest.raises(redis.DataError):
+                connection.read_response_into(bytearray(10))
+        finally:
+            r.connection_pool.release(connection)
+        assert r.get('a') is None
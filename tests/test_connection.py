@@ -0,0 +1,746 @@
+from __future__ import with_statement
+import os
+import pytest
+import redis
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from redis._compat import b, BytesIO
+from redis.connection import (SocketBuffer, PythonParser, PythonReader,
+                              AdaptiveReadSize, SSL_SESSIONS_AVAILABLE,
+                              MIN_BUFFER_CUTOFF, MAX_BUFFER_CUTOFF,
+                              COMMAND_NAME_CACHE, FILE_CHUNK_SIZE,
+                              Resolver, file_length, interleave_families)
+from redis.exceptions import ConnectionError, DataError
+
+
+class FakeSocket(object):
+    "Serves ``data`` in chunks of at most ``chunk_size`` bytes"
+    def __init__(self, data, chunk_size=None):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.position = 0
+        self.recv_calls = 0
+
+    def recv_into(self, buffer, size=0):
+        self.recv_calls += 1
+        size = size or len(buffer)
+        if self.chunk_size:
+            size = min(size, self.chunk_size)
+        data = self.data[self.position:self.position + size]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def recv(self, size):
+        self.recv_calls += 1
+        if self.chunk_size:
+            size = min(size, self.chunk_size)
+        data = self.data[self.position:self.position + size]
+        self.position += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+def make_parser(data, chunk_size=None, socket_read_size=16):
+    sock = FakeSocket(data, chunk_size)
+    parser = PythonParser(socket_read_size=socket_read_size)
+    parser._attach(sock, None)
+    return parser
+
+
+class TestSocketBuffer(object):
+    def test_readline_across_chunks(self):
+        buf = SocketBuffer(FakeSocket(b('+hello world\r\n'), chunk_size=3), 4)
+        assert buf.readline() == b('+hello world')
+        assert buf.length == 0
+
+    def test_crlf_split_between_reads(self):
+        buf = SocketBuffer(FakeSocket(b(':1\r\n:2\r\n'), chunk_size=3), 3)
+        assert buf.readline() == b(':1')
+        assert buf.readline() == b(':2')
+
+    def test_large_bulk_grows_and_shrinks_buffer(self):
+        value = b('x') * 1000
+        sock = FakeSocket(b('$1000\r\n') + value + b('\r\n'))
+        buf = SocketBuffer(sock, 16)
+        assert buf.readline() == b('$1000')
+        assert buf.read(1000) == value
+        # the buffer was sized for the whole payload, so it only took one
+        # additional recv call, and is released once the reply is consumed
+        assert sock.recv_calls == 2
+        assert len(buf._buffer) == 16
+
+    def test_returns_bytes(self):
+        buf = SocketBuffer(FakeSocket(b('$3\r\nabc\r\n')), 16)
+        buf.readline()
+        assert type(buf.read(3)) is bytes
+
+    def test_closed_socket(self):
+        buf = SocketBuffer(FakeSocket(b('')), 16)
+        with pytest.raises(ConnectionError):
+            buf.readline()
+
+    def test_read_into_buffer(self):
+        value = b('x') * 1000
+        sock = FakeSocket(b('$1000\r\n') + value + b('\r\n:1\r\n'))
+        buf = SocketBuffer(sock, 16)
+        assert buf.readline() == b('$1000')
+        target = bytearray(1000)
+        buf.read_into(1000, target)
+        assert target == value
+        # the value was received into the target rather than the buffer
+        assert len(buf._buffer) == 16
+        assert buf.readline() == b(':1')
+
+    def test_read_into_file(self):
+        value = b('x') * 1000
+        buf = SocketBuffer(FakeSocket(b('$1000\r\n') + value + b('\r\n'),
+                                      chunk_size=7), 16)
+        buf.readline()
+        fileobj = BytesIO()
+        buf.read_into(1000, fileobj, to_file=True)
+        assert fileobj.getvalue() == value
+        assert buf.length == 0
+
+    def test_read_into_buffer_too_small(self):
+        buf = SocketBuffer(FakeSocket(b('$5\r\nhello\r\n')), 16)
+        buf.readline()
+        with pytest.raises(DataError):
+            buf.read_into(5, bytearray(4))
+
+
+class TestAdaptiveReadSize(object):
+    def test_grows_when_reads_fill_the_buffer(self):
+        read_size = AdaptiveReadSize(minimum=16, maximum=64)
+        assert read_size.record(16, 16) == 32
+        assert read_size.record(32, 32) == 64
+        assert read_size.record(64, 64) == 64
+
+    def test_shrinks_when_reads_are_small(self):
+        read_size = AdaptiveReadSize(minimum=16, maximum=64, window=4)
+        read_size.size = 64
+        for i in range(3):
+            assert read_size.record(16, 64) == 64
+        assert read_size.record(16, 64) == 32
+        # a quarter of 32 bytes is too little to shrink any further
+        for i in range(4):
+            read_size.record(10, 32)
+        assert read_size.size == 32
+
+    def test_never_shrinks_below_minimum(self):
+        read_size = AdaptiveReadSize(minimum=16, maximum=64, window=1)
+        assert read_size.record(1, 16) == 16
+
+    def test_socket_buffer(self):
+        read_size = AdaptiveReadSize(minimum=16, maximum=65536)
+        data = b('+') + b('x') * 1000 + b('\r\n')
+        sock = FakeSocket(data * 50)
+        buf = SocketBuffer(sock, read_size)
+        assert buf.readline() == data[:-2]
+        recv_calls = sock.recv_calls
+        assert buf.socket_read_size == read_size.size > 16
+        for i in range(49):
+            assert buf.readline() == data[:-2]
+        # later replies are received with fewer, larger reads
+        assert sock.recv_calls - recv_calls < 10
+
+    def test_parser(self):
+        parser = make_parser(b('$5\r\nhello\r\n:1\r\n'),
+                             socket_read_size='adaptive')
+        assert isinstance(parser._buffer.read_size, AdaptiveReadSize)
+        assert parser.read_response() == b('hello')
+        assert parser.read_response() == 1
+
+
+class TestPythonParser(object):
+    def test_nested_reply(self):
+        data = b('*3\r\n$3\r\nfoo\r\n*2\r\n:1\r\n$-1\r\n+OK\r\n')
+        parser = make_parser(data, chunk_size=5)
+        assert parser.read_response() == [b('foo'), [1, None], b('OK')]
+
+    def test_multiple_replies(self):
+        data = b('$5\r\nhello\r\n$5\r\nworld\r\n')
+        parser = make_parser(data, chunk_size=7)
+        assert parser.read_response() == b('hello')
+        assert parser.read_response() == b('world')
+
+    def test_read_response_into(self):
+        data = b('$5\r\nhello\r\n$-1\r\n-ERR oops\r\n+OK\r\n')
+        parser = make_parser(data, chunk_size=3)
+        target = bytearray(8)
+        assert parser.read_response_into(target) == 5
+        assert target[:5] == b('hello')
+        assert parser.read_response_into(target) is None
+        assert isinstance(parser.read_response_into(target),
+                          redis.ResponseError)
+        with pytest.raises(redis.InvalidResponse):
+            parser.read_response_into(target)
+
+    def test_read_responses(self):
+        data = b('+OK\r\n-ERR oops\r\n$5\r\nhello\r\n:1\r\n')
+        parser = make_parser(data, chunk_size=4)
+        responses = parser.read_responses(3)
+        assert responses[0] == b('OK')
+        assert isinstance(responses[1], redis.ResponseError)
+        assert responses[2] == b('hello')
+        assert parser.read_response() == 1
+
+    def test_large_bulk_read_in_one_call(self):
+        value = b('x') * 100000
+        parser = make_parser(b('$100000\r\n') + value + b('\r\n'))
+        assert parser.read_response() == value
+        # the header, then the rest of the value once its size was known
+        assert parser._sock.recv_calls == 2
+
+    def test_read_response_iter(self):
+        data = b('*3\r\n$3\r\nfoo\r\n*1\r\n:1\r\n$-1\r\n:2\r\n')
+        parser = make_parser(data, chunk_size=5)
+        iterator = parser.read_response_iter()
+        assert next(iterator) == b('foo')
+        # elements are only read off the socket as they're requested
+        assert parser._sock.position < len(data)
+        assert list(iterator) == [[1], None]
+        assert parser.read_response() == 2
+
+    def test_read_response_iter_error(self):
+        parser = make_parser(b('-ERR oops\r\n'))
+        assert isinstance(parser.read_response_iter(), redis.ResponseError)
+
+
+class PartialWriteSocket(object):
+    "Accepts at most ``max_bytes`` per sendmsg call"
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.received = []
+        self.calls = 0
+
+    def sendall(self, data):
+        self.received.append(bytes(data))
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        data = b('').join([bytes(buf) for buf in buffers])[:self.max_bytes]
+        self.received.append(data)
+        return len(data)
+
+
+class TestSendPackedCommand(object):
+    def get_connection(self, sock):
+        connection = redis.Connection()
+        connection._sock = sock
+        connection.use_sendmsg = True
+        return connection
+
+    def test_partial_writes(self):
+        sock = PartialWriteSocket(max_bytes=7)
+        connection = self.get_connection(sock)
+        command = connection.pack_command('SET', 'foo', 'x' * 20000)
+        connection.send_packed_command(command)
+        assert b('').join(sock.received) == b('').join(command)
+
+    def test_chunks_sent_in_one_call(self):
+        sock = PartialWriteSocket(max_bytes=10 ** 9)
+        connection = self.get_connection(sock)
+        command = connection.pack_commands([('SET', 'a', 'x' * 10000),
+                                            ('SET', 'b', 'y' * 10000)])
+        connection.send_packed_command(command)
+        assert sock.calls == 1
+        assert b('').join(sock.received) == b('').join(command)
+
+    def test_large_values_are_not_copied(self):
+        connection = redis.Connection()
+        value = b('x') * (connection._buffer_cutoff + 1)
+        command = connection.pack_commands([('SET', 'a', value),
+                                            ('GET', 'a')])
+        assert any(chunk is value for chunk in command)
+
+    def test_buffer_cutoff_follows_send_buffer(self):
+        connection = redis.Connection()
+        sock = socket.socket()
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+            connection._set_buffer_cutoff(sock)
+            send_buffer_size = sock.getsockopt(socket.SOL_SOCKET,
+                                               socket.SO_SNDBUF)
+        finally:
+            sock.close()
+        expected = max(MIN_BUFFER_CUTOFF,
+                       min(send_buffer_size // 2, MAX_BUFFER_CUTOFF))
+        assert connection._buffer_cutoff == expected
+
+
+def address(port, family=socket.AF_INET, host='127.0.0.1'):
+    "An address as returned by getaddrinfo"
+    return (family, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (host, port))
+
+
+class StaticResolver(object):
+    "Resolves every host to ``addresses``"
+    def __init__(self, addresses):
+        self.addresses = addresses
+        self.invalidations = 0
+
+    def resolve(self, host, port):
+        return self.addresses
+
+    def invalidate(self, host, port):
+        self.invalidations += 1
+
+
+@pytest.fixture()
+def listener(request):
+    "A socket listening on a local port"
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(8)
+    request.addfinalizer(sock.close)
+    return sock
+
+
+@pytest.fixture()
+def unresponsive(request):
+    """
+    A socket listening on a local port whose backlog is full, so new
+    connections to it hang
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(0)
+    port = sock.getsockname()[1]
+    backlog = []
+    for i in range(3):
+        client = socket.socket()
+        client.setblocking(0)
+        client.connect_ex(('127.0.0.1', port))
+        backlog.append(client)
+    time.sleep(0.05)
+
+    def close():
+        for client in backlog:
+            client.close()
+        sock.close()
+    request.addfinalizer(close)
+    return sock
+
+
+def closed_port():
+    "A local port nothing is listening on"
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestResolver(object):
+    def test_lookups_are_cached(self, monkeypatch):
+        lookups = []
+
+        def getaddrinfo(host, port, *args):
+            lookups.append((host, port))
+            return [address(port)]
+
+        monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+        resolver = Resolver(ttl=30)
+        assert resolver.resolve('redis', 6379) == [address(6379)]
+        assert resolver.resolve('redis', 6379) == [address(6379)]
+        assert resolver.resolve('redis', 6380) == [address(6380)]
+        assert lookups == [('redis', 6379), ('redis', 6380)]
+        # expired entries are looked up again
+        resolver._cache[('redis', 6379)] = (time.time() - 1, [])
+        resolver.resolve('redis', 6379)
+        resolver.invalidate('redis', 6380)
+        resolver.resolve('redis', 6380)
+        assert len(lookups) == 4
+
+    def test_slow_lookups_only_hold_up_their_host(self, monkeypatch):
+        lookups = []
+        release = threading.Event()
+
+        def getaddrinfo(host, port, *args):
+            lookups.append(host)
+            if host == 'slow':
+                release.wait(5)
+                if port == 1:
+                    raise socket.gaierror('failed')
+            return [address(port)]
+
+        monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+        resolver = Resolver(ttl=30)
+        results = []
+
+        def resolve(port):
+            try:
+                results.append(resolver.resolve('slow', port))
+            except socket.gaierror:
+                results.append('failed')
+        threads = [threading.Thread(target=resolve, args=(port,))
+                   for port in (6379, 6379, 1, 1)]
+        for thread in threads:
+            thread.start()
+        while len(lookups) < 2:
+            time.sleep(0.01)
+        # the lookups of another host aren't held up
+        start = time.time()
+        assert resolver.resolve('fast', 6379) == [address(6379)]
+        assert time.time() - start < 1
+        # give the other threads time to wait for the lookups in progress
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert sorted(map(str, results)) == sorted(
+            ['failed', 'failed'] + [str([address(6379)])] * 2)
+        # each host:port was looked up once, and failures aren't cached
+        assert sorted(lookups) == ['fast', 'slow', 'slow']
+        assert resolver._lookups == {}
+        assert ('slow', 1) not in resolver._cache
+
+    def test_shared_by_a_pools_connections(self):
+        pool = redis.ConnectionPool(dns_cache_ttl=10)
+        c1 = pool.get_connection('_')
+        c2 = pool.get_connection('_')
+        assert isinstance(c1.resolver, Resolver)
+        assert c1.resolver is c2.resolver
+        assert c1.resolver.ttl == 10
+
+    def test_disabled_by_default(self):
+        assert redis.Connection().resolver is None
+        client = redis.StrictRedis(dns_cache_ttl=5)
+        assert client.connection_pool.connection_kwargs['resolver'].ttl == 5
+
+    def test_invalidated_when_no_address_is_reachable(self):
+        resolver = StaticResolver([address(closed_port())])
+        connection = redis.Connection(resolver=resolver)
+        with pytest.raises(redis.ConnectionError):
+            connection.connect()
+        assert resolver.invalidations == 1
+
+
+class TestHappyEyeballs(object):
+    def test_interleave_families(self):
+        v4 = [address(i) for i in range(3)]
+        v6 = [address(i, socket.AF_INET6, '::1') for i in range(2)]
+        assert interleave_families(v6 + v4) == \
+            [v6[0], v4[0], v6[1], v4[1], v4[2]]
+
+    def test_unresponsive_addresses_are_raced(self, listener, unresponsive):
+        resolver = StaticResolver([
+            address(unresponsive.getsockname()[1]),
+            address(listener.getsockname()[1]),
+        ])
+        connection = redis.Connection(resolver=resolver,
+                                      socket_connect_timeout=5,
+                                      happy_eyeballs_delay=0.05)
+        start = time.time()
+        sock = connection._connect()
+        try:
+            assert time.time() - start < 1
+            assert sock.getpeername() == listener.getsockname()
+            assert sock.gettimeout() is None
+        finally:
+            sock.close()
+
+    def test_failed_attempts_start_the_next_one(self, listener):
+        resolver = StaticResolver([
+            address(closed_port()),
+            address(listener.getsockname()[1]),
+        ])
+        connection = redis.Connection(resolver=resolver,
+                                      happy_eyeballs_delay=10)
+        start = time.time()
+        sock = connection._connect()
+        sock.close()
+        assert time.time() - start < 1
+
+    def test_all_attempts_fail(self, unresponsive):
+        resolver = StaticResolver([
+            address(closed_port()),
+            address(unresponsive.getsockname()[1]),
+        ])
+        connection = redis.Connection(resolver=resolver,
+                                      socket_connect_timeout=0.1,
+                                      happy_eyeballs_delay=0.01)
+        with pytest.raises(redis.ConnectionError) as excinfo:
+            connection.connect()
+        assert 'timed out' in str(excinfo.value)
+        assert resolver.invalidations == 1
+
+    def test_in_turn_by_default(self, listener, unresponsive):
+        resolver = StaticResolver([
+            address(unresponsive.getsockname()[1]),
+            address(listener.getsockname()[1]),
+        ])
+        connection = redis.Connection(resolver=resolver,
+                                      socket_connect_timeout=0.2)
+        start = time.time()
+        sock = connection._connect()
+        sock.close()
+        assert time.time() - start >= 0.2
+
+
+@pytest.fixture(scope='module')
+def certificate(request):
+    "A self signed certificate and its key, made with the openssl command"
+    directory = tempfile.mkdtemp()
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    try:
+        subprocess.check_call(
+            ['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt',
+             'ec_paramgen_curve:prime256v1', '-nodes', '-days', '1',
+             '-subj', '/CN=localhost', '-keyout', keyfile, '-out', certfile],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except (OSError, subprocess.CalledProcessError):
+        shutil.rmtree(directory)
+        pytest.skip("openssl is needed to make a certificate")
+    request.addfinalizer(lambda: shutil.rmtree(directory))
+    return certfile, keyfile
+
+
+@pytest.fixture()
+def tls_server(request, certificate):
+    "A TLS server answering +PONG to everything it receives"
+    import ssl
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*certificate)
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+
+    def serve(sock):
+        try:
+            sock = context.wrap_socket(sock, server_side=True)
+            while sock.recv(65536):
+                sock.sendall(b('+PONG\r\n'))
+        except (socket.error, ssl.SSLError):
+            pass
+        finally:
+            sock.close()
+
+    def accept():
+        while True:
+            try:
+                sock = listener.accept()[0]
+            except socket.error:
+                return
+            thread = threading.Thread(target=serve, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    thread = threading.Thread(target=accept)
+    thread.daemon = True
+    thread.start()
+    request.addfinalizer(listener.close)
+    return listener.getsockname()[1]
+
+
+@pytest.mark.skipif(not SSL_SESSIONS_AVAILABLE,
+                    reason="TLS session resumption not supported")
+class TestSSLConnection(object):
+    def get_pool(self, port, **kwargs):
+        return redis.ConnectionPool(connection_class=redis.SSLConnection,
+                                    port=port, **kwargs)
+
+    def ping(self, connection):
+        connection.send_command('PING')
+        assert connection.read_response() == b('PONG')
+
+    def test_pool_shares_context_and_sessions(self):
+        pool = self.get_pool(6379)
+        c1 = pool.get_connection('_')
+        c2 = pool.get_connection('_')
+        assert c1.ssl_context is c2.ssl_context
+        assert c1.ssl_session_cache is c2.ssl_session_cache
+
+    def test_sessions_are_resumed(self, tls_server):
+        pool = self.get_pool(tls_server)
+        c1 = pool.get_connection('_')
+        c1.connect()
+        assert not c1._sock.session_reused
+        self.ping(c1)
+        c1.disconnect()
+        c1.connect()
+        assert c1._sock.session_reused
+        self.ping(c1)
+        # other connections resume it too
+        c2 = pool.get_connection('_')
+        c2.connect()
+        assert c2._sock.session_reused
+        cache = c1.ssl_session_cache
+        assert (cache.full, cache.resumed) == (1, 2)
+
+    def test_resumption_can_be_turned_off(self, tls_server):
+        pool = self.get_pool(tls_server, ssl_session_cache=False)
+        connection = pool.get_connection('_')
+        assert connection.ssl_session_cache is None
+        connection.connect()
+        self.ping(connection)
+        connection.disconnect()
+        connection.connect()
+        assert not connection._sock.session_reused
+
+    def test_certificate_is_verified(self, tls_server, certificate):
+        connection = redis.SSLConnection(port=tls_server,
+                                         ssl_cert_reqs='required',
+                                         ssl_ca_certs=certificate[0])
+        connection.connect()
+        self.ping(connection)
+        connection.disconnect()
+        connection = redis.SSLConnection(port=tls_server,
+                                         ssl_cert_reqs='required')
+        with pytest.raises(redis.ConnectionError):
+            connection.connect()
+
+
+class TestSendCommandFromFile(object):
+    def get_connection(self, sock):
+        connection = redis.Connection()
+        connection._sock = sock
+        connection.use_sendmsg = False
+        return connection
+
+    def test_value_is_streamed(self):
+        sock = PartialWriteSocket(max_bytes=10 ** 9)
+        connection = self.get_connection(sock)
+        value = b('x') * (FILE_CHUNK_SIZE * 2 + 1)
+        connection.send_command_from_file(('SET', 'foo'), BytesIO(value),
+                                          trailing_args=('EX', 10))
+        assert b('').join(sock.received) == \
+            b('').join(connection.pack_command('SET', 'foo', value, 'EX', 10))
+        # the value was read in chunks rather than all at once
+        assert max(len(data) for data in sock.received) == FILE_CHUNK_SIZE
+
+    def test_buffer(self):
+        sock = PartialWriteSocket(max_bytes=10 ** 9)
+        connection = self.get_connection(sock)
+        connection.send_command_from_file(('SET', 'foo'), bytearray(b('bar')))
+        assert b('').join(sock.received) == \
+            b('*3\r\n$3\r\nSET\r\n$3\r\nfoo\r\n$3\r\nbar\r\n')
+
+    def test_file_length(self):
+        fileobj = BytesIO(b('abcdef'))
+        fileobj.seek(2)
+        assert file_length(fileobj) == 4
+        assert fileobj.tell() == 2
+        assert file_length(bytearray(3)) == 3
+
+
+class TestPythonReader(object):
+    def test_gets_returns_false_until_complete(self):
+        reader = PythonReader()
+        reader.feed(b('*2\r\n$3\r\nfoo\r\n$3\r\nba'))
+        assert reader.gets() is False
+        reader.feed(b('r\r\n:1\r\n'))
+        assert reader.gets() == [b('foo'), b('bar')]
+        assert reader.gets() == 1
+        assert reader.gets() is False
+
+    def test_error_replies_are_returned(self):
+        reader = PythonReader()
+        reader.feed(b('-ERR oops\r\n'))
+        error = reader.gets()
+        assert isinstance(error, redis.ResponseError)
+        assert str(error) == 'ERR oops'
+
+    def test_encoding(self):
+        reader = PythonReader(encoding='utf-8')
+        reader.feed(b('+OK\r\n$2\r\nhi\r\n'))
+        assert reader.gets() == 'OK'
+        assert reader.gets() == 'hi'
+
+    def test_feed_offset_and_length(self):
+        reader = PythonReader()
+        data = bytearray(b('xx:42\r\nyy'))
+        reader.feed(data, 2, 5)
+        assert reader.gets() == 42
+
+    def test_deeply_nested_reply(self):
+        depth = 10000
+        reader = PythonReader()
+        reader.feed(b('*1\r\n') * depth + b(':1\r\n'))
+        response = reader.gets()
+        for i in range(depth):
+            assert len(response) == 1
+            response = response[0]
+        assert response == 1
+
+    def test_resumes_byte_by_byte(self):
+        data = b('*3\r\n$3\r\nfoo\r\n*2\r\n:1\r\n-ERR oops\r\n+OK\r\n')
+        reader = PythonReader()
+        for i in range(len(data) - 1):
+            reader.feed(data[i:i + 1])
+            assert reader.gets() is False
+        reader.feed(data[-1:])
+        response = reader.gets()
+        assert response[0] == b('foo')
+        assert response[1][0] == 1
+        assert isinstance(response[1][1], redis.ResponseError)
+        assert response[2] == b('OK')
+        assert reader.is_idle()
+
+    def test_batched_replies(self):
+        reader = PythonReader()
+        reader.feed(b('+OK\r\n') * 100 + b(':1\r\n*0\r\n*-1\r\n$-1\r\n'))
+        assert [reader.gets() for i in range(100)] == [b('OK')] * 100
+        assert reader.gets() == 1
+        assert reader.gets() == []
+        assert reader.gets() is None
+        assert reader.gets() is None
+        assert reader.gets() is False
+        assert not reader.has_data()
+
+    def test_needed_for_partial_bulk(self):
+        reader = PythonReader()
+        reader.feed(b('$10\r\nabc'))
+        assert reader.gets() is False
+        assert reader.needed == 9
+
+    def test_protocol_error(self):
+        reader = PythonReader()
+        reader.feed(b('?\r\n'))
+        with pytest.raises(redis.InvalidResponse):
+            reader.gets()
+
+    def test_parser_feed_mode(self):
+        parser = PythonParser(socket_read_size=16)
+        parser.on_connect(redis.Connection())
+        parser.feed(b('$3\r\nfoo'))
+        assert parser.gets() is False
+        parser.feed(b('\r\n'))
+        assert parser.gets() == b('foo')
+
+
+class TestPackCommand(object):
+    def test_pack_command(self):
+        connection = redis.Connection()
+        packed = b('').join(connection.pack_command('SET', 'foo', 1.5))
+        assert packed == b('*3\r\n$3\r\nSET\r\n$3\r\nfoo\r\n$3\r\n1.5\r\n')
+
+    def test_command_names_with_spaces_are_split(self):
+        connection = redis.Connection()
+        packed = b('').join(connection.pack_command('CONFIG GET', '*'))
+        assert packed == b('*3\r\n$6\r\nCONFIG\r\n$3\r\nGET\r\n$1\r\n*\r\n')
+
+    def test_command_names_are_cached(self):
+        connection = redis.Connection()
+        connection.pack_command('CLIENT GETNAME')
+        assert COMMAND_NAME_CACHE['CLIENT GETNAME'] == \
+            (2, b('$6\r\nCLIENT\r\n$7\r\nGETNAME\r\n'))
+
+    def test_large_argument_counts_and_lengths(self):
+        connection = redis.Connection()
+        args = ['k%d' % i for i in range(100)]
+        value = 'x' * 5000
+        packed = b('').join(connection.pack_command('MSET', value, *args))
+        expected = [b('*102\r\n$4\r\nMSET\r\n$5000\r\n'), b(value), b('\r\n')]
+        for arg in args:
+            expected.append(b('$%d\r\n%s\r\n' % (len(arg), arg)))
+        assert packed == b('').join(expected)
@@ -2,10 +2,13 @@ from __future__ import with_statement
 import os
 import pytest
 import redis
+import socket
+import sys
 import time
 import re
 
 from threading import Thread
+from redis._compat import b
 from redis.connection import ssl_available
 from .conftest import skip_if_server_version_lt
 
@@ -16,6 +19,13 @@ class DummyConnection(object):
     def __init__(self, **kwargs):
         self.kwargs = kwargs
         self.pid = os.getpid()
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
 
 
 class TestConnectionPool(object):
@@ -127,6 +137,144 @@ class TestBlockingConnectionPool(object):
         c2 = pool.get_connection('_')
         assert c1 == c2
 
+    def start_waiters(self, pool, order, *options):
+        """
+        Start a thread waiting for a connection with each of ``options``,
+        one after the other. Each one appends its index to ``order`` once
+        it gets a connection, and releases it.
+        """
+        threads = []
+        for index, kwargs in enumerate(options):
+            def target(index=index, kwargs=kwargs):
+                connection = pool.get_connection('_', **kwargs)
+                order.append(index)
+                pool.release(connection)
+            thread = Thread(target=target)
+            thread.start()
+            threads.append(thread)
+            end = time.time() + 2
+            while pool.waiters < index + 1:
+                assert time.time() < end
+                time.sleep(0.001)
+        return threads
+
+    def test_waiters_are_served_in_order(self):
+        pool = self.get_pool(max_connections=1, timeout=2)
+        c1 = pool.get_connection('_')
+        order = []
+        threads = self.start_waiters(pool, order, {}, {}, {})
+        assert pool.waiters == 3
+        pool.release(c1)
+        for thread in threads:
+            thread.join()
+        assert order == [0, 1, 2]
+        assert pool.waiters == 0
+
+    def test_higher_priority_waiters_go_first(self):
+        pool = self.get_pool(max_connections=1, timeout=2)
+        c1 = pool.get_connection('_')
+        order = []
+        threads = self.start_waiters(pool, order, {}, {'priority': 5}, {},
+                                     {'priority': 5})
+        pool.release(c1)
+        for thread in threads:
+            thread.join()
+        assert order == [1, 3, 0, 2]
+
+    def test_waiting_sets_the_threads_options(self):
+        pool = self.get_pool(max_connections=1, timeout=0.5)
+        pool.get_connection('_')
+        start = time.time()
+        with pool.waiting(deadline=start + 0.05):
+            with pytest.raises(redis.ConnectionError):
+                pool.get_connection('_')
+        assert time.time() - start < 0.5
+        assert pool._local.options is None
+
+    def test_waiters_past_their_deadline_are_dropped(self):
+        pool = self.get_pool(max_connections=1, timeout=2)
+        c1 = pool.get_connection('_')
+        errors = []
+
+        def target():
+            try:
+                pool.get_connection('_', deadline=time.time() + 0.05)
+            except redis.ConnectionError:
+                errors.append(sys.exc_info()[1])
+
+        thread = Thread(target=target)
+        thread.start()
+        thread.join()
+        assert len(errors) == 1
+        assert 'Deadline' in str(errors[0])
+        assert pool.dropped == 1
+        assert pool.timeouts == 0
+        # the connection goes to the next caller
+        pool.release(c1)
+        assert pool.get_connection('_') is c1
+
+    def test_expired_waiters_are_skipped(self):
+        pool = self.get_pool(max_connections=1, timeout=2)
+        c1 = pool.get_connection('_')
+        with pool.pool.mutex:
+            # a waiter whose deadline passed before it could give up
+            waiter = redis.connection.PoolWaiter(
+                0, time.time() - 1, redis.connection.threading.Condition(
+                    pool.pool.mutex))
+            pool._waiting.append((0, -1, waiter))
+        order = []
+        threads = self.start_waiters(pool, order, {})
+        pool.release(c1)
+        threads[0].join()
+        assert waiter.dropped and not waiter.handed
+        assert order == [0]
+
+    def test_timeouts_are_counted(self):
+        pool = self.get_pool(max_connections=1, timeout=0.01)
+        pool.get_connection('_')
+        with pytest.raises(redis.ConnectionError):
+            pool.get_connection('_')
+        assert pool.timeouts == 1
+        assert pool.dropped == 0
+
+    def test_wait_time_histograms(self):
+        pool = self.get_pool(max_connections=1, timeout=2)
+        c1 = pool.get_connection('_')
+        order = []
+        threads = self.start_waiters(pool, order, {'priority': 1})
+        time.sleep(0.02)
+        pool.release(c1)
+        threads[0].join()
+        histograms = pool.wait_time_histograms()
+        assert sorted(histograms) == [0, 1]
+        bounds = [bound for bound, count in histograms[0]]
+        assert bounds == list(redis.connection.WAIT_TIME_BUCKETS) + \
+            [float('inf')]
+        # the first checkout didn't wait, the second waited for 20ms or more
+        assert sum([count for bound, count in histograms[0]
+                    if bound <= 0.01]) == 1
+        waited = [bound for bound, count in histograms[1] if count]
+        assert len(waited) == 1 and waited[0] >= 0.025
+
+    def test_options_do_not_reach_callbacks(self):
+        pool = redis.BlockingConnectionPool(max_connections=2, db=9)
+        r = redis.StrictRedis(connection_pool=pool)
+        r.set_response_callback('GET', lambda response, **options: options)
+        r.set_response_callback('SET', lambda response, **options: options)
+        options = {'priority': 1, 'deadline': time.time() + 5}
+        assert r.executors['GET']('a', **options) == {}
+        assert r.execute_command('GET', 'a', flag=True, **options) == \
+            {'flag': True}
+        pipe = r.pipeline()
+        pipe.execute_command('SET', 'a', 'foo', **options)
+        assert pipe.execute() == [{}]
+        pool.add_listener(redis.EventListener())
+        assert r.execute_command('GET', 'a', **options) == {}
+        # the pool was given the priority, except by the pipeline
+        assert sum([count for bound, count in
+                    pool.wait_time_histograms()[1]]) == 3
+        r.delete('a')
+
     def test_repr_contains_db_info_tcp(self):
         pool = redis.ConnectionPool(host='localhost', port=6379, db=0)
         expected = 'ConnectionPool<Connection<host=localhost,port=6379,db=0>>'
@@ -142,6 +290,465 @@ class TestBlockingConnectionPool(object):
         assert repr(pool) == expected
 
 
+class TestStripedConnectionPool(object):
+    def get_pool(self, max_connections=None, stripes=4):
+        return redis.StripedConnectionPool(connection_class=DummyConnection,
+                                           max_connections=max_connections,
+                                           stripes=stripes)
+
+    def in_thread(self, func, *args):
+        "Call ``func`` in a new thread and return its result"
+        result = []
+        thread = Thread(target=lambda: result.append(func(*args)))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_multiple_connections(self):
+        pool = self.get_pool()
+        c1 = pool.get_connection('_')
+        c2 = pool.get_connection('_')
+        assert c1 != c2
+
+    def test_max_connections(self):
+        pool = self.get_pool(max_connections=2)
+        pool.get_connection('_')
+        pool.get_connection('_')
+        with pytest.raises(redis.ConnectionError):
+            pool.get_connection('_')
+
+    def test_threads_reuse_their_own_connections(self):
+        pool = self.get_pool()
+
+        def use_connection():
+            connection = pool.get_connection('_')
+            pool.release(connection)
+            return connection
+
+        c1 = pool.get_connection('_')
+        c2 = self.in_thread(use_connection)
+        pool.release(c1)
+        # c2 is idle too, but c1 was released by this thread
+        assert pool.get_connection('_') is c1
+        assert idle_connections(pool) == [c2]
+
+    def test_idle_connections_of_other_threads_are_used(self):
+        pool = self.get_pool(max_connections=2)
+        c1 = pool.get_connection('_')
+        pool.release(c1)
+        # the thread's stripe is empty, so it takes the other's connection
+        assert self.in_thread(pool.get_connection, '_') is c1
+        assert len(pool._connections) == 1
+
+    def test_stripes_are_shared_by_threads(self):
+        pool = self.get_pool(stripes=1)
+        c1 = pool.get_connection('_')
+        pool.release(c1)
+        assert self.in_thread(pool.get_connection, '_') is c1
+
+    def test_max_connections_with_many_threads(self):
+        pool = self.get_pool(max_connections=4)
+        in_use = set()
+        errors = []
+
+        def worker():
+            for i in range(200):
+                try:
+                    connection = pool.get_connection('_')
+                except redis.ConnectionError:
+                    continue
+                if connection in in_use:
+                    errors.append('checked out twice')
+                in_use.add(connection)
+                if pool._created_connections > 4:
+                    errors.append('too many connections')
+                in_use.remove(connection)
+                pool.release(connection)
+
+        threads = [Thread(target=worker) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+        assert len(idle_connections(pool)) == len(pool._connections) <= 4
+
+    def test_disconnect(self):
+        pool = self.get_pool()
+        c1 = pool.get_connection('_')
+        c2 = pool.get_connection('_')
+        c1.connect()
+        c2.connect()
+        pool.release(c1)
+        pool.disconnect()
+        assert not c1.connected
+        assert not c2.connected
+
+    def test_connections_from_before_a_reset_are_dropped(self):
+        pool = self.get_pool()
+        c1 = pool.get_connection('_')
+        pool.reset()
+        pool.release(c1)
+        assert not idle_connections(pool)
+
+    def test_invalid_stripes(self):
+        with pytest.raises(ValueError):
+            redis.StripedConnectionPool(stripes=0)
+
+
+class TestAutoPipelineConnectionPool(object):
+    def get_client(self, request):
+        pool = redis.AutoPipelineConnectionPool(host='localhost', port=6379,
+                                                db=9)
+        client = redis.StrictRedis(connection_pool=pool)
+        request.addfinalizer(pool.disconnect)
+        return client
+
+    def test_commands_share_a_connection(self):
+        pool = redis.AutoPipelineConnectionPool(
+            connection_class=DummyConnection)
+        c1 = pool.get_connection('GET')
+        c2 = pool.get_connection('SET')
+        assert isinstance(c1, redis.AutoPipelineConnection)
+        assert pool.get_auto_pipeline() is pool.get_auto_pipeline()
+        pool.release(c1)
+        pool.release(c2)
+        assert pool._created_connections == 1
+
+    def test_blocking_commands_get_a_dedicated_connection(self):
+        pool = redis.AutoPipelineConnectionPool(
+            connection_class=DummyConnection)
+        for command_name in ('BLPOP', 'MULTI', 'pubsub'):
+            connection = pool.get_connection(command_name)
+            assert isinstance(connection, DummyConnection)
+            pool.release(connection)
+
+    def test_concurrent_commands(self, request):
+        r = self.get_client(request)
+        errors = []
+
+        def target(i):
+            try:
+                for j in range(50):
+                    key = 'auto-%d-%d' % (i, j)
+                    r.set(key, j)
+                    assert r.get(key) == str(j).encode('latin-1')
+            except Exception:
+                errors.append(sys.exc_info()[1])
+
+        threads = [Thread(target=target, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert r.connection_pool._created_connections == 1
+
+    def test_response_errors_are_raised_to_the_caller(self, request):
+        r = self.get_client(request)
+        r.set('a', 'foo')
+        with pytest.raises(redis.ResponseError):
+            r.hgetall('a')
+        assert r.get('a') == b('foo')
+
+    def test_pipelines_use_a_dedicated_connection(self, request):
+        r = self.get_client(request)
+        pipe = r.pipeline()
+        pipe.set('a', 1).get('a')
+        assert pipe.execute() == [True, b('1')]
+        assert r.get('a') == b('1')
+
+    def test_recovers_from_a_dropped_connection(self, request):
+        r = self.get_client(request)
+        r.set('a', 1)
+        auto_pipeline = r.connection_pool.get_auto_pipeline()
+        auto_pipeline.connection._sock.shutdown(socket.SHUT_RDWR)
+        assert r.get('a') == b('1')
+        assert r.connection_pool.get_auto_pipeline() is not auto_pipeline
+
+    def test_replacing_a_broken_pipeline_frees_its_connection(self):
+        pool = redis.AutoPipelineConnectionPool(
+            connection_class=DummyConnection, max_connections=2)
+        for i in range(5):
+            auto_pipeline = pool.get_auto_pipeline()
+            auto_pipeline.fail(redis.ConnectionError('broken'))
+        assert pool.get_auto_pipeline() is not auto_pipeline
+        assert pool._created_connections == 1
+
+
+def idle_connections(pool):
+    if isinstance(pool, redis.BlockingConnectionPool):
+        return [c for c in pool.pool.queue if c is not None]
+    if isinstance(pool, redis.StripedConnectionPool):
+        return [c for stripe in pool._stripes for c in stripe]
+    return list(pool._available_connections)
+
+
+@pytest.fixture(params=[redis.ConnectionPool, redis.BlockingConnectionPool,
+                        redis.StripedConnectionPool])
+def pool_class(request):
+    return request.param
+
+
+class TestConnectionReaping(object):
+    def get_pool(self, pool_class, **kwargs):
+        kwargs.setdefault('reap_interval', 60)
+        return pool_class(connection_class=DummyConnection,
+                          max_connections=10, **kwargs)
+
+    def idle(self, pool, *connections):
+        "Make ``connections`` look like they've been idle for a minute"
+        for connection in connections:
+            pool._idle_since[connection] -= 60
+
+    def test_disabled_by_default(self, pool_class):
+        pool = pool_class(connection_class=DummyConnection)
+        pool.release(pool.get_connection('_'))
+        assert not pool._created_at
+        assert not pool._idle_since
+
+    def test_idle_connections_are_reaped(self, pool_class):
+        pool = self.get_pool(pool_class, max_idle_time=10)
+        connections = [pool.get_connection('_') for i in range(3)]
+        for connection in connections:
+            connection.connect()
+            pool.release(connection)
+        self.idle(pool, *connections[:2])
+        pool.reap()
+        assert idle_connections(pool) == [connections[2]]
+        assert not connections[0].connected
+        assert not connections[1].connected
+        assert connections[2].connected
+
+    def test_min_idle_connections_are_kept(self, pool_class):
+        pool = self.get_pool(pool_class, max_idle_time=10, min_idle=1)
+        connections = [pool.get_connection('_') for i in range(3)]
+        for connection in connections:
+            pool.release(connection)
+        self.idle(pool, *connections)
+        pool.reap()
+        # the most recently used connection is kept
+        assert idle_connections(pool) == [connections[2]]
+
+    def test_reaped_on_release(self, pool_class):
+        pool = self.get_pool(pool_class, max_idle_time=10, reap_interval=0)
+        c1 = pool.get_connection('_')
+        c2 = pool.get_connection('_')
+        pool.release(c1)
+        self.idle(pool, c1)
+        pool.release(c2)
+        assert idle_connections(pool) == [c2]
+
+    def test_reaped_slots_are_reused(self, pool_class):
+        pool = self.get_pool(pool_class, max_idle_time=10)
+        connections = [pool.get_connection('_') for i in range(10)]
+        for connection in connections:
+            pool.release(connection)
+        self.idle(pool, *connections)
+        pool.reap()
+        new_connections = [pool.get_connection('_') for i in range(10)]
+        assert not set(connections) & set(new_connections)
+
+    def test_connections_past_lifetime_are_not_reused(self, pool_class):
+        pool = self.get_pool(pool_class, max_connection_lifetime=10)
+        c1 = pool.get_connection('_')
+        c1.connect()
+        pool._created_at[c1] -= 60
+        pool.release(c1)
+        assert not c1.connected
+        assert pool.get_connection('_') is not c1
+
+    def test_lifetime_checked_on_checkout(self, pool_class):
+        pool = self.get_pool(pool_class, max_connection_lifetime=10)
+        c1 = pool.get_connection('_')
+        pool.release(c1)
+        pool._created_at[c1] -= 60
+        assert pool.get_connection('_') is not c1
+
+    def test_replenish(self, pool_class):
+        pool = self.get_pool(pool_class, min_idle=2)
+        pool.replenish()
+        connections = idle_connections(pool)
+        assert len(connections) == 2
+        assert all([c.connected for c in connections])
+        pool.replenish()
+        assert len(idle_connections(pool)) == 2
+
+    def test_reaper_thread(self, pool_class):
+        pool = self.get_pool(pool_class, min_idle=1, max_idle_time=10,
+                             reaper_thread=True, reap_interval=0.01)
+        end = time.time() + 2
+        while not idle_connections(pool):
+            assert time.time() < end
+            time.sleep(0.01)
+        c1 = pool.get_connection('_')
+        c2 = pool.get_connection('_')
+        pool.release(c1)
+        pool.release(c2)
+        assert len(idle_connections(pool)) >= 2
+        self.idle(pool, c1, c2)
+        # reaped down to min_idle
+        while len(idle_connections(pool)) > 1:
+            assert time.time() < end
+            time.sleep(0.01)
+
+
+class TestWarm(object):
+    def test_connections_are_opened(self, pool_class):
+        pool = pool_class(max_connections=10)
+        results = pool.warm(3, parallelism=2)
+        assert len(results) == 3
+        for result in results:
+            assert result['error'] is None
+            assert result['time'] >= 0
+        connections = idle_connections(pool)
+        assert set(connections) == \
+            set([result['connection'] for result in results])
+        assert all([c._sock is not None for c in connections])
+
+    def test_open_connections_are_not_reopened(self):
+        pool = redis.ConnectionPool()
+        assert len(pool.warm(2)) == 2
+        results = pool.warm(3)
+        assert len(results) == 1
+        assert len(idle_connections(pool)) == 3
+
+    def test_limited_by_max_connections(self):
+        pool = redis.ConnectionPool(max_connections=2)
+        in_use = pool.get_connection('_')
+        assert len(pool.warm(5)) == 1
+        pool.release(in_use)
+
+    def test_does_not_wait_for_busy_connections(self):
+        pool = redis.BlockingConnectionPool(max_connections=3, timeout=5)
+        in_use = pool.get_connection('_')
+        start = time.time()
+        assert len(pool.warm(5)) == 2
+        assert time.time() - start < 1
+        # only the checkout above waited
+        assert sum([count for bound, count in
+                    pool.wait_time_histograms()[0]]) == 1
+        pool.release(in_use)
+
+    def test_listeners_are_not_notified(self, pool_class):
+        events = []
+
+        class Listener(redis.EventListener):
+            def connected(self, connection, duration):
+                events.append('connected')
+
+        pool = pool_class(max_connections=10)
+        listener = Listener()
+        pool.add_listener(listener)
+        results = pool.warm(2)
+        assert len(results) == 2
+        assert events == []
+        # but they are about the connections opened later on
+        connection = results[0]['connection']
+        assert connection.listeners == [listener]
+        connection.disconnect()
+        connection.connect()
+        assert events == ['connected']
+
+    def test_errors_are_reported(self, pool_class):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        listener.close()
+        pool = pool_class(port=port)
+        results = pool.warm(2)
+        assert len(results) == 2
+        for result in results:
+            assert isinstance(result['error'], redis.ConnectionError)
+        # the connections are still returned to the pool
+        assert len(idle_connections(pool)) == 2
+
+    def test_unix_domain_sockets(self, request, tmpdir):
+        path = str(tmpdir.join('redis.sock'))
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(4)
+        request.addfinalizer(listener.close)
+        pool = redis.ConnectionPool(
+            connection_class=redis.UnixDomainSocketConnection, path=path)
+        results = pool.warm(2)
+        assert [result['error'] for result in results] == [None, None]
+
+
+class TestHealthChecks(object):
+    def get_pool(self, pool_class=redis.ConnectionPool, **kwargs):
+        return pool_class(health_check_interval=1, **kwargs)
+
+    def idle_connection(self, pool):
+        "Return a connected connection that's due a health check"
+        connection = pool.get_connection('_')
+        connection.connect()
+        pool.release(connection)
+        connection.next_health_check = time.time() - 1
+        return connection
+
+    def test_disabled_by_default(self):
+        pool = redis.ConnectionPool()
+        assert pool.health_check_interval == 0
+        assert pool.make_connection().health_check_interval == 0
+
+    def test_release_schedules_check(self):
+        pool = self.get_pool()
+        connection = pool.get_connection('_')
+        pool.release(connection)
+        assert time.time() < connection.next_health_check <= time.time() + 1
+
+    def test_healthy_connection_is_kept(self):
+        pool = self.get_pool()
+        connection = self.idle_connection(pool)
+        sock = connection._sock
+        assert pool.get_connection('_') is connection
+        assert connection._sock is sock
+        assert connection.next_health_check > time.time()
+
+    def test_closed_connection_is_replaced(self):
+        pool = self.get_pool()
+        connection = self.idle_connection(pool)
+        sock = connection._sock
+        # the socket now reads as closed, as it would after a load
+        # balancer dropped it
+        sock.shutdown(socket.SHUT_RDWR)
+        assert pool.get_connection('_') is connection
+        assert connection._sock is not sock
+        connection.send_command('PING')
+        assert connection.read_response() == b('PONG')
+
+    def test_half_closed_connection_is_replaced(self):
+        pool = self.get_pool()
+        connection = self.idle_connection(pool)
+        sock = connection._sock
+        sock.shutdown(socket.SHUT_WR)
+        assert pool.get_connection('_') is connection
+        assert connection._sock is not sock
+
+    def test_not_checked_before_interval(self):
+        pool = self.get_pool()
+        connection = pool.get_connection('_')
+        connection.connect()
+        pool.release(connection)
+        sock = connection._sock
+        sock.shutdown(socket.SHUT_RDWR)
+        assert pool.get_connection('_') is connection
+        assert connection._sock is sock
+
+    def test_blocking_pool(self):
+        pool = self.get_pool(redis.BlockingConnectionPool)
+        connection = self.idle_connection(pool)
+        sock = connection._sock
+        sock.shutdown(socket.SHUT_RDWR)
+        assert pool.get_connection('_') is connection
+        assert connection._sock is not sock
+
+    def test_client_option(self):
+        r = redis.StrictRedis(health_check_interval=30)
+        assert r.connection_pool.health_check_interval == 30
+
+
 class TestConnectionPoolURLParsing(object):
     def test_defaults(self):
         pool = redis.ConnectionPool.from_url('redis://localhost')
@@ -295,7 +902,11 @@ class TestSSLConnectionURLParsing(object):
     def test_defaults(self):
         pool = redis.ConnectionPool.from_url('rediss://localhost')
         assert pool.connection_class == redis.SSLConnection
-        assert pool.connection_kwargs == {
+        # the pool's connections share an SSLContext and TLS sessions
+        kwargs = dict(pool.connection_kwargs)
+        kwargs.pop('ssl_context', None)
+        kwargs.pop('ssl_session_cache', None)
+        assert kwargs == {
             'host': 'localhost',
             'port': 6379,
             'db': 0,
@@ -0,0 +1,235 @@
+from __future__ import with_statement
+import logging
+import pytest
+import redis
+
+from redis._compat import b, BytesIO
+from redis.connection import ConnectionError
+from redis.events import CommandEvent, EventListener, command_finished
+from .conftest import _get_client, _get_listening_client
+
+
+class RecordingListener(EventListener):
+    def __init__(self):
+        self.events = []
+
+    def command_started(self, event):
+        self.events.append(('started', event.command_name))
+
+    def command_finished(self, event):
+        self.events.append(('finished', event))
+
+    def command_retried(self, event, error):
+        self.events.append(('retried', event.command_name))
+
+    def connection_checked_out(self, pool, connection, wait_time):
+        self.events.append(('checked_out', wait_time))
+
+    def connected(self, connection, duration):
+        self.events.append(('connected', duration))
+
+    def disconnected(self, connection):
+        self.events.append(('disconnected', connection))
+
+    def names(self):
+        return [name for name, value in self.events]
+
+    def finished(self):
+        return [value for name, value in self.events if name == 'finished']
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture()
+def recorder():
+    return RecordingListener()
+
+
+@pytest.fixture()
+def lr(request, recorder):
+    return _get_listening_client(request, recorder)
+
+
+class TestCommandEvents(object):
+    def test_command(self, lr, recorder):
+        lr.set('a', 'foo')
+        assert recorder.names() == ['checked_out', 'started', 'finished']
+        event = recorder.finished()[0]
+        assert event.command_name == 'SET'
+        assert event.args == ('SET', 'a', 'foo')
+        assert event.duration >= 0
+        assert event.pool_wait >= 0
+        assert event.bytes_sent == len(b('*3\r\n$3\r\nSET\r\n$1\r\na\r\n'
+                                         '$3\r\nfoo\r\n'))
+        assert event.bytes_received == len(b('+OK\r\n'))
+        assert event.retries == 0
+        assert event.error is None
+
+    def test_reply_size(self, lr, recorder):
+        lr.set('a', 'foo')
+        lr.get('a')
+        event = recorder.finished()[-1]
+        assert event.command_name == 'GET'
+        assert event.bytes_received == len(b('$3\r\nfoo\r\n'))
+
+    def test_error(self, lr, recorder):
+        lr.set('a', 'foo')
+        with pytest.raises(redis.ResponseError):
+            lr.lpush('a', 'bar')
+        event = recorder.finished()[-1]
+        assert isinstance(event.error, redis.ResponseError)
+
+    def test_retry(self, lr, recorder):
+        lr.ping()
+        connection = lr.connection_pool._available_connections[0]
+        # close the socket under the connection, so sending fails
+        connection._sock.close()
+        recorder.events = []
+        assert lr.ping()
+        assert 'retried' in recorder.names()
+        assert recorder.finished()[0].retries == 1
+
+    def test_connect(self, recorder):
+        r = redis.StrictRedis(event_listeners=[recorder])
+        r.ping()
+        assert recorder.names() == ['checked_out', 'started', 'connected',
+                                    'finished']
+        assert recorder.events[2][1] >= 0
+
+    def test_disconnect(self, lr, recorder):
+        lr.ping()
+        lr.connection_pool.disconnect()
+        assert recorder.names()[-1] == 'disconnected'
+
+    def test_pipeline(self, lr, recorder):
+        pipe = lr.pipeline()
+        pipe.set('a', 'foo').get('a')
+        assert pipe.execute() == [True, b('foo')]
+        event = recorder.finished()[0]
+        assert event.command_name == 'MULTI'
+        assert event.commands == [('SET', 'a', 'foo'), ('GET', 'a')]
+        assert event.bytes_sent > 0
+
+        recorder.events = []
+        pipe = lr.pipeline(transaction=False)
+        pipe.get('a')
+        pipe.execute()
+        assert recorder.finished()[0].command_name == 'PIPELINE'
+
+    def test_listeners_can_be_added_and_removed(self, request, recorder):
+        r = _get_client(redis.StrictRedis, request)
+        r.get('a')
+        r.connection_pool.add_listener(recorder)
+        r.get('a')
+        assert [event.command_name for event in recorder.finished()] == \
+            ['GET']
+        r.connection_pool.remove_listener(recorder)
+        r.get('a')
+        assert len(recorder.finished()) == 1
+
+    def test_connection_errors(self, recorder):
+        pool = redis.ConnectionPool(port=1)
+        pool.add_listener(recorder)
+        r = redis.StrictRedis(connection_pool=pool)
+        with pytest.raises(ConnectionError):
+            r.ping()
+        event = recorder.finished()[0]
+        assert isinstance(event.error, ConnectionError)
+        assert 'connected' not in recorder.names()
+
+    def test_streamed_commands(self, lr, recorder):
+        assert lr.set_from_file('a', BytesIO(b('foo')))
+        assert lr.get_into('a', bytearray(3)) == 3
+        assert lr.get_to_file('a', BytesIO()) == 3
+        lr.rpush('b', 1, 2, 3)
+        assert list(lr.lrange_iter('b')) == [b('1'), b('2'), b('3')]
+        set_, get_into, get_to_file, rpush, lrange = recorder.finished()
+        assert set_.args == ('SET', 'a', '<3 bytes>')
+        assert set_.bytes_sent == len(b('*3\r\n$3\r\nSET\r\n$1\r\na\r\n'
+                                        '$3\r\nfoo\r\n'))
+        for event in (get_into, get_to_file):
+            assert event.args == ('GET', 'a')
+            assert event.bytes_received == len(b('$3\r\nfoo\r\n'))
+        assert lrange.args == ('LRANGE', 'b', 0, -1)
+        assert lrange.bytes_received == len(b('*3\r\n$1\r\n1\r\n'
+                                              '$1\r\n2\r\n$1\r\n3\r\n'))
+        for event in (set_, get_into, get_to_file, lrange):
+            assert event.error is None
+            assert event.duration >= 0
+        assert recorder.names().count('started') == 5
+
+    def test_streamed_command_errors(self, lr, recorder):
+        lr.set('a', 'foo')
+        with pytest.raises(redis.DataError):
+            lr.get_into('a', bytearray(1))
+        assert isinstance(recorder.finished()[-1].error, redis.DataError)
+        lr.rpush('b', 1, 2, 3)
+        # an iterator closed early finishes its command without an error
+        iterator = lr.lrange_iter('b')
+        assert next(iterator) == b('1')
+        assert recorder.names()[-1] == 'started'
+        iterator.close()
+        event = recorder.finished()[-1]
+        assert event.command_name == 'LRANGE'
+        assert event.error is None
+
+    def test_pool_errors(self, recorder):
+        pool = redis.BlockingConnectionPool(max_connections=1, timeout=0.01,
+                                            db=9)
+        pool.add_listener(recorder)
+        r = redis.StrictRedis(connection_pool=pool)
+        in_use = pool.get_connection('_')
+        with pytest.raises(ConnectionError):
+            r.get('a')
+        with pytest.raises(ConnectionError):
+            r.pipeline().get('a').execute()
+        assert recorder.names() == ['finished', 'finished']
+        get, multi = recorder.finished()
+        assert get.command_name == 'GET'
+        assert multi.command_name == 'MULTI'
+        for event in (get, multi):
+            assert isinstance(event.error, ConnectionError)
+            assert event.pool_wait >= 0.01
+            assert event.duration == 0
+            assert event.connection is None
+        pool.release(in_use)
+        # the pool wasn't given back a connection it never handed out
+        assert r.get('a') is None
+
+    def test_listener_errors_dont_fail_commands(self, request, lr, recorder):
+        class FailingListener(EventListener):
+            def command_started(self, event):
+                raise ValueError('started')
+
+            def command_finished(self, event):
+                raise ValueError('finished')
+
+            def connected(self, connection, duration):
+                raise ValueError('connected')
+        handler = RecordingHandler()
+        logger = logging.getLogger('redis.events')
+        logger.addHandler(handler)
+        request.addfinalizer(lambda: logger.removeHandler(handler))
+        lr.connection_pool.add_listener(FailingListener())
+        lr.connection_pool.disconnect()
+        assert lr.set('a', 'foo')
+        assert lr.pipeline().get('a').execute() == [b('foo')]
+        # the listeners added before the failing one are still called
+        assert len(recorder.finished()) == 2
+        messages = [record.getMessage() for record in handler.records]
+        assert len([m for m in messages if 'command_finished()' in m]) == 2
+        assert len([m for m in messages if 'connected()' in m]) == 1
+
+    def test_commands_that_never_started(self, recorder):
+        event = CommandEvent('GET', ('GET', 'a'))
+        command_finished([recorder], event, ConnectionError('failed'))
+        assert event.duration == 0
+        assert event.start_time is not None
+        assert recorder.finished() == [event]
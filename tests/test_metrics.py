@@ -0,0 +1,145 @@
+from __future__ import with_statement
+import gc
+import pytest
+import redis
+import threading
+import weakref
+
+from redis.metrics import (LatencyHistogram, MetricsCollector, bucket_bounds,
+                           bucket_index)
+from .conftest import _get_client, _get_listening_client
+
+
+@pytest.fixture()
+def collector():
+    return MetricsCollector()
+
+
+@pytest.fixture()
+def lr(request, collector):
+    return _get_listening_client(request, collector)
+
+
+def pool_snapshot(metrics, client):
+    "The snapshot of the metrics of ``client``'s pool"
+    return metrics.snapshot()[repr(client.connection_pool)]
+
+
+class TestLatencyHistogram(object):
+    def test_buckets_hold_their_values(self):
+        previous = 0
+        for value in range(0, 100000, 7):
+            index = bucket_index(value)
+            low, high = bucket_bounds(index)
+            assert low <= value <= high
+            assert index >= previous
+            previous = index
+
+    def test_relative_error(self):
+        for value in (100, 1000, 12345, 10 ** 6, 10 ** 9):
+            low, high = bucket_bounds(bucket_index(value))
+            assert float(high - low) / low < 0.07
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for i in range(1, 101):
+            histogram.record(i / 1000.0)
+        assert histogram.count == 100
+        assert abs(histogram.sum - 5.05) < 1e-9
+        assert 0.050 <= histogram.percentile(50) <= 0.050 * 1.07
+        assert 0.099 <= histogram.percentile(99) <= 0.099 * 1.07
+        assert 0.1 <= histogram.percentile(100) <= 0.1 * 1.07
+
+    def test_merge(self):
+        a = LatencyHistogram()
+        b = LatencyHistogram()
+        a.record(0.001)
+        b.record(0.001)
+        b.record(1)
+        a.merge(b)
+        assert a.count == 3
+        assert [count for bound, count in a.buckets()] == [2, 1]
+
+
+class TestMetricsCollector(object):
+    def test_commands(self, lr, collector):
+        lr.set('a', 'foo')
+        lr.get('a')
+        lr.get('a')
+        snapshot = pool_snapshot(collector, lr)
+        get = snapshot['commands']['GET']
+        assert get['latency']['count'] == 2
+        assert get['latency']['p50'] > 0
+        assert get['bytes_sent'] == 2 * len('*2\r\n$3\r\nGET\r\n$1\r\na\r\n')
+        assert get['bytes_received'] == 2 * len('$3\r\nfoo\r\n')
+        assert get['errors'] == 0
+        assert snapshot['commands']['SET']['latency']['count'] == 1
+        assert snapshot['pool_wait']['count'] == 3
+
+    def test_errors(self, lr, collector):
+        lr.set('a', 'foo')
+        with pytest.raises(redis.ResponseError):
+            lr.lpush('a', 'bar')
+        assert pool_snapshot(collector, lr)['commands']['LPUSH']['errors'] == 1
+
+    def test_pipelines(self, lr, collector):
+        lr.pipeline().set('a', 'foo').get('a').execute()
+        commands = pool_snapshot(collector, lr)['commands']
+        assert commands['MULTI']['latency']['count'] == 1
+
+    def test_threads_are_combined(self, lr, collector):
+        def run():
+            for i in range(10):
+                lr.get('a')
+        threads = [threading.Thread(target=run) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        get = pool_snapshot(collector, lr)['commands']['GET']
+        assert get['latency']['count'] == 40
+
+    def test_pools_are_named_after_their_connections(self, lr, collector):
+        lr.get('a')
+        assert list(collector.snapshot()) == [repr(lr.connection_pool)]
+
+    def test_reset(self, lr, collector):
+        lr.get('a')
+        collector.reset()
+        assert collector.snapshot() == {}
+
+    def test_pools_are_not_kept_alive(self, collector):
+        pool = redis.ConnectionPool(host='localhost', port=6379, db=9)
+        pool.add_listener(collector)
+        r = redis.StrictRedis(connection_pool=pool)
+        r.get('a')
+        assert list(collector.snapshot()) == [repr(pool)]
+        ref = weakref.ref(pool)
+        pool.disconnect()
+        del r, pool
+        gc.collect()
+        assert ref() is None
+        # and the metrics recorded for it are dropped
+        assert collector.snapshot() == {}
+        assert collector._pools == {}
+
+    def test_prometheus(self, request, collector):
+        client = _get_client(redis.StrictRedis, request)
+        collector.attach(client.connection_pool, 'test')
+        client.get('a')
+        client.get('a')
+        text = collector.prometheus()
+        lines = text.splitlines()
+        assert '# TYPE redis_command_duration_seconds histogram' in lines
+        assert 'redis_command_duration_seconds_bucket{pool="test",' \
+            'command="GET",le="+Inf"} 2' in lines
+        assert 'redis_command_duration_seconds_count{pool="test",' \
+            'command="GET"} 2' in lines
+        assert 'redis_command_errors_total{pool="test",command="GET"} 0' \
+            in lines
+        assert 'redis_pool_wait_seconds_count{pool="test"} 2' in lines
+        # buckets are cumulative
+        counts = [int(line.rsplit(' ', 1)[1]) for line in lines
+                  if line.startswith('redis_command_duration_seconds_bucket')]
+        assert counts == sorted(counts)
+        assert text.endswith('\n')
@@ -0,0 +1,74 @@
+from __future__ import with_statement
+import pytest
+
+from redis.profiler import PHASES, PhaseProfiler
+from .conftest import _get_listening_client
+
+
+@pytest.fixture()
+def profiler(request):
+    "A PhaseProfiler sampling every command, unless parametrized otherwise"
+    options = {'sample_every': 1}
+    options.update(getattr(request, 'param', {}))
+    return PhaseProfiler(**options)
+
+
+@pytest.fixture()
+def lr(request, profiler):
+    return _get_listening_client(request, profiler)
+
+
+def assert_phases_add_up(stats):
+    "Only first_byte overlaps other phases, which fit in the total"
+    total = stats['total']
+    for phase in PHASES:
+        assert 0 <= stats[phase]['mean'] <= total['mean'] + 1e-6
+        assert stats[phase]['max'] <= total['max']
+    assert stats['first_byte']['mean'] > 0
+    assert sum([stats[phase]['share'] for phase in PHASES
+                if phase not in ('first_byte', 'total')]) <= 1 + 1e-6
+    assert total['share'] == 1.0
+
+
+class TestPhaseProfiler(object):
+    def test_phases(self, lr, profiler):
+        lr.set('a', 'foo')
+        lr.get('a')
+        lr.get('a')
+        get = profiler.stats()['GET']
+        assert get['samples'] == 2
+        assert sorted(get) == sorted(PHASES + ('samples',))
+        assert get['total']['p50'] <= get['total']['p99'] <= \
+            get['total']['max']
+        assert_phases_add_up(get)
+
+    @pytest.mark.parametrize('profiler', [{'sample_every': 3}], indirect=True)
+    def test_sampling(self, lr, profiler):
+        for i in range(7):
+            lr.get('a')
+        assert profiler.stats()['GET']['samples'] == 3
+
+    def test_callbacks(self, lr, profiler):
+        lr.hgetall('b')
+        hgetall = profiler.stats()['HGETALL']
+        assert_phases_add_up(hgetall)
+        assert hgetall['callback']['mean'] > 0
+
+    def test_pipelines(self, lr, profiler):
+        lr.pipeline().set('a', 'foo').get('a').execute()
+        stats = profiler.stats()['MULTI']
+        assert stats['samples'] == 1
+        assert_phases_add_up(stats)
+        # pipelines are encoded as they're packed
+        assert stats['encode']['mean'] == 0
+
+    def test_sample_every_must_be_positive(self):
+        with pytest.raises(ValueError):
+            PhaseProfiler(sample_every=0)
+
+    def test_report(self, lr, profiler):
+        lr.get('a')
+        lines = profiler.report().splitlines()
+        assert lines[0].split()[:3] == ['command', 'samples', 'phase']
+        assert lines[1].split()[:3] == ['GET', '1', 'pool_wait']
+        assert len(lines) == 1 + len(PHASES)
@@ -171,3 +171,28 @@ def test_slave_round_robin(cluster, sentinel):
     assert next(rotator) == ('127.0.0.1', 6379)
     with pytest.raises(SlaveNotFoundError):
         next(rotator)
+
+
+def test_warm_master_pool(cluster, sentinel):
+    master = sentinel.master_for('mymaster', db=9)
+    results = master.connection_pool.warm(2, parallelism=2)
+    assert len(results) == 2
+    for result in results:
+        assert result['error'] is None
+        assert result['connection'].port == 6379
+
+
+def test_pipeline_sent_to_demoted_master(cluster, sentinel, monkeypatch):
+    def read_responses(self, count):
+        return [exceptions.ReadOnlyError('READONLY')] * count
+    monkeypatch.setattr(redis.connection.Connection, 'read_responses',
+                        read_responses)
+    master = sentinel.master_for('mymaster', db=9)
+    connection = master.connection_pool.get_connection('SET')
+    with pytest.raises(exceptions.ConnectionError):
+        connection.read_responses(2)
+
+    slave = sentinel.slave_for('mymaster', db=9)
+    connection = slave.connection_pool.get_connection('GET')
+    responses = connection.read_responses(2)
+    assert isinstance(responses[0], exceptions.ReadOnlyError)
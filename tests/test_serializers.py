@@ -0,0 +1,203 @@
+from __future__ import with_statement
+import pytest
+import redis
+
+from redis._compat import b, long, unicode, BytesIO
+from redis.compression import CompressionCodec
+from redis.connection import Connection, Token
+from redis.exceptions import DataError
+from redis.serializers import (JSONSerializer, MAGIC, PickleSerializer,
+                               SerializerRegistry, StructSerializer)
+from .conftest import _get_client
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __eq__(self, other):
+        return (self.x, self.y) == (other.x, other.y)
+
+
+class OrderedDict(dict):
+    pass
+
+
+class OrderedStr(str):
+    pass
+
+
+@pytest.fixture()
+def serializers():
+    return SerializerRegistry({
+        dict: JSONSerializer(),
+        list: JSONSerializer(),
+        Point: PickleSerializer(),
+    })
+
+
+@pytest.fixture()
+def r(request, serializers):
+    return _get_client(redis.StrictRedis, request, serializers=serializers)
+
+
+@pytest.fixture()
+def raw(request):
+    "A client without serializers, to see what's stored on the server"
+    return _get_client(redis.StrictRedis, request)
+
+
+class TestSerializerRegistry(object):
+    def test_json_roundtrip(self, r, raw):
+        value = {'roles': ['admin']}
+        r.set('a', value)
+        assert raw.get('a') == MAGIC + b('j{"roles":["admin"]}')
+        assert r.get('a') == value
+
+    def test_pickle_roundtrip(self, r):
+        r.set('a', Point(1, 2))
+        assert r.get('a') == Point(1, 2)
+
+    def test_struct_roundtrip(self, request):
+        serializers = SerializerRegistry({tuple: StructSerializer('>2d')})
+        r = _get_client(redis.StrictRedis, request, serializers=serializers)
+        r.set('a', (1.5, -2.0))
+        assert r.get('a') == (1.5, -2.0)
+
+    def test_struct_pack_error(self):
+        serializer = StructSerializer('>d')
+        with pytest.raises(DataError):
+            serializer.dumps('foo')
+
+    def test_subclasses_use_their_base_class_serializer(self, r):
+        r.set('a', OrderedDict(foo='bar'))
+        assert r.get('a') == {'foo': 'bar'}
+
+    def test_plain_values_are_untouched(self, r, raw):
+        r.set('a', 'foo')
+        r.set('b', 10)
+        assert raw.get('a') == b('foo')
+        assert r.get('a') == b('foo')
+        assert r.get('b') == b('10')
+
+    def test_values_without_a_known_tag_are_untouched(self, r, raw):
+        value = MAGIC + b('?foo')
+        raw.set('a', value)
+        assert r.get('a') == value
+
+    def test_decode_responses(self, request, serializers):
+        r = _get_client(redis.StrictRedis, request, decode_responses=True,
+                        serializers=serializers)
+        r.set('a', 'foo')
+        r.set('b', [1, 2])
+        assert r.get('a') == unicode('foo')
+        assert r.mget('a', 'b') == [unicode('foo'), [1, 2]]
+
+    def test_lists_and_pipelines(self, r):
+        r.rpush('a', {'x': 1}, 'foo')
+        assert r.lrange('a', 0, -1) == [{'x': 1}, b('foo')]
+        pipe = r.pipeline()
+        pipe.set('b', [1, 2]).get('b').mget('b', 'c')
+        assert pipe.execute() == [True, [1, 2], [[1, 2], None]]
+
+    def test_with_a_codec(self, request, serializers):
+        codec = CompressionCodec(threshold=10)
+        r = _get_client(redis.StrictRedis, request, codec=codec,
+                        serializers=serializers)
+        value = {'key': 'value' * 100}
+        r.set('a', value)
+        assert codec.compressed == 1
+        assert r.get('a') == value
+
+    def test_tags_must_be_unique(self):
+        class OtherJSONSerializer(JSONSerializer):
+            pass
+        registry = SerializerRegistry({dict: JSONSerializer()})
+        with pytest.raises(DataError):
+            registry.register(list, OtherJSONSerializer())
+
+    def test_tags_must_be_a_single_byte(self):
+        class BadSerializer(JSONSerializer):
+            tag = b('json')
+        with pytest.raises(DataError):
+            SerializerRegistry({dict: BadSerializer()})
+
+    @pytest.mark.parametrize('type_', [bytes, unicode, str, int, long,
+                                       float, bool, OrderedStr])
+    def test_strings_and_numbers_cant_be_registered(self, type_):
+        registry = SerializerRegistry()
+        with pytest.raises(DataError):
+            registry.register(type_, PickleSerializer())
+
+    def test_commands_arguments_are_untouched(self, request):
+        serializers = SerializerRegistry({object: PickleSerializer()})
+        r = _get_client(redis.StrictRedis, request, serializers=serializers)
+        r.rpush('a', Point(1, 2), Point(3, 4))
+        assert r.lrange('a', 0, 0) == [Point(1, 2)]
+        r.set('b', 1)
+        assert r.incrby('b', 2) == 3
+
+    def test_get_into_is_refused(self, r):
+        r.set('a', {'x': 1})
+        with pytest.raises(DataError):
+            r.get_into('a', bytearray(100))
+        assert r.get('a') == {'x': 1}
+
+    def test_get_to_file_is_refused(self, r):
+        r.set('a', {'x': 1})
+        with pytest.raises(DataError):
+            r.get_to_file('a', BytesIO())
+        assert r.get('a') == {'x': 1}
+
+    def test_set_from_file_is_refused(self, r):
+        with pytest.raises(DataError):
+            r.set_from_file('a', BytesIO(b('foo')))
+        assert r.get('a') is None
+
+
+class TestEncode(object):
+    def test_builtin_types(self):
+        connection = Connection()
+        assert connection.encode(b('foo')) == b('foo')
+        assert connection.encode(unicode('foo')) == b('foo')
+        assert connection.encode(10) == b('10')
+        assert connection.encode(long(10)) == b('10')
+        assert connection.encode(1.5) == b('1.5')
+        assert connection.encode(Token('GET')) == b('GET')
+        assert connection.encode(None) == b('None')
+        assert connection.encode(True) == b('True')
+
+    def test_encoding(self):
+        connection = Connection(encoding='latin-1')
+        assert connection.encode(unicode('\xe9')) == b('\xe9')
+
+    def test_subclasses_of_builtin_types(self):
+        class Name(unicode):
+            pass
+
+        class Count(int):
+            pass
+        connection = Connection()
+        assert connection.encode(Name('foo')) == b('foo')
+        assert connection.encode(Count(3)) == b('3')
+
+    def test_encode_all(self, serializers):
+        connection = Connection(serializers=serializers)
+        assert connection.encode_all(['foo', 1, [1]]) == \
+            [b('foo'), b('1'), MAGIC + b('j[1]')]
+
+    def test_types_registered_later_are_serialized(self):
+        registry = SerializerRegistry()
+        connection = Connection(serializers=registry)
+        registry.register(set, PickleSerializer())
+        assert connection.encode(set([1])).startswith(MAGIC + b('p'))
+
+    def test_subclasses_of_builtin_types_are_never_serialized(self):
+        class Count(int):
+            pass
+        connection = Connection(
+            serializers=SerializerRegistry({object: PickleSerializer()}))
+        assert connection.encode(True) == b('True')
+        assert connection.encode(Count(3)) == b('3')
+        assert connection.encode(Point(1, 2)).startswith(MAGIC + b('p'))
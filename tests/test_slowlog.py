@@ -0,0 +1,120 @@
+from __future__ import with_statement
+import pytest
+import redis
+
+from redis._compat import b, unicode
+from redis.events import CommandEvent
+from redis.slowlog import ClientSlowLog
+from .conftest import _get_listening_client
+
+
+@pytest.fixture()
+def slowlog(request):
+    "A ClientSlowLog logging every command, unless parametrized otherwise"
+    options = {'threshold': 0}
+    options.update(getattr(request, 'param', {}))
+    return ClientSlowLog(**options)
+
+
+@pytest.fixture()
+def lr(request, slowlog):
+    return _get_listening_client(request, slowlog)
+
+
+def assert_phases_add_up(entry):
+    "Only first_byte overlaps other phases, which fit in the duration"
+    phases = entry['phases']
+    assert phases['first_byte'] is not None
+    assert 0 <= phases['first_byte'] <= entry['duration']
+    assert min(phases.values()) >= 0
+    total = sum([duration for phase, duration in phases.items()
+                 if phase != 'first_byte'])
+    assert total <= entry['duration'] + 1e-6
+
+
+class TestClientSlowLog(object):
+    @pytest.mark.parametrize('slowlog', [{'time_phases': True}],
+                             indirect=True)
+    def test_entry(self, lr, slowlog):
+        lr.set('a', 'foo')
+        entry, = slowlog.get()
+        assert entry['command'] == 'SET'
+        assert entry['args'] == ('a', 'foo')
+        assert entry['error'] is None
+        assert entry['connection'] == repr(
+            lr.connection_pool._available_connections[0])
+        assert entry['duration'] >= 0
+        assert sorted(entry['phases']) == ['callback', 'encode', 'first_byte',
+                                           'pack', 'parse', 'pool_wait',
+                                           'read', 'send']
+        assert_phases_add_up(entry)
+
+    def test_threshold(self):
+        slowlog = ClientSlowLog(threshold=0.5)
+        fast = CommandEvent('GET', ('GET', 'a'))
+        fast.start_time, fast.duration = 100.0, 0.375
+        # waiting for the pool counts towards the threshold
+        slow = CommandEvent('HGETALL', ('HGETALL', 'b'))
+        slow.start_time, slow.pool_wait, slow.duration = 100.0, 0.25, 0.25
+        for event in (fast, slow):
+            slowlog.command_started(event)
+            slowlog.command_finished(event)
+        entry, = slowlog.get()
+        assert entry['command'] == 'HGETALL'
+        assert entry['args'] == ('b',)
+        assert entry['start_time'] == 99.75
+        assert entry['duration'] == 0.5
+        assert entry['phases']['pool_wait'] == 0.25
+
+    @pytest.mark.parametrize('slowlog', [{'max_len': 3}], indirect=True)
+    def test_ring_buffer(self, lr, slowlog):
+        for i in range(5):
+            lr.get(i)
+        assert len(slowlog) == 3
+        assert [entry['args'] for entry in slowlog.get()] == \
+            [(4,), (3,), (2,)]
+        assert [entry['args'] for entry in slowlog.get(1)] == [(4,)]
+        ids = [entry['id'] for entry in slowlog.get()]
+        assert ids == sorted(ids, reverse=True)
+
+    @pytest.mark.parametrize('slowlog', [{'max_arg_length': 4, 'max_args': 2}],
+                             indirect=True)
+    def test_truncated_args(self, lr, slowlog):
+        lr.set('a', b('x') * 10)
+        lr.set('a', unicode('y') * 10)
+        lr.rpush('b', 1, 2, 3)
+        rpush, set_unicode, set_bytes = slowlog.get(3)
+        assert set_bytes['args'] == ('a', b('xxxx... (6 more bytes)'))
+        assert set_unicode['args'] == ('a', 'yyyy... (6 more characters)')
+        assert rpush['args'] == ('b', 1, '... (2 more arguments)')
+
+    def test_errors(self, lr, slowlog):
+        lr.set('a', 'foo')
+        with pytest.raises(redis.ResponseError):
+            lr.lpush('a', 'bar')
+        assert isinstance(slowlog.get(1)[0]['error'], redis.ResponseError)
+
+    @pytest.mark.parametrize('slowlog', [{'time_phases': True}],
+                             indirect=True)
+    def test_pipelines(self, lr, slowlog):
+        lr.pipeline().set('a', 'foo').get('a').execute()
+        entry, = slowlog.get()
+        assert entry['command'] == 'MULTI'
+        assert entry['args'] == [('SET', 'a', 'foo'), ('GET', 'a')]
+        assert_phases_add_up(entry)
+        # pipelines are encoded as they're packed
+        assert entry['phases']['encode'] == 0
+
+    def test_phases_not_timed_by_default(self, lr, slowlog):
+        lr.get('a')
+        entry, = slowlog.get()
+        assert list(entry['phases']) == ['pool_wait']
+        assert entry['duration'] >= 0
+
+    @pytest.mark.parametrize('slowlog', [{'time_phases': True}],
+                             indirect=True)
+    def test_connections_stop_being_timed(self, lr, slowlog):
+        lr.get('a')
+        connection = lr.connection_pool._available_connections[0]
+        assert connection.timings is None
+        assert connection._parser.timings is None